@@ -0,0 +1,83 @@
+"""
+Throughput and memory of track_splice() for a range of chunk lengths.
+
+Tracks a filtered vorticity field, such as the T42filt_vor850_*.dat file kept by
+track_uv(keep_all_files=True), once per chunk length, each in a fresh process inside a
+temporary folder. For every length it reports the wall time, the frames tracked per second
+and the peak memory of a single TRACK run, also per grid point and frame of a chunk, which is
+what plan_chunks() assumes when it is given a memory limit.
+
+    python benchmarks/chunking.py T42filt_vor850_NH_yall.dat --lengths 31 62 124 --workers 2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+
+
+def _run(datin, ext, trunc, length, workers):
+    # runs in the child process, printing its measurements as JSON on the last line
+    from pyTRACK.track import track_splice, plan_chunks
+    from pyTRACK.io import _field_header
+
+    with open(datin, 'rb') as f:
+        nx, ny, ntime = _field_header(f)[:3]
+    plan = plan_chunks(ntime, length=length)
+
+    start = time.perf_counter()
+    track_splice(datin, ext, ntime, trunc, workers=workers, plan=plan)
+    seconds = time.perf_counter() - start
+
+    # ru_maxrss is in kB on Linux - the largest of this process and of the TRACK runs it waited for
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * 1024
+    print(json.dumps(dict(length=plan.length, overlap=plan.overlap, chunks=len(plan.chunks),
+                          ntime=ntime, nx=nx, ny=ny, workers=workers, seconds=seconds,
+                          frames_per_second=ntime / seconds, peak_bytes=peak,
+                          bytes_per_point=peak / (plan.length * nx * ny))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("datin", help="filtered vorticity field to track")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[31, 62, 124, 248],
+                        help="chunk lengths to try, in frames")
+    parser.add_argument("--ext", default="NH_yall", help="extension, its hemisphere picks the initial file")
+    parser.add_argument("--trunc", default="42")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="chunking.json", help="JSON file for the results")
+    parser.add_argument("--child", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    datin = os.path.abspath(args.datin)
+    if args.child is not None:
+        _run(datin, args.ext, args.trunc, args.child, args.workers)
+        return
+
+    rows = []
+    print("%8s %8s %10s %12s %12s %14s" % ("length", "chunks", "seconds", "frames/s", "peak MB", "bytes/point"))
+    for length in args.lengths:
+        cmd = [sys.executable, os.path.abspath(__file__), datin, "--ext", args.ext,
+               "--trunc", args.trunc, "--child", str(length)]
+        if args.workers:
+            cmd += ["--workers", str(args.workers)]
+        with tempfile.TemporaryDirectory() as tmp:
+            out = subprocess.run(cmd, cwd=tmp, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError("Chunk length " + str(length) + " failed:\n" + out.stderr[-2000:])
+        row = json.loads(out.stdout.strip().splitlines()[-1])
+        rows.append(row)
+        print("%8d %8d %10.1f %12.2f %12.1f %14.1f" % (row['length'], row['chunks'], row['seconds'],
+                                                       row['frames_per_second'], row['peak_bytes'] / 2**20,
+                                                       row['bytes_per_point']))
+
+    with open(args.output, "w") as f:
+        json.dump(rows, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
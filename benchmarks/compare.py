@@ -0,0 +1,68 @@
+"""
+Compares two result files of benchmarks/run.py, e.g. of two commits.
+
+Prints the time of every stage that ran in both, and the ratio of the new to the old time.
+Exits with status 1 if any stage got slower by more than the threshold.
+
+    python benchmarks/compare.py before.json after.json --threshold 1.2
+"""
+import sys
+import json
+import argparse
+
+from run import STAGES
+
+
+def _load(path):
+    with open(path) as f:
+        data = json.load(f)
+    rows = {(r["grid"], r["days"], r["stage"]): r for r in data["results"]}
+    return data["meta"], rows
+
+
+def compare(old, new, threshold=1.2):
+    """
+    Returns (grid, days, stage, old seconds, new seconds, ratio) of the stages in both result
+    files, and the number of those slower by more than threshold.
+    """
+    meta_old, old = _load(old)
+    meta_new, new = _load(new)
+    print("old: " + str(meta_old.get("commit")) + " " + str(meta_old.get("time")))
+    print("new: " + str(meta_new.get("commit")) + " " + str(meta_new.get("time")))
+
+    order = {s: i for i, s in enumerate(STAGES)}
+    keys = sorted(set(old) & set(new), key=lambda k: (int(k[0][1:]), k[1], order.get(k[2], len(order))))
+    rows = []
+    slower = 0
+    print("%6s %5s %-16s %10s %10s %8s" % ("grid", "days", "stage", "old", "new", "ratio"))
+    for key in keys:
+        a, b = old[key], new[key]
+        if a["status"] != "ok" or b["status"] != "ok":
+            print("%6s %5d %-16s %10s %10s" % (key + (a["status"], b["status"])))
+            continue
+        ratio = b["seconds"] / a["seconds"]
+        flag = ""
+        if ratio > threshold:
+            slower += 1
+            flag = "  slower"
+        rows.append(key + (a["seconds"], b["seconds"], ratio))
+        print("%6s %5d %-16s %10.3f %10.3f %8.2f%s" % (key + (a["seconds"], b["seconds"], ratio, flag)))
+    return rows, slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("old", help="results of the baseline")
+    parser.add_argument("new", help="results to compare with it")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="ratio of new to old time above which a stage counts as slower")
+    args = parser.parse_args(argv)
+
+    rows, slower = compare(args.old, args.new, args.threshold)
+    if slower:
+        print(str(slower) + " of " + str(len(rows)) + " stages slower by more than " + str(args.threshold) + "x")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
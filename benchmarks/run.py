@@ -0,0 +1,266 @@
+"""
+Times every stage of pyTRACK on synthetic data, for comparing commits.
+
+For every grid and length it writes synthetic 6 hourly ua/va with moving vortices (see
+synthetic.py) into a temporary folder and times, one at a time,
+
+    preprocess          utils.preprocess() of the ua/va file
+    vorticity_numpy     calc_vorticity(backend='numpy')
+    vorticity_track     calc_vorticity(backend='track')                  needs libtrack and cdo
+    spectral_filter     the T42 filter run of track_uv()                  needs libtrack
+    track_chunks        tracking the chunks of track_splice()             needs libtrack
+    run_splice          splicing the chunk tracks of both signs           needs libtrack
+    tr2nc_vor           tr2nc_vor() of the true tracks                    needs libtrackutils
+    stats_numpy         stats_track(engine='numpy') of the true tracks
+    stats_track         stats_track(engine='track') of the true tracks    needs libtrack
+
+Stages that can not run here, or whose input could not be made, are recorded as skipped, so
+the same command runs offline with only numpy and netCDF4. TRACK stages run in a forked
+process each, as TRACK exits on errors. The results are written as JSON, with the commit and
+versions they were measured at - benchmarks/compare.py compares two such files.
+
+    python benchmarks/run.py --grids 32 48 64 80 --days 10 30 --output results.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import synthetic
+
+STAGES = ["preprocess", "vorticity_numpy", "vorticity_track", "spectral_filter", "track_chunks",
+          "run_splice", "tr2nc_vor", "stats_numpy", "stats_track"]
+
+
+class Skipped(Exception):
+    pass
+
+
+def _available():
+    # which of the compiled parts and tools are there, as a reason to skip or None
+    from pyTRACK.track import _load_libtrack
+    from pyTRACK.track_uv import _load_trackutils, cdo
+
+    missing = {}
+    for name, load in (("libtrack", _load_libtrack), ("libtrackutils", _load_trackutils)):
+        try:
+            load()
+            missing[name] = None
+        except (OSError, FileNotFoundError) as e:
+            missing[name] = str(e)
+    missing["cdo"] = None if cdo is not None else "cdo is not available"
+    return missing
+
+
+def _isolated(func, **kwargs):
+    # runs a TRACK stage in its own process in the current folder
+    from pyTRACK.utils import run_isolated
+    run_isolated([(os.getcwd(), func, kwargs)])
+
+
+def _spectral_filter(vorticity, nx, ny, trunc, ext):
+    import pyTRACK
+    from pyTRACK.track import track
+    from pyTRACK.utils import run_silent
+
+    indat = os.path.join(os.path.dirname(pyTRACK.__file__), "indat", "specfilt.in")
+    with open(indat) as f:
+        text = f.read().replace("NX", str(nx)).replace("NY", str(ny)).replace("TRUNC", trunc)
+    namelist = "spec_T" + trunc + ".in"
+    with open(namelist, "w") as f:
+        f.write(text)
+    run_silent(track, input_file=vorticity, ext=ext, namelist=namelist)
+    os.replace("specfil_band000." + ext + "_band000", "T" + trunc + "filt_" + vorticity)
+
+
+def _track(datin, ntime, trunc, ext):
+    from pyTRACK.track import track_splice
+    from pyTRACK.utils import run_silent
+    run_silent(track_splice, datin, ext, ntime, trunc, keep_all_files=True)
+
+
+def _splice(datin, ntime, ext):
+    # splices the chunk tracks left by _track() again, as track_splice() does
+    from pathlib import Path
+    from pyTRACK.track import plan_chunks, _run_splice
+    from pyTRACK.utils import run_silent
+
+    dir3 = Path(os.getcwd()) / "output_track" / ext
+    chunks = plan_chunks(ntime).chunks
+    for sign, prefix in (("MAX", "pos"), ("MIN", "neg")):
+        text = ""
+        for N, S, F in chunks:
+            text += f"{dir3}/DJF_{sign}_{N}/objout.new\n{dir3}/DJF_{sign}_{N}/tdump\n{1 if N == 1 else 3}\n"
+        run_silent(_run_splice, text, prefix, datin, ext, len(chunks), dir3)
+
+
+def _stats(outdirectory, engine):
+    from pyTRACK.stats import stats_track
+    from pyTRACK.utils import run_silent
+    run_silent(stats_track, outdirectory, engine=engine)
+
+
+def run_case(n, days, repeat=1, trunc="42", missing=None, keep=None):
+    """
+    Times the stages on the N{n} grid for a run of days, returning a list of result rows.
+    """
+    from pyTRACK.utils import preprocess
+    from pyTRACK.track_uv import calc_vorticity, tr2nc_vor
+    from pyTRACK.io import _field_header
+
+    missing = _available() if missing is None else missing
+    ext = "NH_yall"
+    lon, lat = synthetic.gaussian_grid(n)
+    ntime = int(days * 24 / 6)
+    rows = []
+
+    def need(*names):
+        for name in names:
+            if missing.get(name):
+                raise Skipped(missing[name])
+
+    def stage(name, func, *deps, timed=False):
+        # times func() repeat times - func may raise Skipped, and returns its own timing if timed
+        row = dict(grid="N" + str(n), nx=len(lon), ny=len(lat), days=days, ntime=ntime, stage=name)
+        needed = [d for d in deps if d not in done]
+        try:
+            if needed:
+                raise Skipped("needs " + ", ".join(needed))
+            runs = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                seconds = func()
+                runs.append(seconds if timed else time.perf_counter() - start)
+            row.update(status="ok", seconds=min(runs), runs=runs, frames_per_second=ntime / min(runs))
+            done.add(name)
+        except Skipped as e:
+            row.update(status="skipped", reason=str(e))
+        except Exception as e:
+            row.update(status="failed", reason=type(e).__name__ + ": " + str(e))
+        rows.append(row)
+        print("%6s %5d %-16s %8s %10s" % (row["grid"], days, name, row["status"],
+                                          "%.3f" % row["seconds"] if "seconds" in row else "-"))
+        return row
+
+    done = set()
+    curr = os.getcwd()
+    tmp = tempfile.mkdtemp(prefix="pytrack_bench_", dir=keep)
+    try:
+        os.chdir(tmp)
+        v = synthetic.write_uv("uv.nc", n, days)
+
+        # true tracks, in the layout track_uv() writes
+        truth = os.path.join(tmp, "truth")
+        for hemisphere in ("NH", "SH"):
+            d = os.path.join(truth, "output_track", hemisphere + "_yall")
+            os.makedirs(d)
+            for sign, name in ((1, "ff_trs_pos"), (-1, "ff_trs_neg")):
+                synthetic.write_tracks(os.path.join(d, name), v, days, sign, hemisphere)
+
+        stage("preprocess", lambda: preprocess("uv.nc", "uv_processed.nc"))
+        stage("vorticity_numpy", lambda: calc_vorticity("uv_processed.nc", "vor850_numpy.dat", ext=ext,
+                                                         backend="numpy"), "preprocess")
+
+        def vorticity_track():
+            need("libtrack", "cdo")
+            _isolated(calc_vorticity, uv_file="uv_processed.nc", outfile="vor850_track.dat", ext=ext)
+        stage("vorticity_track", vorticity_track, "preprocess")
+
+        # the filter and tracking use the TRACK vorticity if there is one
+        vorticity = "vor850_track.dat" if "vorticity_track" in done else "vor850_numpy.dat"
+
+        def spectral_filter():
+            need("libtrack")
+            _isolated(_spectral_filter, vorticity=vorticity, nx=len(lon), ny=len(lat), trunc=trunc, ext=ext)
+        stage("spectral_filter", spectral_filter, "vorticity_numpy")
+
+        datin = "T" + trunc + "filt_" + vorticity
+
+        splices = []
+
+        def track_chunks():
+            # track_splice() is timed as a whole, and then the splices again on their own
+            need("libtrack")
+            if os.path.exists("output_track"):
+                shutil.rmtree("output_track")
+            with open(datin, "rb") as f:
+                ftime = _field_header(f)[2]
+            start = time.perf_counter()
+            _isolated(_track, datin=datin, ntime=ftime, trunc=trunc, ext=ext)
+            total = time.perf_counter() - start
+            start = time.perf_counter()
+            _isolated(_splice, datin=datin, ntime=ftime, ext=ext)
+            splices.append(time.perf_counter() - start)
+            return total - splices[-1]
+        stage("track_chunks", track_chunks, "spectral_filter", timed=True)
+        stage("run_splice", lambda: splices.pop(0), "track_chunks", timed=True)
+
+        def tr2nc():
+            need("libtrackutils")
+            _isolated(tr2nc_vor, input=os.path.join(truth, "output_track", "NH_yall", "ff_trs_pos"),
+                      datetime="2000010100", datetime_exp=None, timedelta=6)
+        stage("tr2nc_vor", tr2nc)
+
+        stage("stats_numpy", lambda: _stats(truth, "numpy"))
+
+        def stats_track():
+            need("libtrack")
+            _isolated(_stats, outdirectory=truth, engine="track")
+        stage("stats_track", stats_track)
+    finally:
+        os.chdir(curr)
+        if keep is None:
+            shutil.rmtree(tmp)
+    return rows
+
+
+def _meta():
+    import numpy
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True,
+                                text=True).stdout.strip() or None
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True).stdout.strip())
+    except OSError:
+        commit, dirty = None, None
+    return dict(commit=commit, dirty=dirty, time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                python=platform.python_version(), numpy=numpy.__version__,
+                platform=platform.platform(), cpus=os.cpu_count())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--grids", type=int, nargs="+", default=[32, 48, 64, 80],
+                        help="Gaussian grids to run, as N of N32 to N80")
+    parser.add_argument("--days", type=int, nargs="+", default=[10, 30], help="lengths of the runs, in days")
+    parser.add_argument("--repeat", type=int, default=1, help="runs of every stage, the fastest is kept")
+    parser.add_argument("--trunc", default="42")
+    parser.add_argument("--keep", default=None, help="folder to keep the case folders in, for inspection")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file for the results")
+    args = parser.parse_args(argv)
+
+    missing = _available()
+    for name, reason in missing.items():
+        if reason:
+            print("Skipping the stages that need " + name + ": " + reason)
+
+    rows = []
+    print("%6s %5s %-16s %8s %10s" % ("grid", "days", "stage", "status", "seconds"))
+    for n in args.grids:
+        for days in args.days:
+            rows += run_case(n, days, repeat=args.repeat, trunc=args.trunc, missing=missing, keep=args.keep)
+
+    with open(args.output, "w") as f:
+        json.dump(dict(meta=_meta(), results=rows), f, indent=1)
+    print("Results written to " + args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Synthetic 6 hourly ua/va fields with moving vortices, for the benchmarks.
+
+Every vortex is a Gaussian streamfunction anomaly that grows and decays over its lifetime
+while drifting east and poleward on a weak westerly flow. The fields are on N{n} Gaussian
+grids (4n longitudes, 2n latitudes), as track_uv() takes them, and the true vortex paths can
+be written as TRACK track files, e.g. to benchmark the statistics without tracking first.
+"""
+import numpy as np
+
+EARTH_RADIUS = 6.37e6
+_HOURS = 6
+
+
+def gaussian_grid(n):
+    """
+    Returns the longitudes and latitudes (north to south) of the N{n} Gaussian grid.
+    """
+    lat = np.degrees(np.arcsin(np.polynomial.legendre.leggauss(2 * n)[0]))[::-1]
+    lon = np.arange(4 * n) * 360. / (4 * n)
+    return lon, lat
+
+
+def vortices(days, nvortex=None, seed=0):
+    """
+    Returns the vortices of a synthetic run of days, as a dict of arrays - genesis frame,
+    lifetime in frames, start longitude and latitude, eastward and poleward speed in degrees
+    per frame, and sign of the relative vorticity.
+    """
+    rng = np.random.default_rng(seed)
+    ntime = int(days * 24 / _HOURS)
+    if nvortex is None:
+        # a few new systems a day over the globe
+        nvortex = max(4, int(days * 4))
+    hemisphere = rng.choice([-1, 1], nvortex)
+    return dict(
+        start=rng.integers(0, max(ntime - 8, 1), nvortex),
+        life=rng.integers(8, 33, nvortex),
+        lon=rng.uniform(0, 360, nvortex),
+        lat=hemisphere * rng.uniform(25, 65, nvortex),
+        dlon=rng.uniform(1.0, 3.0, nvortex),
+        dlat=hemisphere * rng.uniform(0.0, 0.4, nvortex),
+        sign=rng.choice([-1, 1], nvortex),
+    )
+
+
+def _positions(v, t):
+    # position, intensity (0 to 1) and index of the vortices alive at frame t (from 0)
+    age = t - v['start']
+    alive = np.flatnonzero((age >= 0) & (age < v['life']))
+    age = age[alive]
+    lon = np.mod(v['lon'][alive] + v['dlon'][alive] * age, 360)
+    lat = np.clip(v['lat'][alive] + v['dlat'][alive] * age, -85, 85)
+    strength = np.sin(np.pi * (age + 0.5) / v['life'][alive])
+    return lon, lat, strength, alive
+
+
+def uv_frame(v, t, lon, lat, radius=6.0e5, vorticity=1.2e-4):
+    """
+    Returns ua and va (lat, lon) of frame t, with vortices of the given radius (m) and peak
+    relative vorticity (s-1).
+    """
+    plon, plat = np.radians(lon)[None, :], np.radians(lat)[:, None]
+    # westerly background flow
+    psi = -EARTH_RADIUS * 8.0 * np.sin(plat) * np.ones_like(plon)
+
+    vlon, vlat, strength, alive = _positions(v, t)
+    amplitude = vorticity * radius ** 2 / 4
+    for x, y, s, i in zip(np.radians(vlon), np.radians(vlat), strength, alive):
+        cosd = np.sin(plat) * np.sin(y) + np.cos(plat) * np.cos(y) * np.cos(plon - x)
+        d2 = (EARTH_RADIUS * np.arccos(np.clip(cosd, -1, 1))) ** 2
+        psi = psi - v['sign'][i] * s * amplitude * np.exp(-d2 / radius ** 2)
+
+    # u = -dpsi/dy, v = dpsi/dx, with periodic longitudes
+    dlon = np.radians(lon[1] - lon[0])
+    u = -np.gradient(psi, np.radians(lat), axis=0) / EARTH_RADIUS
+    dpsi = (np.roll(psi, -1, axis=1) - np.roll(psi, 1, axis=1)) / (2 * dlon)
+    w = dpsi / (EARTH_RADIUS * np.maximum(np.cos(plat), 1e-3))
+    return u.astype(np.float32), w.astype(np.float32)
+
+
+def write_uv(path, n, days, seed=0):
+    """
+    Writes ua and va of a synthetic run of days on the N{n} grid to the netCDF file path,
+    a frame at a time. Returns the vortices, see vortices().
+    """
+    from netCDF4 import Dataset
+
+    lon, lat = gaussian_grid(n)
+    v = vortices(days, seed=seed)
+    ntime = int(days * 24 / _HOURS)
+
+    with Dataset(path, "w") as ds:
+        ds.createDimension("time", None)
+        ds.createDimension("lat", len(lat))
+        ds.createDimension("lon", len(lon))
+        time = ds.createVariable("time", "f8", ("time",))
+        time.units = "hours since 2000-01-01 00:00:00"
+        time.calendar = "standard"
+        x = ds.createVariable("lon", "f8", ("lon",))
+        x.units = "degrees_east"
+        x[:] = lon
+        y = ds.createVariable("lat", "f8", ("lat",))
+        y.units = "degrees_north"
+        y[:] = lat
+        ua = ds.createVariable("ua", "f4", ("time", "lat", "lon"))
+        va = ds.createVariable("va", "f4", ("time", "lat", "lon"))
+        for t in range(ntime):
+            time[t] = t * _HOURS
+            ua[t], va[t] = uv_frame(v, t, lon, lat)
+    return v
+
+
+def write_tracks(path, v, days, sign=1, hemisphere='NH', intensity=12.0):
+    """
+    Writes the paths of the vortices of one hemisphere ('NH' or 'SH') with relative vorticity
+    of the given sign, as TRACK's *pos (sign=1) and *neg (sign=-1) track files are, with frame
+    numbers and intensities in 1e-5 s-1. Returns the number of tracks.
+    """
+    ntime = int(days * 24 / _HOURS)
+    paths = {}
+    for t in range(ntime):
+        lon, lat, strength, alive = _positions(v, t)
+        for x, y, s, i in zip(lon, lat, strength, alive):
+            if v['sign'][i] == sign and (y > 0) == (hemisphere == 'NH'):
+                paths.setdefault(i, []).append((t + 1, x, y, sign * s * intensity))
+
+    with open(path, "w") as f:
+        f.write("0\n0 0\nTRACK_NUM  %8d ADD_FLD    0   0 &\n" % len(paths))
+        for n, i in enumerate(sorted(paths)):
+            f.write("TRACK_ID  %d\nPOINT_NUM  %d\n" % (n + 1, len(paths[i])))
+            for frame, x, y, s in paths[i]:
+                f.write("%d %f %f %e \n" % (frame, x, y, s))
+    return len(paths)
@@ -1,5 +1,10 @@
-from .track import track, track_splice, set_track_env
-from .track_uv import calc_vorticity, track_uv
-from .stats import stats_track
+from .track import track, track_splice, set_track_env, plan_chunks, ChunkPlan
+from .track_uv import calc_vorticity, track_uv, tr2nc_batch, tr2nc_output
+from .stats import stats_track, compute_stats
+from .cache import FieldCache
+from .session import TrackSession, TrackProgress
+from .store import TrackStore, build_store
+from .index import TrackIndex
+from .trace import Trace
 
-__all__ = ["track", 'calc_vorticity', 'track_uv', 'track_splice', 'set_track_env', 'stats_track']
\ No newline at end of file
+__all__ = ["track", 'calc_vorticity', 'track_uv', 'tr2nc_batch', 'tr2nc_output', 'track_splice', 'plan_chunks', 'ChunkPlan', 'set_track_env', 'TrackSession', 'TrackProgress', 'stats_track', 'compute_stats', 'FieldCache', 'TrackStore', 'build_store', 'TrackIndex', 'Trace']
\ No newline at end of file
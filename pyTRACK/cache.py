@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+
+__all__ = ['FieldCache']
+
+_UNITS = {'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+
+
+def _parse_size(size):
+    # accepts bytes as a number, or strings like '500M' or '20GB'
+    if size is None or isinstance(size, (int, float)):
+        return size
+    size = size.strip().upper().rstrip('B')
+    if size and size[-1] in _UNITS:
+        return int(float(size[:-1]) * _UNITS[size[-1]])
+    return int(size)
+
+
+class FieldCache(object):
+    """
+    On-disk cache for the intermediate fields of track_uv().
+
+    Every entry is addressed by a key computed from the identity of the input file and the
+    parameters of the stage that produced it, so that reruns with different downstream settings
+    (sdate, trunc, tracking templates) reuse the preprocessed data, vorticity and filtered fields.
+    Keys of later stages are derived from the key of the stage they are computed from.
+
+    The cache is limited to max_size bytes, and the least recently used entries are removed
+    once it grows beyond that.
+    """
+
+    def __init__(self, directory=None, max_size='20G', hash_content=False):
+        """
+        Parameters
+        ----------
+        directory : str or None
+            Folder to keep the cached files in. Defaults to ~/.cache/pyTRACK.
+        max_size : int, str or None
+            Size limit in bytes, or a string like '500M' or '20G'. None for no limit.
+        hash_content : bool
+            Identify input files by a hash of their content instead of their name, size and
+            modification time. Slower for large files, but survives copies and touches.
+        """
+        if directory is None:
+            directory = os.path.join(os.path.expanduser("~"), ".cache", "pyTRACK")
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_size = _parse_size(max_size)
+        self.hash_content = hash_content
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _hash(self, *parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def key(self, filename, stage, hash_content=None, **params):
+        """
+        Returns the key of stage applied to the file filename, or to a list of files, with the
+        given parameters. hash_content overrides the setting of the cache for these files.
+        """
+        if hash_content is None:
+            hash_content = self.hash_content
+        if isinstance(filename, (list, tuple)):
+            identity = [self._identity(f, hash_content) for f in filename]
+        else:
+            identity = self._identity(filename, hash_content)
+        return self._hash(identity, stage, params)
+
+    def _identity(self, filename, hash_content):
+        if hash_content:
+            h = hashlib.sha256()
+            with open(filename, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 24), b''):
+                    h.update(block)
+            return h.hexdigest()
+        st = os.stat(filename)
+        return [os.path.basename(filename), st.st_size, st.st_mtime_ns]
+
+    def derive(self, parent, stage, **params):
+        """
+        Returns the key of stage applied to the cached entry with key parent.
+        """
+        return self._hash(parent, stage, params)
+
+    def _data(self, key):
+        return os.path.join(self.directory, key + ".data")
+
+    def _meta(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key, dest):
+        """
+        Places a copy of the entry key at dest. The working files are rewritten in place later
+        on, so they are never linked to the entry itself.
+
+        Returns the metadata dictionary stored with the entry, or None if it is not cached.
+        """
+        try:
+            with open(self._meta(key)) as f:
+                meta = json.load(f)
+            if os.path.lexists(dest):
+                os.remove(dest)
+            shutil.copyfile(self._data(key), dest)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        meta['last_used'] = time.time()
+        self._write_meta(key, meta)
+        return meta['info']
+
+    def put(self, key, src, **info):
+        """
+        Adds a copy of the file src to the cache under key, together with any extra metadata in
+        info, and evicts the least recently used entries if the cache grows beyond max_size.
+        """
+        size = os.path.getsize(src)
+        if self.max_size is not None and size > self.max_size:
+            return
+
+        tmp = self._data(key) + ".tmp" + str(os.getpid())
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, self._data(key))
+        self._write_meta(key, dict(size=size, last_used=time.time(), info=info))
+        self.evict()
+
+    def _write_meta(self, key, meta):
+        tmp = self._meta(key) + ".tmp" + str(os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta(key))
+
+    def entries(self):
+        """
+        Returns a list of (key, size, last_used) for every entry in the cache.
+        """
+        out = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    meta = json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+            out.append((name[:-5], meta['size'], meta['last_used']))
+        return out
+
+    def size(self):
+        """
+        Returns the total size of the cached files in bytes.
+        """
+        return sum(e[1] for e in self.entries())
+
+    def remove(self, key):
+        """
+        Removes the entry key from the cache.
+        """
+        for path in (self._meta(key), self._data(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_size.
+        """
+        if self.max_size is None:
+            return
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(e[1] for e in entries)
+        for key, size, last_used in entries:
+            if total <= self.max_size:
+                break
+            self.remove(key)
+            total -= size
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        for key, size, last_used in self.entries():
+            self.remove(key)
+
+
+def _as_cache(cache):
+    # cache arguments can be a FieldCache, a folder, True for the default folder, or None
+    if cache is None or cache is False or isinstance(cache, FieldCache):
+        return cache or None
+    if cache is True:
+        return FieldCache()
+    return FieldCache(cache)
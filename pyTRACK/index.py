@@ -0,0 +1,225 @@
+import numpy as np
+from collections import namedtuple
+
+from .io import Tracks, read_tracks
+from .stats import _unit_vectors, _hours, _EARTH_RADIUS
+from .store import _lon_mask
+
+__all__ = ['TrackIndex', 'IndexHits']
+
+IndexHits = namedtuple('IndexHits', ['track_id', 'track', 'point'])
+IndexHits.__doc__ = ("Tracks and points matching a TrackIndex query - the unique IDs of the tracks hit, "
+                     "and the track number and point number (into Tracks.points) of every point hit.")
+
+
+class TrackIndex(object):
+    """
+    Space-time index of the points of a set of tracks, for radius, bounding box and polygon queries.
+
+    Points are bucketed into latitude bands of cell_size degrees, each split into longitude cells
+    of about the same area, and into time bins of time_bin hours (frames for files using frame
+    numbers). The points are sorted by cell and then time bin, so that a query only looks at the
+    points of the cells and time bins it overlaps, each found by a binary search, before testing
+    them exactly.
+
+    Usage
+    -----
+    index = TrackIndex(read_tracks('ff_trs_pos'))
+    hits = index.radius(355.0, 51.5, 500.0, time=(2000010100, 2000033118))
+    hits.track_id   # tracks passing within 500 km of the point between the two dates
+    """
+
+    def __init__(self, tracks, cell_size=2.0, time_bin=120):
+        """
+        Parameters
+        ----------
+        tracks : Tracks or str
+            Tracks to index, as returned by read_tracks() or TrackStore.query(), or a track file.
+        cell_size : float
+            Latitude width of the cells, in degrees.
+        time_bin : int
+            Length of the time bins, in hours, or in frames for files using frame numbers.
+        """
+        if not isinstance(tracks, Tracks):
+            tracks = read_tracks(tracks)
+        self.tracks = tracks
+        self.cell_size = float(cell_size)
+        self.time_bin = max(1, int(time_bin))
+
+        points = tracks.points
+        self.lon = np.mod(np.asarray(points['lon'], dtype=np.float64), 360)
+        self.lat = np.asarray(points['lat'], dtype=np.float64)
+        self.dated = 'time' in points
+        if self.dated:
+            self.t = _hours(points['time'])
+        elif 'frame' in points:
+            self.t = np.asarray(points['frame'], dtype=np.int64)
+        else:
+            self.t = np.zeros(len(self.lat), dtype=np.int64)
+        self.point_track = np.repeat(np.arange(len(tracks)), tracks.num_points)
+
+        # cells per latitude band, fewer towards the poles
+        self.nband = int(np.ceil(180. / self.cell_size))
+        centre = -90. + (np.arange(self.nband) + 0.5) * self.cell_size
+        self.nlon = np.maximum(1, np.round(360. * np.cos(np.radians(centre)) / self.cell_size)).astype(np.int64)
+        self.first = np.concatenate(([0], np.cumsum(self.nlon)))
+
+        self.t0 = self.t.min() if len(self.t) else 0
+        self.ntbin = int((self.t.max() - self.t0) // self.time_bin) + 1 if len(self.t) else 1
+
+        band = self._band(self.lat)
+        cell = self.first[band] + self._lon_cell(band, self.lon)
+        key = cell * self.ntbin + (self.t - self.t0) // self.time_bin
+        self.order = np.argsort(key, kind='stable')
+        self.keys = key[self.order]
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _band(self, lat):
+        return np.clip(((np.asarray(lat) + 90.) // self.cell_size).astype(np.int64), 0, self.nband - 1)
+
+    def _lon_cell(self, band, lon):
+        nlon = self.nlon[band]
+        return np.minimum((np.mod(lon, 360) / 360. * nlon).astype(np.int64), nlon - 1)
+
+    def _cells(self, lat_min, lat_max, lon_min=None, lon_max=None):
+        # cells of the bands between lat_min and lat_max, and between lon_min and lon_max going
+        # east from lon_min (all longitudes if lon_min is None)
+        cells = []
+        for band in range(self._band(max(lat_min, -90.)), self._band(min(lat_max, 90.)) + 1):
+            nlon = self.nlon[band]
+            if lon_min is None:
+                c = np.arange(nlon)
+            else:
+                x0 = (lon_min % 360) / 360. * nlon
+                n = int(np.floor(x0 + (lon_max - lon_min) % 360 / 360. * nlon)) - int(x0) + 1
+                c = (int(x0) + np.arange(min(n, nlon))) % nlon
+            cells.append(self.first[band] + c)
+        return np.concatenate(cells) if cells else np.zeros(0, dtype=np.int64)
+
+    def _candidates(self, cells, time):
+        # points in the given cells and in the time bins overlapping time, as indices into points
+        if time is None:
+            lo, hi = cells * self.ntbin, cells * self.ntbin + self.ntbin - 1
+        else:
+            t = _hours(time) if self.dated else np.asarray(time, dtype=np.int64)
+            b0 = max(int(t[0] - self.t0) // self.time_bin, 0)
+            b1 = min(int(t[1] - self.t0) // self.time_bin, self.ntbin - 1)
+            if b1 < b0:
+                return np.zeros(0, dtype=np.int64)
+            lo, hi = cells * self.ntbin + b0, cells * self.ntbin + b1
+        start = np.searchsorted(self.keys, lo, side='left')
+        end = np.searchsorted(self.keys, hi, side='right')
+        nums = end - start
+        index = np.repeat(start - np.cumsum(nums) + nums, nums) + np.arange(nums.sum())
+        return np.sort(self.order[index])
+
+    def _hits(self, points, time):
+        if time is not None:
+            t = _hours(time) if self.dated else np.asarray(time, dtype=np.int64)
+            points = points[(self.t[points] >= t[0]) & (self.t[points] <= t[1])]
+        track = self.point_track[points]
+        return IndexHits(np.asarray(self.tracks.track_id)[np.unique(track)], track, points)
+
+    def radius(self, lon, lat, radius, time=None):
+        """
+        Returns the points within a great circle distance of a location.
+
+        Parameters
+        ----------
+        lon, lat : float
+            Location, in degrees.
+        radius : float
+            Distance in km.
+        time : tuple
+            First and last time (inclusive), as YYYYMMDDHH integers, or frame numbers for files
+            using frame numbers.
+
+        Returns
+        -------
+        IndexHits
+        """
+        d = np.degrees(radius / _EARTH_RADIUS)
+        if d >= 180.:
+            cells = self._cells(-90., 90.)
+        elif abs(lat) + d >= 90.:
+            cells = self._cells(lat - d, lat + d)
+        else:
+            # widest longitude extent of the cap
+            dlon = np.degrees(np.arcsin(np.sin(np.radians(d)) / np.cos(np.radians(lat))))
+            cells = self._cells(lat - d, lat + d, lon - dlon, lon + dlon)
+
+        points = self._candidates(cells, time)
+        dist = _unit_vectors(self.lon[points], self.lat[points]) @ _unit_vectors(lon, lat)
+        points = points[dist >= np.cos(np.radians(min(d, 180.)))]
+        return self._hits(points, time)
+
+    def bbox(self, lon_min, lon_max, lat_min, lat_max, time=None):
+        """
+        Returns the points inside a latitude/longitude box.
+
+        Parameters
+        ----------
+        lon_min, lon_max, lat_min, lat_max : float
+            Box, in degrees. lon_min > lon_max selects a box crossing the Greenwich meridian,
+            as for TrackStore.query().
+        time : tuple
+            First and last time (inclusive), see radius().
+
+        Returns
+        -------
+        IndexHits
+        """
+        # e.g. (0, 360) for all longitudes
+        full = lon_min % 360 == lon_max % 360 and lon_min != lon_max
+        cells = self._cells(lat_min, lat_max) if full else self._cells(lat_min, lat_max, lon_min, lon_max)
+        points = self._candidates(cells, time)
+        mask = (self.lat[points] >= lat_min) & (self.lat[points] <= lat_max)
+        if not full:
+            mask &= _lon_mask(self.lon[points], lon_min, lon_max)
+        return self._hits(points[mask], time)
+
+    def polygon(self, lon, lat, time=None):
+        """
+        Returns the points inside a polygon, such as a coastline or a region.
+
+        Edges are straight in longitude and latitude, and the polygon may cross the Greenwich
+        meridian but should not contain a pole.
+
+        Parameters
+        ----------
+        lon, lat : array_like
+            Vertices of the polygon, in degrees.
+        time : tuple
+            First and last time (inclusive), see radius().
+
+        Returns
+        -------
+        IndexHits
+        """
+        plat = np.asarray(lat, dtype=np.float64)
+        plon = np.asarray(lon, dtype=np.float64)
+        if len(plon) < 3:
+            raise ValueError("A polygon needs at least 3 vertices")
+        # vertices without jumps of more than 180 degrees, starting from the first one
+        step = (np.diff(np.append(plon, plon[0])) + 180.) % 360 - 180.
+        if abs(step.sum()) > 180.:
+            raise ValueError("The polygon encloses a pole")
+        plon = plon[0] + np.concatenate(([0.], np.cumsum(step[:-1])))
+        west, east = plon.min(), plon.max()
+
+        cells = self._cells(plat.min(), plat.max(), west, east)
+        points = self._candidates(cells, time)
+
+        # even-odd rule, with the longitudes of the points moved next to the polygon
+        x = west + np.mod(self.lon[points] - west, 360)
+        y = self.lat[points]
+        inside = np.zeros(len(points), dtype=bool)
+        for xa, ya, xb, yb in zip(plon, plat, np.roll(plon, -1), np.roll(plat, -1)):
+            if ya == yb:
+                continue
+            cross = (ya > y) != (yb > y)
+            xc = xa + (y - ya) * (xb - xa) / (yb - ya)
+            inside ^= cross & (x < xc)
+        return self._hits(points[inside], time)
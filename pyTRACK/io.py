@@ -0,0 +1,544 @@
+import os
+import numpy as np
+from itertools import islice
+
+__all__ = ['FieldWriter', 'Field', 'open_field', 'append_field', 'Tracks', 'read_tracks', 'iter_tracks']
+
+# value TRACK writes for additional fields that are not defined at a point
+ADD_UNDEF = 1.0e25
+
+
+class FieldWriter(object):
+    """
+    Streaming writer for TRACK's binary field format, as written by write_header() and
+    compute_vorticity() and read by std_read_field() (format '0', frames separated by newlines).
+
+    The file starts with an ASCII header
+
+        nx  ny  nframes
+        longitudes, 10 per line
+        latitudes, 10 per line
+
+    followed by one block per frame of 'FRAME n' on its own line, nx*ny native float32 values
+    stored latitude by latitude, and a newline. Latitudes should be in ascending order.
+    The number of frames in the header is filled in when the writer is closed, or given up front
+    when writing to a pipe.
+
+    Usage
+    -----
+    with FieldWriter('vor850.dat', lon, lat) as w:
+        w.write(block)   # block of shape (ntime, nlat, nlon) or (nlat, nlon)
+    """
+
+    def __init__(self, filename, lon=None, lat=None, mode='w', nframes=None):
+        """
+        Parameters
+        ----------
+        filename : str
+            Field file to write.
+        lon, lat : array_like
+            Longitudes and latitudes of the grid. Only needed for mode='w' - with mode='a'
+            they are read from the file, and checked against these if passed.
+        mode : str
+            'w' writes a new file, 'a' appends frames to an existing one.
+        nframes : int or None
+            With mode='w', the number of frames that will be written, put in the header from
+            the start. Only needed for files that can not be rewritten at the end, such as a pipe.
+            With mode='a', the number of frames of the file to append after. Any later frames,
+            such as those left by an interrupted append, are dropped first. Defaults to the
+            number of frames in its header.
+        """
+        self.filename = filename
+        if mode == 'w':
+            if lon is None or lat is None:
+                raise ValueError("The grid, lon and lat, is needed to write a new field file")
+            self.lon = np.asarray(lon, dtype=np.float32)
+            self.lat = np.asarray(lat, dtype=np.float32)
+            self.nframes = 0
+            self._f = open(filename, 'wb')
+            self._header = self._header_line(max(nframes or 0, 1))
+            self._f.write(self._header)
+            self._f.write(_grid_text(self.lon, self.lat))
+        elif mode == 'a':
+            self._f = open(filename, 'r+b')
+            self._header = self._f.readline()
+            self._f.seek(0)
+            nx, ny, nold, grid = _field_header(self._f)
+            self.lon, self.lat = _parse_grid(grid, nx, ny)
+            if lon is not None and lat is not None and _grid_text(lon, lat) != grid:
+                self._f.close()
+                raise ValueError("Can not append to " + str(filename) + ", the grids differ")
+            self.nframes = nold if nframes is None else nframes
+            end = self._f.tell() + sum(len(b"FRAME %6d\n" % n) + nx * ny * 4 + 1
+                                       for n in range(1, self.nframes + 1))
+            self._f.truncate(end)
+            self._f.seek(end)
+        else:
+            raise ValueError("Unknown mode " + repr(mode) + ", use 'w' or 'a'")
+
+    def _header_line(self, nframes):
+        return b"%6d %6d %6d\n" % (len(self.lon), len(self.lat), nframes)
+
+    def write(self, frames):
+        """
+        Appends one frame of shape (nlat, nlon) or a block of frames of shape (ntime, nlat, nlon).
+        Contiguous float32 frames, such as those of a Field read with open_field(), are written
+        without a copy.
+        """
+        frames = np.asarray(frames, dtype=np.float32)
+        if frames.ndim == 2:
+            frames = frames[None]
+        if frames.shape[1:] != (len(self.lat), len(self.lon)):
+            raise ValueError("Frame shape " + str(frames.shape[1:]) + " does not match the grid " +
+                             str((len(self.lat), len(self.lon))))
+        for frame in frames:
+            self.nframes += 1
+            self._f.write(b"FRAME %6d\n" % self.nframes)
+            self._f.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+            self._f.write(b"\n")
+
+    def close(self):
+        """
+        Writes the final number of frames into the header and closes the file.
+        """
+        if self._f is None:
+            return
+        line = self._header_line(self.nframes)
+        try:
+            if not self._f.seekable():
+                # a pipe keeps the header written at the start
+                return
+            if len(line) != len(self._header):
+                raise ValueError("The frame count of " + str(self.filename) + " does not fit in its header")
+            self._f.seek(0)
+            self._f.write(line)
+        finally:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _grid_text(lon, lat):
+    # the grid lines of the header, as written by write_header()
+    text = ""
+    for grid in (np.asarray(lon, dtype=np.float32), np.asarray(lat, dtype=np.float32)):
+        for i, value in enumerate(grid):
+            text += "%12.5f " % value
+            if (i + 1) % 10 == 0:
+                text += "\n"
+        if len(grid) % 10:
+            text += "\n"
+    return text.encode()
+
+
+def _parse_grid(grid, nx, ny):
+    values = np.array(grid.split(), dtype=np.float32)
+    return values[:nx], values[nx:nx + ny]
+
+
+def _field_header(f):
+    # reads the header of a TRACK binary field file, returning nx, ny, nframes and the grid lines
+    nx, ny, nframes = (int(v) for v in f.readline().split())
+    grid, nvalues = b"", 0
+    while nvalues < nx + ny:
+        line = f.readline()
+        if not line:
+            raise ValueError("File ended inside the grid of the field header")
+        grid += line
+        nvalues += len(line.split())
+    return nx, ny, nframes, grid
+
+
+class Field(object):
+    """
+    TRACK binary field file mapped into memory, as returned by open_field().
+
+    Frames are read from the file as they are accessed, through views of a numpy.memmap,
+    so opening even a large file is immediate and slicing it copies nothing.
+
+    Attributes
+    ----------
+    filename : str
+        Name of the file.
+    lon, lat : numpy.ndarray
+        Longitudes and latitudes of the grid, from the header.
+    values : numpy.memmap
+        Frames as an array of shape (nframes, nlat, nlon) of float32, a view of the file.
+    """
+
+    def __init__(self, filename, mode='r'):
+        if mode not in ('r', 'r+'):
+            raise ValueError("Unknown mode " + repr(mode) + ", use 'r' or 'r+'")
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            nx, ny, nframes, grid = _field_header(f)
+            offset = f.tell()
+            tag = f.readline()
+            if nframes and not tag.startswith(b"FRAME"):
+                raise ValueError("Expected FRAME after the header of " + str(filename))
+            f.seek(offset + len(tag) + nx * ny * 4)
+            sep = 1 if f.read(1) == b"\n" else 0
+        self.lon, self.lat = _parse_grid(grid, nx, ny)
+
+        # every frame is a record of its FRAME line, the values and the newline
+        record = np.dtype([('tag', 'S%d' % len(tag)), ('values', '=f4', (ny, nx)), ('sep', 'S%d' % sep)])
+        if offset + nframes * record.itemsize > os.path.getsize(filename):
+            raise ValueError("File " + str(filename) + " ended inside a frame")
+        if nframes == 0:
+            # an empty file can not be mapped
+            self._records = np.zeros(0, dtype=record)
+        else:
+            self._records = np.memmap(filename, dtype=record, mode=mode, offset=offset, shape=(nframes,))
+        if nframes and not self._records[-1]['tag'].startswith(b"FRAME"):
+            raise ValueError("The frames of " + str(filename) + " are not all the same size, or its "
+                             "header holds the wrong number of frames")
+        self.values = self._records['values']
+
+    @property
+    def frames(self):
+        """
+        Frame numbers, from the FRAME lines.
+        """
+        return np.array([int(tag[5:]) for tag in self._records['tag']])
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def flush(self):
+        """
+        Writes changes made to the frames of a field opened with mode='r+' to the file.
+        """
+        if isinstance(self._records, np.memmap):
+            self._records.flush()
+
+    def close(self):
+        """
+        Drops the memory map. Views of it taken before stay valid.
+        """
+        self._records = None
+        self.values = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_field(filename, mode='r', lon=None, lat=None):
+    """
+    Opens a field file in TRACK's binary format, such as the vorticity written by
+    calc_vorticity() or a band of the spectral filter.
+
+    Parameters
+    ----------
+    filename : str
+        Field file.
+    mode : str
+        'r' maps the file read only, and 'r+' for changing frames in place - both return a Field,
+        whose frames are a zero-copy numpy.memmap view indexed by frame. 'w' starts a new file
+        on the grid lon, lat and 'a' appends to an existing one - both return a FieldWriter
+        that frames are streamed to.
+    lon, lat : array_like
+        Grid of a new file, for mode='w'.
+
+    Returns
+    -------
+    Field or FieldWriter
+
+    Usage
+    -----
+    with open_field('vor850_NH_yall.dat') as field:
+        print(field.shape, field[10].max())
+
+    with open_field('T42filt_vor850.dat') as src, open_field('subset.dat', 'w', src.lon, src.lat) as dst:
+        dst.write(src[100:200])
+    """
+    if mode in ('r', 'r+'):
+        return Field(filename, mode)
+    return FieldWriter(filename, lon, lat, mode=mode)
+
+
+def append_field(filename, new_frames, nframes=None):
+    """
+    Appends the frames of the field file new_frames to the field file filename, in place.
+
+    Both files are in TRACK's binary field format (see FieldWriter) and must be on the same grid.
+    The frames are renumbered to follow on from those of filename, and the number of frames in
+    its header is updated, so that the result is the file TRACK would have written for the
+    combined time series.
+
+    Parameters
+    ----------
+    filename : str
+        Field file to append to.
+    new_frames : str
+        Field file with the frames to append.
+    nframes : int or None
+        Number of frames of filename to append after. Any later frames, such as those left by an
+        interrupted append, are dropped first. Defaults to the number of frames in its header.
+
+    Returns
+    -------
+    int
+        Number of frames of the combined file.
+    """
+    new = Field(new_frames)
+    with FieldWriter(filename, new.lon, new.lat, mode='a', nframes=nframes) as w:
+        # straight from the memory map of new_frames to the file
+        w.write(new.values)
+    return w.nframes
+
+
+class Tracks(object):
+    """
+    Columnar set of tracks, as read from a TRACK track file by read_tracks().
+
+    The points of all tracks are stored in one flat table, points, a dictionary of equal
+    length arrays. The points of track i are points[col][offsets[i]:offsets[i + 1]].
+
+    Attributes
+    ----------
+    header : dict
+        File header - aniso, awt, sum_wt, iper_num, sum_per, gpr, ipr, alat, alng, nff, nfld
+        and nfwpos (positional flag of every additional field).
+    track_id : numpy.ndarray
+        Track IDs.
+    start_time : numpy.ndarray or None
+        Start times (YYYYMMDDHH) of the tracks, None for files using frame numbers.
+    offsets : numpy.ndarray
+        Offsets of the tracks into the points table, of length len(track_id) + 1.
+    points : dict
+        Point columns. 'time' (or 'frame'), 'lon', 'lat' and 'intensity', followed by the
+        additional fields as 'field{n}', with 'field{n}_lon' and 'field{n}_lat' for fields with
+        positional information, and then, where present in the file, 'sh_an', 'or_vec0',
+        'or_vec1', 'area', 'wght' and 'nfm'. Undefined additional field values are ADD_UNDEF.
+    """
+
+    def __init__(self, header, track_id, start_time, offsets, points):
+        self.header = header
+        self.track_id = track_id
+        self.start_time = start_time
+        self.offsets = offsets
+        self.points = points
+
+    def __len__(self):
+        return len(self.track_id)
+
+    def __getitem__(self, i):
+        """
+        Returns the point columns of track i as a dictionary of array views.
+        """
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return {col: values[start:end] for col, values in self.points.items()}
+
+    @property
+    def num_points(self):
+        """
+        Number of points in every track.
+        """
+        return np.diff(self.offsets)
+
+    @classmethod
+    def concatenate(cls, parts):
+        """
+        Joins a sequence of Tracks read from the same file, such as the chunks of iter_tracks().
+        """
+        parts = list(parts)
+        if not parts:
+            raise ValueError("No tracks to concatenate")
+        lengths = np.cumsum([0] + [p.offsets[-1] for p in parts[:-1]])
+        offsets = np.concatenate([parts[0].offsets[:1]] +
+                                 [p.offsets[1:] + n for p, n in zip(parts, lengths)])
+        start_time = None
+        if parts[0].start_time is not None:
+            start_time = np.concatenate([p.start_time for p in parts])
+        points = {col: np.concatenate([p.points[col] for p in parts]) for col in parts[0].points}
+        return cls(parts[0].header, np.concatenate([p.track_id for p in parts]),
+                   start_time, offsets, points)
+
+
+def _read_header(f):
+    # follows read_tracks.c - an optional anisotropy flag line with WT_INFO or PER_INFO,
+    # the projection and the TRACK_NUM line with the additional field information
+    header = dict(aniso=False, awt=0, sum_wt=0.0, iper_num=0, sum_per=0.0, gpr=0, ipr=0,
+                  alat=None, alng=None)
+    line = f.readline().split()
+    if len(line) == 1:
+        header['aniso'] = int(line[0]) == 1
+        line = f.readline().split()
+        if line[0] == b'WT_INFO':
+            header['awt'], header['sum_wt'] = int(line[1]), float(line[2])
+            line = f.readline().split()
+            if line[0] == b'IND_WTS':
+                # individual weights, followed by the projection
+                nweights = int(line[1]) * int(line[2])
+                tokens = []
+                while len(tokens) < nweights + 2:
+                    tokens += f.readline().split()
+                header['weights'] = np.array(tokens[:nweights], dtype=np.float64)
+                line = tokens[nweights:nweights + 2]
+        elif line[0] == b'PER_INFO':
+            header['iper_num'], header['sum_per'] = int(line[1]), float(line[2])
+            line = f.readline().split()
+        elif len(line) == 1:
+            header['awt'] = int(line[0])
+            line = f.readline().split()
+    header['gpr'], header['ipr'] = int(line[0]), int(line[1])
+    if header['gpr']:
+        line = f.readline().split()
+        header['alat'], header['alng'] = float(line[0]), float(line[1])
+
+    line = f.readline()
+    if not line.startswith(b'TRACK_NUM'):
+        raise ValueError("Not a TRACK track file, expected TRACK_NUM but found " + repr(line))
+    tokens = line.split(b'&')[0].split()
+    header['ntracks'], header['nff'], header['nfld'] = int(tokens[1]), int(tokens[3]), int(tokens[4])
+    flags = line.split(b'&')[1].strip() if b'&' in line else b''
+    header['nfwpos'] = [int(c) for c in flags.decode()[:header['nff']]]
+    return header
+
+
+def _columns(header, time):
+    # names of the columns of a point line, in the order they are written by meantrd.c
+    cols = [time, 'lon', 'lat', 'intensity']
+    for n, pos in enumerate(header['nfwpos'], 1):
+        cols += ['field%d_lon' % n, 'field%d_lat' % n, 'field%d' % n] if pos else ['field%d' % n]
+    if len(cols) - 4 != header['nfld']:
+        raise ValueError("Additional field flags do not match the %d field values" % header['nfld'])
+    if header['aniso']:
+        cols += ['sh_an', 'or_vec0', 'or_vec1', 'area']
+    if header['awt']:
+        cols += ['wght']
+    return cols
+
+
+def _parse_points(buf, ncol):
+    # Parses point lines into an (npoints, ncol) array, and the optional trailing nfm value
+    # that is only written when it is non-zero. Tokens are counted per line from the bytes.
+    if not buf:
+        return np.zeros((0, ncol)), np.zeros(0, dtype=np.int32)
+    a = np.frombuffer(buf, dtype=np.uint8)
+    sep = (a == ord(' ')) | (a == ord('\n')) | (a == ord('&')) | (a == ord('\t'))
+    starts = ~sep
+    starts[1:] &= sep[:-1]
+    ntokens = np.cumsum(starts, dtype=np.int32)[a == ord('\n')]
+    counts = np.diff(ntokens, prepend=0)
+
+    values = np.fromstring(buf.replace(b'&', b' '), sep=' ')
+    if len(values) != ntokens[-1] or np.any((counts != ncol) & (counts != ncol + 1)):
+        raise ValueError("Unexpected number of values on a track point line, expected %d" % ncol)
+
+    first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    table = values[first[:, None] + np.arange(ncol)]
+    nfm = np.zeros(len(counts), dtype=np.int32)
+    has_nfm = counts == ncol + 1
+    nfm[has_nfm] = values[first[has_nfm] + ncol]
+    return table, nfm
+
+
+def _chunk(header, cols, ids, times, nums, bufs, block_size=1 << 26):
+    # the point lines are parsed in blocks of about block_size bytes to bound the memory used
+    tables, nfms = [], []
+    start, size = 0, 0
+    for i, buf in enumerate(bufs):
+        size += len(buf)
+        if size >= block_size or i == len(bufs) - 1:
+            table, nfm = _parse_points(b''.join(bufs[start:i + 1]), len(cols))
+            tables.append(table)
+            nfms.append(nfm)
+            start, size = i + 1, 0
+    table = np.concatenate(tables) if tables else np.zeros((0, len(cols)))
+    nfm = np.concatenate(nfms) if nfms else np.zeros(0, dtype=np.int32)
+    if len(table) != sum(nums):
+        raise ValueError("File ended before the last track was complete")
+    points = {}
+    for i, col in enumerate(cols):
+        if col in ('time', 'frame'):
+            points[col] = table[:, i].astype(np.int64)
+        else:
+            points[col] = table[:, i].copy()
+    points['nfm'] = nfm
+    offsets = np.concatenate(([0], np.cumsum(nums))).astype(np.int64)
+    start_time = np.array(times, dtype=np.int64) if cols[0] == 'time' else None
+    return Tracks(header, np.array(ids, dtype=np.int64), start_time, offsets, points)
+
+
+def iter_tracks(filename, chunk_size=10000):
+    """
+    Reads a TRACK track file (tr_trs_*, ff_trs_*, ...) in chunks, for files too large to load
+    at once.
+
+    Parameters
+    ----------
+    filename : str
+        Track file to read.
+    chunk_size : int
+        Number of tracks per chunk.
+
+    Yields
+    ------
+    Tracks
+        The next chunk_size tracks of the file (fewer for the last chunk), sharing the file header.
+    """
+    with open(filename, 'rb') as f:
+        header = _read_header(f)
+        cols = None
+        ids, times, nums, bufs = [], [], [], []
+        for line in f:
+            if not line.strip():
+                continue
+            tokens = line.split()
+            if tokens[0] != b'TRACK_ID':
+                raise ValueError("Expected TRACK_ID but found " + repr(line))
+            if cols is None:
+                cols = _columns(header, 'time' if len(tokens) > 2 else 'frame')
+            ids.append(int(tokens[1]))
+            times.append(int(tokens[3]) if len(tokens) > 3 else 0)
+
+            num = int(f.readline().split()[1])
+            nums.append(num)
+            block = b''.join(islice(f, num))
+            if block and not block.endswith(b'\n'):
+                block += b'\n'
+            bufs.append(block)
+
+            if len(ids) == chunk_size:
+                yield _chunk(header, cols, ids, times, nums, bufs)
+                ids, times, nums, bufs = [], [], [], []
+
+        if ids or cols is None:
+            yield _chunk(header, cols or _columns(header, 'time'), ids, times, nums, bufs)
+
+
+def read_tracks(filename, chunk_size=10000):
+    """
+    Reads a TRACK track file (tr_trs_*, ff_trs_*, ...) into columnar numpy arrays.
+
+    The file format is the one read by read_tracks.c, including the WT_INFO/PER_INFO headers,
+    anisotropy information and additional fields. See Tracks for the layout of the result.
+
+    Parameters
+    ----------
+    filename : str
+        Track file to read.
+    chunk_size : int
+        Number of tracks parsed at a time, which bounds the temporary memory used while reading.
+
+    Returns
+    -------
+    Tracks
+    """
+    return Tracks.concatenate(iter_tracks(filename, chunk_size=chunk_size))
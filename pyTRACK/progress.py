@@ -0,0 +1,142 @@
+import os
+import re
+import sys
+import threading
+from contextlib import contextmanager
+
+# lines TRACK prints for every frame - feature identification (threshold.c), and reading a
+# frame of a netCDF field (netcdf_read_field.c)
+_FRAME = re.compile(rb"^\s*(?:Processing frame|Frame)\s+(\d+)")
+
+# setvbuf() modes in glibc
+_IOFBF, _IOLBF, _IONBF = 0, 1, 2
+
+
+class _FrameParser(object):
+    # turns blocks of TRACK output into the frame numbers it reports, once each and in order
+
+    def __init__(self):
+        self._rest = b''
+        self.frame = 0
+
+    def feed(self, block):
+        lines = (self._rest + block).split(b'\n')
+        self._rest = lines.pop()
+        frames = []
+        for line in lines:
+            m = _FRAME.match(line)
+            # the netCDF reader reports a frame once per variable
+            if m is not None and int(m.group(1)) != self.frame:
+                self.frame = int(m.group(1))
+                frames.append(self.frame)
+        return frames
+
+
+def _set_stdout_buffering(mode, size=0):
+    # sets the buffering of C stdout, returning the mode and size it had before - C stdout is
+    # fully buffered when it is a pipe, which would hold the frames back
+    import ctypes
+
+    libc = ctypes.CDLL(None)
+    stdout = ctypes.c_void_p.in_dll(libc, 'stdout')
+    libc.fflush(stdout)
+    old_size = libc.__fbufsize(stdout)
+    if libc.__flbf(stdout):
+        old = _IOLBF
+    elif old_size == 1:
+        # an unbuffered stream has a buffer of one character
+        old = _IONBF
+    else:
+        old = _IOFBF
+    libc.setvbuf(stdout, None, mode, size)
+    return old, old_size
+
+
+class _CaptureFrames(object):
+    """
+    Sends everything written to fd 1 inside it through a pipe, calling callback with the
+    number of every frame TRACK reports, from a reader thread, and passing the output on to
+    where fd 1 went before - the terminal, or /dev/null inside run_silent().
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __enter__(self):
+        import ctypes
+
+        sys.stdout.flush()
+        ctypes.CDLL(None).fflush(None)
+        self._saved = os.dup(1)
+        r, w = os.pipe()
+        os.dup2(w, 1)
+        os.close(w)
+        self._buffering = _set_stdout_buffering(_IOLBF)
+        self._thread = threading.Thread(target=self._read, args=(r,), daemon=True)
+        self._thread.start()
+        return self
+
+    def _read(self, r):
+        parser = _FrameParser()
+        with os.fdopen(r, 'rb', buffering=0) as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                os.write(self._saved, block)
+                for frame in parser.feed(block):
+                    try:
+                        self.callback(frame)
+                    except Exception:
+                        # a failing callback must not block TRACK on a full pipe
+                        self.callback = lambda frame: None
+
+    def __exit__(self, *args):
+        import ctypes
+
+        sys.stdout.flush()
+        ctypes.CDLL(None).fflush(None)
+        # closes the last write end of the pipe, so the reader sees the end of it
+        os.dup2(self._saved, 1)
+        _set_stdout_buffering(*self._buffering)
+        self._thread.join()
+        os.close(self._saved)
+
+
+class _FrameBar(object):
+    """
+    Progress bar over the frames of TRACK runs going on at the same time, with frames per
+    second and ETA. Run i covers frames ranges[i] = (first, last), and the bar is called with
+    i and every frame the run reports.
+    """
+
+    def __init__(self, ranges, desc):
+        from tqdm import tqdm
+
+        self.ranges = ranges
+        self.done = [0] * len(ranges)
+        self.bar = tqdm(total=sum(last - first + 1 for first, last in ranges), desc=desc,
+                        unit="frame", leave=False)
+
+    def __call__(self, i, frame):
+        first, last = self.ranges[i]
+        done = max(0, min(frame, last) - first + 1)
+        if done > self.done[i]:
+            self.bar.update(done - self.done[i])
+            self.done[i] = done
+
+    def close(self):
+        self.bar.close()
+
+
+@contextmanager
+def _chunk_progress(progress, runs, desc):
+    # the progress callback, called with (i, frame), for the chunk runs (N, sign, first, last) of
+    # track_splice() - a bar for progress=True, or progress(N, sign, frame) for a callable
+    if progress is True:
+        bar = _FrameBar([(first, last) for N, sign, first, last in runs], desc)
+        try:
+            yield bar
+        finally:
+            bar.close()
+    elif callable(progress):
+        yield lambda i, frame: progress(runs[i][0], runs[i][1], frame)
+    else:
+        yield None
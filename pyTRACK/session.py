@@ -0,0 +1,341 @@
+import os
+import sys
+from collections import namedtuple
+
+__all__ = ['TrackSession', 'TrackResult', 'TrackProgress']
+
+TrackResult = namedtuple('TrackResult', ['status', 'output'])
+TrackResult.__doc__ = "Exit status and captured stdout/stderr (bytes) of one TRACK run."
+
+TrackProgress = namedtuple('TrackProgress', ['job', 'frame', 'result'])
+TrackProgress.__doc__ = ("Event of TrackSession.stream() - a frame that TRACK run job has processed, "
+                         "or its TrackResult once it has finished, with frame None.")
+
+
+def _namelist_fd(text):
+    # stdin for TRACK, from the namelist text sent by the session
+    try:
+        fd = os.memfd_create("namelist", 0)
+    except (AttributeError, OSError):
+        import tempfile
+        fd, path = tempfile.mkstemp()
+        os.unlink(path)
+    os.write(fd, text)
+    os.lseek(fd, 0, os.SEEK_SET)
+    return fd
+
+
+def _reset_c_stdin():
+    # drop whatever the C stdin stream inherited (buffered input, EOF flag) from the parent,
+    # so that TRACK reads the namelist now on fd 0
+    import ctypes
+
+    libc = ctypes.CDLL(None)
+    stdin = ctypes.c_void_p.in_dll(libc, 'stdin')
+    if hasattr(libc, '__fpurge'):
+        libc.__fpurge(stdin)
+    libc.clearerr(stdin)
+
+
+def _run_forked(lib, input_file, ext, namelist, workdir, progress=None):
+    """
+    Runs one TRACK call in a child forked from the worker, and returns its TrackResult and
+    the resource use of the child, see trace.Trace.add(). The worker itself never calls
+    track_main, so it keeps the freshly loaded library state and survives TRACK calling exit().
+    If progress is passed, it is called with every frame TRACK reports, as the output arrives.
+    """
+    import time
+    import ctypes
+    from .track import set_track_env, _track_args
+    from .trace import _child_usage
+    from .progress import _FrameParser, _set_stdout_buffering, _IOLBF
+
+    r, w = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.close(r)
+            os.chdir(workdir)
+            stdin = _namelist_fd(namelist) if namelist is not None else os.open(os.devnull, os.O_RDONLY)
+            os.dup2(stdin, 0)
+            os.dup2(w, 1)
+            os.dup2(w, 2)
+            _reset_c_stdin()
+            if progress is not None:
+                _set_stdout_buffering(_IOLBF)
+            set_track_env()
+            argc, argv = _track_args(input_file, ext)
+            status = lib.track_main(argc, argv)
+            # the C stdio buffers are not flushed by os._exit
+            ctypes.CDLL(None).fflush(None)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            sys.stderr.flush()
+        finally:
+            os._exit(status & 0xff)
+
+    os.close(w)
+    chunks = []
+    parser = _FrameParser()
+    with os.fdopen(r, 'rb', buffering=0) as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            chunks.append(block)
+            if progress is not None:
+                for frame in parser.feed(block):
+                    progress(frame)
+    st, usage = _child_usage(pid, time.perf_counter() - start)
+    return TrackResult(os.waitstatus_to_exitcode(st), b''.join(chunks)), usage
+
+
+def _session_worker(conn, lib):
+    # worker loop - receives (input_file, ext, namelist, workdir, progress) jobs until None or EOF,
+    # and sends the frames of the run as ints if progress is set, then its result
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        *job, progress = job
+        conn.send(_run_forked(lib, *job, progress=conn.send if progress else None))
+    conn.close()
+
+
+class TrackSession(object):
+    """
+    Pool of pre-forked worker processes for running many TRACK calls.
+
+    libtrack is loaded once, before the workers are forked. Jobs are sent to the workers over a
+    pipe, and every TRACK call then runs in a short-lived child of its worker, in its own working
+    directory, with its stdout and stderr captured. A TRACK call that exits, crashes or fails
+    only ends that child, and a worker that exits for any other reason is replaced.
+
+    Usage
+    -----
+    with TrackSession(workers=4) as session:
+        results = session.map([dict(input_file='input.nc', ext='_1', namelist='RUN.in', workdir='run1'),
+                               dict(input_file='input.nc', ext='_2', namelist='RUN.in', workdir='run2')])
+    """
+
+    def __init__(self, workers=1):
+        """
+        Parameters
+        ----------
+        workers : int
+            Number of TRACK calls run at the same time.
+        """
+        import multiprocessing
+        from .track import _load_libtrack
+
+        self._ctx = multiprocessing.get_context("fork")
+        self._lib = _load_libtrack()
+        self.workers = max(1, int(workers))
+        self._pool = [self._start() for i in range(self.workers)]
+
+    def _start(self):
+        parent, child = self._ctx.Pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        p = self._ctx.Process(target=_session_worker, args=(child, self._lib), daemon=True)
+        p.start()
+        child.close()
+        return p, parent
+
+    def map(self, jobs, callback=None, check=True, progress=None):
+        """
+        Runs TRACK for every job, up to workers at a time.
+
+        Parameters
+        ----------
+        jobs : list
+            List of dictionaries with the arguments of track() - input_file, ext and namelist -
+            and the working directory, workdir, of the run (default is the current directory).
+            The namelist file is read here and sent to the worker. input_file may also be a
+            field in memory or a MemoryFile, which is written to /dev/shm while the jobs run.
+        callback : callable or None
+            Called with the index and TrackResult of each job as it finishes.
+        check : bool
+            Raise a RuntimeError if any run fails. Otherwise the failures are only reported
+            through the exit status of their TrackResult.
+        progress : callable or None
+            Called with the index of a job and the number of every frame its TRACK run reports
+            as processed, while it runs. The output of the run is parsed by its worker.
+
+        Returns
+        -------
+        list
+            TrackResult of every job, in the order of jobs.
+        """
+        from contextlib import ExitStack
+        from .utils import _shared_path
+
+        with ExitStack() as stack:
+            shared = {}
+            messages = []
+            for job in jobs:
+                namelist = job.get('namelist')
+                if namelist is not None:
+                    if not os.path.exists(namelist):
+                        raise FileNotFoundError(f"Namelist not found: {namelist}")
+                    with open(namelist, 'rb') as f:
+                        namelist = f.read()
+                workdir = os.path.abspath(job.get('workdir') or os.getcwd())
+                os.makedirs(workdir, exist_ok=True)
+                # the worker can not open the /proc/self/fd path of a MemoryFile, which is copied
+                # to /dev/shm once for all the jobs that read it
+                input_file = job.get('input_file', 'input.nc')
+                key = os.fspath(input_file) if isinstance(input_file, (str, os.PathLike)) else id(input_file)
+                if key not in shared:
+                    shared[key] = _shared_path(input_file, stack)
+                messages.append((shared[key], job.get('ext', '_ext'), namelist, workdir, progress is not None))
+            results = self._dispatch(messages, callback, progress)
+
+        if check:
+            for i, result in enumerate(results):
+                if result.status != 0:
+                    tail = result.output[-2000:].decode(errors='replace')
+                    raise RuntimeError(f"TRACK job {i} in {messages[i][3]} failed with exit code "
+                                       f"{result.status}:\n{tail}")
+        return results
+
+    def _dispatch(self, messages, callback, progress):
+        # sends the job messages to the workers, and returns the TrackResult of every job
+        from multiprocessing.connection import wait
+        from .trace import _add
+
+        pending = list(range(len(messages)))
+        idle = list(range(self.workers))
+        busy = {}
+        results = [None] * len(messages)
+        retried = [False] * len(messages)
+
+        while pending or busy:
+            while pending and idle:
+                w = idle.pop()
+                i = pending.pop(0)
+                try:
+                    self._pool[w][1].send(messages[i])
+                    busy[w] = i
+                except (BrokenPipeError, OSError):
+                    # the worker has gone, start a new one and try again
+                    self._replace(w)
+                    idle.append(w)
+                    pending.insert(0, i)
+
+            conns = {self._pool[w][1]: w for w in busy}
+            sentinels = {self._pool[w][0].sentinel: w for w in busy}
+            for ready in wait(list(conns) + list(sentinels)):
+                w = conns.get(ready, sentinels.get(ready))
+                if w not in busy:
+                    continue
+                i = busy[w]
+                try:
+                    message = self._pool[w][1].recv()
+                    if isinstance(message, int):
+                        # a frame of the run, which goes on
+                        progress(i, message)
+                        continue
+                    busy.pop(w)
+                    results[i], usage = message
+                    _add("track", usage, ext=messages[i][1], workdir=messages[i][3])
+                except (EOFError, OSError):
+                    busy.pop(w)
+                    # the worker itself died, not the TRACK call - replace it and run the job again
+                    process = self._pool[w][0]
+                    process.join()
+                    self._replace(w)
+                    idle.append(w)
+                    if not retried[i]:
+                        retried[i] = True
+                        pending.insert(0, i)
+                        continue
+                    results[i] = TrackResult(process.exitcode or -1, b'')
+                else:
+                    idle.append(w)
+                if callback is not None:
+                    callback(i, results[i])
+        return results
+
+    def run(self, input_file="input.nc", ext='_ext', namelist=None, workdir=None, check=True):
+        """
+        Runs TRACK once, as track() does but inside the session, and returns its TrackResult.
+        """
+        return self.map([dict(input_file=input_file, ext=ext, namelist=namelist, workdir=workdir)],
+                        check=check)[0]
+
+    async def stream(self, jobs, check=True):
+        """
+        Runs TRACK for every job as map() does, as an async iterator of TrackProgress events -
+        one for every frame a run reports as processed, and one with the TrackResult of every
+        run as it finishes. The runs go on in a separate thread, so the event loop is free.
+
+        Usage
+        -----
+        async for event in session.stream(jobs):
+            if event.result is None:
+                print('job', event.job, 'is at frame', event.frame)
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def put(item):
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        def run():
+            try:
+                self.map(jobs, callback=lambda i, result: put(TrackProgress(i, None, result)),
+                         check=check, progress=lambda i, frame: put(TrackProgress(i, frame, None)))
+                put(None)
+            except BaseException as e:
+                put(e)
+
+        done = loop.run_in_executor(None, run)
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            await done
+
+    def _replace(self, w):
+        process, conn = self._pool[w]
+        conn.close()
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        self._pool[w] = self._start()
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        for process, conn in self._pool:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            conn.close()
+        for process, conn in self._pool:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._pool = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
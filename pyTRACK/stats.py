@@ -1,70 +1,639 @@
-import os
-from math import ceil
-from .track import track, track_splice
-from .utils import run_silent
-from pathlib import Path
-
-__all__ = ['stats_track']
-
-def stats_track(outdirectory=None, keep_all_files=False):
-    """
-    Workflow to compute statistics from features tracked using track_uv().
-
-    The statistics file are output inside the corresponding {hemisphere}_y{year} folder in the outdirectory.
-
-    Parameters
-    ----------
-    outdirectory : str
-        Path to the output directory, same as that passed to track_uv()
-    keep_all_files : bool
-        Do you want to keep all the intermediate files? Default is no.
-        Turn this on if you want to retreive these files, or during development.
-    """
-
-
-    pkgpath=os.path.dirname(__file__)
-    indat=os.path.join(pkgpath, "indat", "STATS_template_area.in")
-    indat_def=os.path.join(pkgpath, "data", "gridT63.nc")
-
-    if outdirectory is not None:
-        os.chdir(outdirectory+'/output_track')
-    else:
-        os.chdir('output_track')
-    
-    dirs = [
-    str(p.resolve())
-    for p in Path(".").iterdir()
-    if p.is_dir() and p.name.startswith(("NH", "SH"))
-    ]
-
-    for dir in dirs:
-        os.chdir(dir)
-        print('Entering', dir)
-
-        for file in ["ff_trs_pos", "ff_trs_neg"]:
-
-            os.system('sed -e "s/FILE_NAME/{file}/" {indat} > {dir}/track_stats.in'
-            .format(file=file, indat=indat, dir=dir))
-
-            print('Running stats for', file, "to write stats_"+file+".nc")
-            run_silent(track, input_file=indat_def, namelist=dir+'/track_stats.in')
-            os.system("mv "+ "stat_trs_scl_ext_1.nc stats_"+file+".nc")
-
-            if not keep_all_files:
-                os.remove('disp_trs_ext')
-                os.remove('gstat1.dat')
-                os.remove('init_trs_ext')
-                os.remove('initial_ext')
-                os.remove('phase_trs_ext')
-                os.remove('stat_trs_ext')
-                os.remove('stat_trs_ext_1.nc')
-                os.remove('stat_trs_scl_ext')
-                os.remove('track_stats.in')
-                os.remove('ff_trs_ext')
-                os.remove('ff_trs_ext.nc')
-
-
-
-
-
-
+import os
+import shutil
+import numpy as np
+from math import ceil
+from .track import track, track_splice
+from .utils import run_silent
+from .trace import _stage
+from pathlib import Path
+from tqdm import tqdm
+
+__all__ = ['stats_track', 'compute_stats']
+
+# files left in the working directory by a statistics run, besides stat_trs_scl_ext_1.nc
+_STATS_TEMPORARIES = ['disp_trs_ext', 'gstat1.dat', 'init_trs_ext', 'initial_ext', 'phase_trs_ext',
+                      'stat_trs_ext', 'stat_trs_ext_1.nc', 'stat_trs_scl_ext', 'track_stats.in',
+                      'ff_trs_ext', 'ff_trs_ext.nc']
+
+def _stats_namelist(file, namelist):
+    """
+    Writes the statistics namelist for the track file file to namelist.
+    """
+
+    indat=os.path.join(os.path.dirname(__file__), "indat", "STATS_template_area.in")
+    with open(indat) as f:
+        text = f.read()
+    with open(namelist, "w") as f:
+        f.write(text.replace("FILE_NAME", file))
+
+def stats_track(outdirectory=None, keep_all_files=False, workers=None, session=None, engine='track'):
+    """
+    Workflow to compute statistics from features tracked using track_uv().
+
+    The statistics file are output inside the corresponding {hemisphere}_y{year} folder in the outdirectory.
+
+    Parameters
+    ----------
+    outdirectory : str
+        Path to the output directory, same as that passed to track_uv()
+    keep_all_files : bool
+        Do you want to keep all the intermediate files? Default is no.
+        Turn this on if you want to retreive these files, or during development.
+    workers : int or None
+        Number of statistics runs to do at the same time. Default is None, which runs them one
+        after the other in the current process. If more than one, every (folder, track file) pair
+        runs in a separate process inside its own {hemisphere}_y{year}/scratch_stats_{file}
+        folder, which is kept with keep_all_files=True. The statistics are identical to those
+        of the serial run.
+    session : TrackSession or None
+        Session to run the TRACK calls in, instead of starting one with workers processes.
+    engine : str
+        'track' (default) runs TRACK with STATS_template_area.in. 'numpy' approximates these
+        kernel estimates with compute_stats(), without TRACK - see compute_stats() for the
+        differences.
+    """
+
+    pkgpath=os.path.dirname(__file__)
+    indat_def=os.path.join(pkgpath, "data", "gridT63.nc")
+
+    if outdirectory is None:
+        outdirectory = os.getcwd()
+    track_dir = os.path.join(os.path.abspath(os.path.expanduser(outdirectory)), 'output_track')
+
+    dirs = sorted(
+    str(p.resolve())
+    for p in Path(track_dir).iterdir()
+    if p.is_dir() and p.name.startswith(("NH", "SH"))
+    )
+
+    if engine == 'numpy':
+        for dir in dirs:
+            for file in ["ff_trs_pos", "ff_trs_neg"]:
+                print('Computing stats for', os.path.join(dir, file), "to write stats_"+file+".nc")
+                with _stage("stats", engine=engine, file=os.path.join(dir, file)):
+                    compute_stats(os.path.join(dir, file), output=os.path.join(dir, "stats_"+file+".nc"))
+    elif engine != 'track':
+        raise ValueError("Unknown statistics engine " + repr(engine) + ", use 'track' or 'numpy'")
+    elif session is None and (workers is None or workers <= 1):
+        curr = os.getcwd()
+        try:
+            for dir in dirs:
+                os.chdir(dir)
+                print('Entering', dir)
+
+                for file in ["ff_trs_pos", "ff_trs_neg"]:
+                    _stats_namelist(file, os.path.join(dir, 'track_stats.in'))
+
+                    print('Running stats for', file, "to write stats_"+file+".nc")
+                    with _stage("stats", engine=engine, file=os.path.join(dir, file)):
+                        run_silent(track, input_file=indat_def, namelist=dir+'/track_stats.in')
+                    os.replace("stat_trs_scl_ext_1.nc", "stats_"+file+".nc")
+
+                    if not keep_all_files:
+                        for tmp in _STATS_TEMPORARIES:
+                            os.remove(tmp)
+        finally:
+            os.chdir(curr)
+    else:
+        from .session import TrackSession
+
+        # the track file is linked into every scratch folder, so the namelists
+        # are the same as for the serial run
+        jobs = []
+        for dir in dirs:
+            for file in ["ff_trs_pos", "ff_trs_neg"]:
+                workdir = os.path.join(dir, "scratch_stats_"+file)
+                if os.path.exists(workdir):
+                    shutil.rmtree(workdir)
+                os.makedirs(workdir)
+                os.symlink(os.path.join(dir, file), os.path.join(workdir, file))
+                _stats_namelist(file, os.path.join(workdir, 'track_stats.in'))
+                jobs.append(dict(input_file=indat_def, namelist=os.path.join(workdir, 'track_stats.in'),
+                                 workdir=workdir))
+
+        own_session = session is None
+        if own_session:
+            session = TrackSession(workers)
+        try:
+            print("Running stats for " + str(len(jobs)) + " track files on " + str(session.workers) + " workers")
+            with tqdm(total=len(jobs), desc="Track statistics") as pbar, \
+                    _stage("stats", engine=engine, files=len(jobs), workers=session.workers):
+                session.map(jobs, callback=lambda i, result: pbar.update(1))
+        finally:
+            if own_session:
+                session.close()
+
+        for job in jobs:
+            workdir = job['workdir']
+            dir, name = os.path.split(workdir)
+            os.replace(os.path.join(workdir, "stat_trs_scl_ext_1.nc"),
+                       os.path.join(dir, name.replace("scratch_", "") + ".nc"))
+            if not keep_all_files:
+                shutil.rmtree(workdir)
+
+
+# constants of the TRACK statistics (statistic.h, statistic.c, splice.h, geo_values.h)
+_ADD_CHECK = 1.0e20
+_STATMISS = 1.0e10
+_DTOL = 1.0e-4
+_TTSTEP = 1.0e-4
+_LPERC = 0.333
+_EARTH_RADIUS = 6.37e3
+_CAP_5DEG = 0.023909410
+
+# variables of stat_trs_scl, in the order of netcdf_write_stats.c
+_STATS_FIELDS = [("mstr", "Mean Intensity"), ("stdstr", "Std of Intensity"), ("msp", "Mean Speed"),
+                 ("stdsp", "Std of Speed"), ("fden", "Feature Density"), ("gden", "Genesis Density"),
+                 ("lden", "Lysis Density"), ("tden", "Track Density"),
+                 ("xvel", "X-component of Mean Velocity"), ("yvel", "Y-component of Mean Velocity"),
+                 ("mlif", "Mean Lifetime"), ("mgdr", "Mean Growth/Decay Rate"),
+                 ("miso", "Mean Anisotropy"), ("xor", "X-component of Mean Orientation Vector"),
+                 ("yor", "Y-component of Mean Orientation Vector"), ("mten", "Mean Tendency"),
+                 ("marea", "Mean Area")]
+
+
+def _unit_vectors(lon, lat):
+    lon, lat = np.radians(lon), np.radians(lat)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _pairs(q, d, chord, max_pairs=1 << 22, slab=1 << 14, sub=2, qgroup=None, dgroup=None):
+    # Yields index arrays (iq, id) of all pairs of unit vectors q[iq], d[id] less than chord apart,
+    # along with some further apart. d is binned into cubic cells of side chord / sub, so that these
+    # pairs are at most sub cells apart. Every block holds all the pairs of its query points.
+    # With the integer labels qgroup and dgroup, only pairs within the same group are yielded.
+    nc = int(np.ceil(2.0 * sub / chord)) + 2 * sub + 1
+    r = range(-sub, sub + 1)
+    shifts = np.array([(i, j, k) for i in r for j in r for k in r])
+
+    def cells(v):
+        return np.floor((v + 1.0) * sub / chord).astype(np.int64) + sub
+
+    dc = cells(d)
+    key = (dc[:, 0] * nc + dc[:, 1]) * nc + dc[:, 2]
+    if dgroup is not None:
+        key += np.asarray(dgroup, dtype=np.int64) * nc ** 3
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+
+    for s in range(0, len(q), slab):
+        qc = cells(q[s:s + slab])[:, None, :] + shifts
+        nkey = (qc[..., 0] * nc + qc[..., 1]) * nc + qc[..., 2]
+        if qgroup is not None:
+            nkey += np.asarray(qgroup[s:s + slab], dtype=np.int64)[:, None] * nc ** 3
+        lo = np.searchsorted(key, nkey, 'left')
+        counts = np.searchsorted(key, nkey, 'right') - lo
+        total = np.cumsum(counts.sum(axis=1))
+        start = 0
+        while start < len(nkey):
+            done = total[start - 1] if start else 0
+            end = max(int(np.searchsorted(total, done + max_pairs, 'right')), start + 1)
+            c = counts[start:end].ravel()
+            n = int(c.sum())
+            if n:
+                first = np.repeat(lo[start:end].ravel(), c)
+                within = np.arange(n) - np.repeat(np.cumsum(c) - c, c)
+                iq = np.repeat(np.repeat(np.arange(s + start, s + end), len(shifts)), c)
+                yield iq, order[first + within]
+            start = end
+
+
+class _Grid(object):
+    # rectilinear longitude/latitude grid of the statistics, sorted along both axes
+
+    def __init__(self, lon, lat):
+        self.lon = np.sort(np.mod(np.asarray(lon, dtype=np.float64), 360.0))
+        self.lat = np.sort(np.asarray(lat, dtype=np.float64))
+        glon, glat = np.meshgrid(self.lon, self.lat)
+        self.xyz = _unit_vectors(glon.ravel(), glat.ravel())
+        self._lon3 = np.concatenate([self.lon - 360.0, self.lon, self.lon + 360.0])
+
+    def __len__(self):
+        return len(self.xyz)
+
+    def pairs(self, lon, lat, theta, max_pairs=1 << 22):
+        # Yields index arrays (iq, id) of the grid points iq inside the longitude/latitude box
+        # around the spherical cap of radius theta (degrees) of every data point id.
+        nlon = len(self.lon)
+        lon = np.mod(lon, 360.0)
+        j0 = np.searchsorted(self.lat, lat - theta, 'left')
+        nrows = np.searchsorted(self.lat, lat + theta, 'right') - j0
+        polar = np.abs(lat) + theta >= 90.0
+        with np.errstate(invalid='ignore'):
+            half = np.degrees(np.arcsin(np.sin(np.radians(theta)) / np.cos(np.radians(lat))))
+        half = np.where(polar, 180.0, half)
+        k0 = np.searchsorted(self._lon3, lon - half, 'left')
+        ncols = np.minimum(np.searchsorted(self._lon3, lon + half, 'right') - k0, nlon)
+        k0 = np.where(ncols == nlon, 0, k0)
+
+        counts = nrows * ncols
+        total = np.cumsum(counts)
+        start = 0
+        while start < len(lon):
+            done = total[start - 1] if start else 0
+            end = max(int(np.searchsorted(total, done + max_pairs, 'right')), start + 1)
+            c = counts[start:end]
+            n = int(c.sum())
+            if n:
+                id = np.repeat(np.arange(start, end), c)
+                within = np.arange(n) - np.repeat(np.cumsum(c) - c, c)
+                row = j0[id] + within // ncols[id]
+                col = (k0[id] + within % ncols[id]) % nlon
+                yield row * nlon + col, id
+            start = end
+
+
+def _kernel_pairs(q, d, tsm, pairs):
+    # Yields (iq, id, k) for the candidate pairs where the power kernel (exponent 1) of data point
+    # d[id], k = tsm[id] * cos(angle) - 1, is positive at q[iq].
+    for iq, id in pairs:
+        k = np.take(tsm, id) * np.einsum('ij,ij->i', np.take(q, iq, axis=0), np.take(d, id, axis=0)) - 1.0
+        pos = k > 0.0
+        yield iq[pos], id[pos], k[pos]
+
+
+def _kernel_sums(q, d, tsm, coef, pairs, values=None):
+    # sums of coef * kernel over the data points, and of coef * kernel * every column of values
+    ncol = 0 if values is None else values.shape[1]
+    out = np.zeros((len(q), 1 + ncol))
+    for iq, id, k in _kernel_pairs(q, d, tsm, pairs):
+        k *= coef[id]
+        out[:, 0] += np.bincount(iq, k, minlength=len(q))
+        for c in range(ncol):
+            out[:, 1 + c] += np.bincount(iq, k * values[id, c], minlength=len(q))
+    return out
+
+
+def _bin(d, weight, size, group):
+    # merges the unit vectors d of every group into cubic cells of side size, returning the
+    # normalised weighted centroid, total weight and group of every cell, and the cell of every point
+    c = np.floor((d + 1.0) / size).astype(np.int64)
+    n = int(np.ceil(2.0 / size)) + 1
+    cells, first, inverse = np.unique(((group * n + c[:, 0]) * n + c[:, 1]) * n + c[:, 2],
+                                      return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    centre = np.stack([np.bincount(inverse, weight * d[:, i], minlength=len(cells)) for i in range(3)], axis=1)
+    centre /= np.linalg.norm(centre, axis=1)[:, None]
+    return centre, np.bincount(inverse, weight, minlength=len(cells)), group[first], inverse
+
+
+def _bandwidths(d, weight, sm, dsm, alpha, nbins=None, group=None):
+    """
+    Adaptive smoothing parameters of the data points, as in sp_kernal_estimate.c (adaptive
+    smoothing, ht=3) - a leave-one-out pilot estimate with the global smoothing parameter sm,
+    local factors (pilot / geometric mean of the pilot)^alpha, scaled by sm and bounded below by dsm.
+
+    With nbins, the pilot estimate is evaluated on the data binned into cells nbins times smaller
+    than the kernel support, an approximation of TRACK's estimate between every pair of data
+    points. The integer labels group split the data into independent estimates.
+    """
+    group = np.zeros(len(d), dtype=np.int64) if group is None else np.asarray(group, dtype=np.int64)
+    sm = max(sm, dsm)
+    tsm = (1.0 + sm) / sm
+    chord = 2.0 * np.sin(np.arccos(1.0 / tsm) / 2.0)
+    if nbins is None:
+        centre, cw, cgroup, inverse = d, weight, group, np.arange(len(d))
+    else:
+        centre, cw, cgroup, inverse = _bin(d, weight, chord / nbins, group)
+    pilot = _kernel_sums(centre, centre, np.full(len(centre), tsm), cw,
+                         _pairs(centre, centre, chord, qgroup=cgroup, dgroup=cgroup))[:, 0]
+    # leave one out - the point (or the bin holding it) adds its own kernel at distance zero
+    pilot = pilot[inverse] - weight * (tsm - 1.0) + 1.0e-5
+    cons = 2.0 / (2.0 * np.pi) * tsm / (tsm - 1.0) ** 2
+    pilot = np.maximum(pilot, 1.0e-5) * cons / (np.bincount(group, weight)[group] - weight)
+    gg = np.exp(np.bincount(group, np.log(pilot)) / np.maximum(np.bincount(group), 1))[group]
+    return np.maximum((pilot / gg) ** alpha * sm, dsm)
+
+
+def _estimate(grid, lon, lat, values=None, weight=None, sm=400., dsm=0.1, alpha=0.5, std=(), nbins=None):
+    """
+    Adaptive spherical kernel estimate at the grid points of the density of the points (lon, lat)
+    and of the means of the columns of values, as computed by sqt_eval_stat.c with a power kernel
+    of exponent 1. Returns the density (a pdf), the means and the standard deviations of the
+    columns listed in std, all zero where the density is below TRACK's tolerance. nbins is passed
+    to _bandwidths().
+    """
+    ncol = 0 if values is None else values.shape[1]
+    zeros = np.zeros(len(grid))
+    if len(lon) <= 1:
+        return zeros, [zeros] * ncol, [zeros] * len(std)
+    weight = np.ones(len(lon)) if weight is None else np.asarray(weight, dtype=np.float64)
+    d = _unit_vectors(lon, lat)
+
+    h = _bandwidths(d, weight, sm, dsm, alpha, nbins)
+    tsm = (1.0 + h) / h
+    if std:
+        values = np.concatenate([values, values[:, list(std)] ** 2], axis=1)
+    pairs = grid.pairs(lon, lat, np.degrees(np.arccos(1.0 / tsm)))
+    sums = _kernel_sums(grid.xyz, d, tsm, weight * tsm / (tsm - 1.0) ** 2, pairs, values)
+
+    den = sums[:, 0] * 2.0 / (2.0 * np.pi * weight.sum())
+    ok = den > _DTOL
+    safe = np.where(ok, sums[:, 0], 1.0)
+    means = [np.where(ok, sums[:, 1 + c] / safe, 0.0) for c in range(ncol)]
+    stds = []
+    for i, c in enumerate(std):
+        var = np.where(ok, sums[:, 1 + ncol + i] / safe, 0.0) - means[c] ** 2
+        stds.append(np.sqrt(np.maximum(var, 0.0)))
+    return den, means, stds
+
+
+def _track_density(grid, tracks, use, ltm, sm, weight=None, batch_size=1 << 22):
+    """
+    Track density and mean lifetime of the tracks selected by use. Every track contributes the
+    kernel of its point closest to the grid point, as in statistic.c, with the fixed smoothing
+    parameter sm. Tracks are taken in batches of batch_size / (number of grid points) tracks.
+    """
+    zeros = np.zeros(len(grid))
+    ids = np.flatnonzero(use)
+    if len(ids) <= 1:
+        return zeros, zeros
+    p = tracks.points
+    tsm = (1.0 + sm) / sm
+    theta = np.degrees(np.arccos(1.0 / tsm))
+    batch = max(1, batch_size // len(grid))
+
+    den = np.zeros(len(grid))
+    lif = np.zeros(len(grid))
+    for b in range(0, len(ids), batch):
+        sel = ids[b:b + batch]
+        start, num = tracks.offsets[sel], tracks.offsets[sel + 1] - tracks.offsets[sel]
+        index = np.repeat(start - np.cumsum(num) + num, num) + np.arange(num.sum())
+        tr = np.repeat(np.arange(len(sel)), num)
+        lon, lat = p['lon'][index], p['lat'][index]
+        d = _unit_vectors(lon, lat)
+
+        # the closest point of a track has the largest kernel
+        best = np.zeros(len(grid) * len(sel))
+        found = []
+        pairs = grid.pairs(lon, lat, np.full(len(d), theta))
+        for iq, id, k in _kernel_pairs(grid.xyz, d, np.full(len(d), tsm), pairs):
+            np.maximum.at(best, iq * len(sel) + tr[id], k)
+            if weight is not None:
+                found.append((iq * len(sel) + tr[id], id, k))
+        if weight is not None:
+            # weight of the closest point
+            wbest = np.zeros(len(best))
+            for key, id, k in found:
+                hit = k == best[key]
+                wbest[key[hit]] = weight[index[id[hit]]]
+            best *= wbest
+        best = best.reshape(len(grid), len(sel))
+        den += best.sum(axis=1)
+        lif += best @ ltm[sel]
+
+    pdf = den * tsm / (tsm - 1.0) ** 2 * 2.0 / (2.0 * np.pi * len(ids))
+    ok = pdf > _DTOL
+    return pdf, np.where(ok, lif / np.where(ok, den, 1.0), 0.0)
+
+
+def _adaptive_track_density(grid, tracks, use, ltm, sm, dsm=0.1, alpha=0.5, weight=None, batch_size=1 << 22):
+    """
+    Track density and mean lifetime of the tracks selected by use, as in statistic.c. Every grid
+    point gets its own adaptive estimate from the point of every track closest to it, with
+    bandwidths from _bandwidths() over these closest points - much slower than _track_density().
+    Grid points are taken in batches of batch_size / (number of track points) grid points.
+    """
+    zeros = np.zeros(len(grid))
+    ids = np.flatnonzero(use)
+    if len(ids) <= 1:
+        return zeros, zeros
+    start, num = tracks.offsets[ids], tracks.offsets[ids + 1] - tracks.offsets[ids]
+    index = np.repeat(start - np.cumsum(num) + num, num) + np.arange(num.sum())
+    p = tracks.points
+    d = _unit_vectors(p['lon'][index], p['lat'][index])
+    seg = np.cumsum(num) - num
+    batch = max(1, batch_size // len(d))
+
+    pdf = np.zeros(len(grid))
+    lif = np.zeros(len(grid))
+    for b in range(0, len(grid), batch):
+        g = grid.xyz[b:b + batch]
+        # the closest point of every track, the first one of ties as in nearest_track_point.c
+        cos = g @ d.T
+        best = np.maximum.reduceat(cos, seg, axis=1)
+        at = np.where(cos == np.repeat(best, num, axis=1), np.arange(len(d)), len(d))
+        closest = np.minimum.reduceat(at, seg, axis=1).ravel()
+        group = np.repeat(np.arange(len(g)), len(ids))
+        w = np.ones(len(closest)) if weight is None else weight[index[closest]]
+
+        h = _bandwidths(d[closest], w, sm, dsm, alpha, group=group)
+        tsm = (1.0 + h) / h
+        k = np.maximum(tsm * best.ravel() - 1.0, 0.0) * w * tsm / (tsm - 1.0) ** 2
+        den = np.bincount(group, k, minlength=len(g))
+        pdf[b:b + batch] = den * 2.0 / (2.0 * np.pi * np.bincount(group, w, minlength=len(g)))
+        lif[b:b + batch] = np.bincount(group, k * np.tile(ltm[ids], len(g)), minlength=len(g)) \
+            / np.where(den > 0.0, den, 1.0)
+
+    return pdf, np.where(pdf > _DTOL, lif, 0.0)
+
+
+def _hours(t):
+    # hours since 1970 of YYYYMMDDHH times
+    t = np.asarray(t, dtype=np.int64)
+    months = (t // 1000000 - 1970) * 12 + t // 10000 % 100 - 1
+    days = months.astype('M8[M]').astype('M8[D]') + (t // 100 % 100 - 1)
+    return days.astype('M8[h]').astype(np.int64) + t % 100
+
+
+def compute_stats(tracks, lon=None, lat=None, output=None, frames=None, timestep=6.,
+                  lifetime_step=0.25, smoothing=400., genesis_smoothing=150., track_smoothing=200.,
+                  lower_bound=0.1, alpha=0.5, scale=_CAP_5DEG, exact=False):
+    """
+    Computes the track statistics of stats_track() with numpy, without running TRACK.
+
+    The spherical kernel estimates follow statistic.c with the settings of STATS_template_area.in -
+    power kernel of exponent 1, adaptive smoothing with a leave-one-out pilot estimate, and
+    densities scaled to number densities per 5 degree spherical cap. Every kernel is only
+    evaluated at the grid points inside its support.
+
+    By default two shortcuts make this fast enough for decades of tracks, so the fields only
+    approximate TRACK's. The pilot estimates of the adaptive smoothing are evaluated on data points
+    binned in space, and the track density and mean lifetime use the fixed smoothing parameter
+    track_smoothing, where TRACK computes a new adaptive estimate at every grid point from the
+    closest point of every track. The track density and mean lifetime are somewhat less smooth
+    than TRACK's in sparse regions. With exact=True, both are computed as TRACK does, at a much
+    higher cost for the track density. Where the feature density is above a tenth of its maximum,
+    the other fields of the default mode are within 1% of their maximum of the exact ones, while
+    the track density and mean lifetime can differ by much more.
+
+    Parameters
+    ----------
+    tracks : str or Tracks
+        Track file (e.g. ff_trs_pos), or tracks read with pyTRACK.io.read_tracks().
+    lon, lat : array_like
+        Grid of the statistics. Defaults to the T63 Gaussian grid used by stats_track().
+    output : str
+        netCDF file to write the statistics to, in the layout of stat_trs_scl_ext_1.nc.
+    frames : tuple
+        First and last frame (or YYYYMMDDHH time) of the period covered by the tracks. Tracks
+        starting on the first frame have no genesis, tracks ending on the last frame no lysis.
+        Defaults to the range of the tracks.
+    timestep : float
+        Time between frames for the speeds, tendencies and growth rates. With the default of 6
+        the speeds are in km per hour, as written by TRACK.
+    lifetime_step : float
+        Time between frames for the lifetimes, 0.25 days by default.
+    smoothing, genesis_smoothing, track_smoothing : float
+        Global smoothing parameters for the feature statistics, for the genesis and lysis
+        densities, and for the track density. Larger values give narrower kernels.
+    lower_bound : float
+        Lower bound of the adaptive smoothing parameters.
+    alpha : float
+        Sensitivity of the adaptive smoothing to the pilot density, between 0 and 1.
+    scale : float or None
+        Additional scaling of the number densities, the area of a 5 degree spherical cap in
+        steradians by default. None keeps the densities as pdfs.
+    exact : bool
+        Compute the pilot estimates from every pair of data points, and the track density and
+        mean lifetime with TRACK's adaptive smoothing. Default is False.
+
+    Returns
+    -------
+    xarray.Dataset
+        Statistics with the variables of stat_trs_scl (mstr, stdstr, msp, stdsp, fden, gden,
+        lden, tden, xvel, yvel, mlif, mgdr, miso, xor, yor, mten, marea) on (lat, long).
+    """
+    import xarray as xr
+    from .io import read_tracks
+
+    trfil = None
+    if not hasattr(tracks, 'points'):
+        trfil = os.fspath(tracks)
+        tracks = read_tracks(trfil)
+
+    if lon is None or lat is None:
+        with xr.open_dataset(os.path.join(os.path.dirname(__file__), "data", "gridT63.nc")) as ds:
+            lon, lat = ds['lon'].values, ds['lat'].values
+    grid = _Grid(lon, lat)
+
+    p = tracks.points
+    header = tracks.header
+    weight = p['wght'] if header.get('awt') and 'wght' in p else None
+    steps = p['frame'] if 'frame' in p else _hours(p['time']) / timestep
+    num = tracks.num_points
+    nonempty = num > 0
+    first = tracks.offsets[:-1][nonempty]
+    last = tracks.offsets[1:][nonempty] - 1
+    f1, f2 = frames if frames is not None else (steps.min(), steps.max())
+    if 'time' in p and frames is not None:
+        f1, f2 = _hours(f1) / timestep, _hours(f2) / timestep
+
+    def sel(mask, *cols):
+        out = [p[c][mask] for c in cols]
+        return out + [None if weight is None else weight[mask]]
+
+    # bins across the kernel support for the pilot estimates
+    nbins = None if exact else 8
+    stats = {}
+    pdfs = {}
+
+    # feature density and mean intensity
+    z = p['intensity']
+    feat = (steps >= f1) & (steps <= f2) & (z < _ADD_CHECK)
+    flon, flat, fz, fw = sel(feat, 'lon', 'lat', 'intensity')
+    den, means, stds = _estimate(grid, flon, flat, fz[:, None], fw, smoothing, lower_bound, alpha,
+                                 std=(0,), nbins=nbins)
+    pdfs['fden'] = (den, fw.sum() if fw is not None else len(flon))
+    stats['mstr'], stats['stdstr'] = means[0], stds[0]
+
+    # genesis and lysis
+    for name, ends, inside in [('gden', first, (steps[first] > f1) & (steps[first] <= f2)),
+                               ('lden', last, (steps[last] >= f1) & (steps[last] < f2))]:
+        mask = np.zeros(len(steps), dtype=bool)
+        mask[ends[inside]] = True
+        glon_, glat_, gw = sel(mask, 'lon', 'lat')
+        den, _, _ = _estimate(grid, glon_, glat_, None, gw, genesis_smoothing, lower_bound, alpha,
+                              nbins=nbins)
+        pdfs[name] = (den, gw.sum() if gw is not None else len(glon_))
+
+    # speeds, velocities, tendencies and growth rates between consecutive points, as in phase.c
+    a = np.arange(len(steps) - 1)
+    a = a[np.isin(a, last, invert=True)]
+    b = a + 1
+    a = a[((steps[a] >= f1) & (steps[a] <= f2)) | ((steps[b] >= f1) & (steps[b] <= f2))]
+    a = a[(z[a] < _ADD_CHECK) & (z[a + 1] < _ADD_CHECK)]
+    b = a + 1
+    xd = p['lon'][b] - p['lon'][a]
+    xd = np.where(np.abs(xd) > 180.0, np.where(p['lon'][a] < 180.0, xd - 360.0, xd + 360.0), xd)
+    plon = p['lon'][a] + 0.5 * xd
+    plat = 0.5 * (p['lat'][a] + p['lat'][b])
+    ttint = timestep * (p['nfm'][a] + 1)
+    va, vb = _unit_vectors(p['lon'][a], p['lat'][a]), _unit_vectors(p['lon'][b], p['lat'][b])
+    vx = _unit_vectors(p['lon'][b], p['lat'][a])
+    speed = _EARTH_RADIUS * np.arccos(np.clip(np.einsum('ij,ij->i', va, vb), -1.0, 1.0)) / ttint
+    xvel = _EARTH_RADIUS * np.arccos(np.clip(np.einsum('ij,ij->i', va, vx), -1.0, 1.0)) / ttint
+    xvel = np.where(xd < 0.0, -xvel, xvel)
+    yvel = _EARTH_RADIUS * np.radians(p['lat'][b] - p['lat'][a]) / ttint
+    tend = (z[b] - z[a]) / ttint
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gwthr = tend / (0.5 * (z[a] + z[b]))
+    pw = None if weight is None else weight[a]
+
+    # these estimates share their data points and settings, and so their bandwidths
+    ok = np.isfinite(gwthr)
+    columns = [speed, xvel, yvel, tend] + ([gwthr] if ok.all() else [])
+    _, means, stds = _estimate(grid, plon, plat, np.stack(columns, axis=1), pw,
+                               smoothing, lower_bound, alpha, std=(0,), nbins=nbins)
+    stats['msp'], stats['xvel'], stats['yvel'], stats['mten'] = means[:4]
+    stats['stdsp'] = stds[0]
+    if ok.all():
+        stats['mgdr'] = means[4]
+    else:
+        _, means, _ = _estimate(grid, plon[ok], plat[ok], gwthr[ok, None],
+                                None if pw is None else pw[ok], smoothing, lower_bound, alpha,
+                                nbins=nbins)
+        stats['mgdr'] = means[0]
+
+    # anisotropy, orientation and area
+    zeros = np.zeros(len(grid))
+    stats['miso'] = stats['xor'] = stats['yor'] = stats['marea'] = zeros
+    if header.get('aniso'):
+        alon, alat, sh, o0, o1, aw = sel(feat & (p['sh_an'] >= 0.0), 'lon', 'lat', 'sh_an', 'or_vec0', 'or_vec1')
+        _, means, _ = _estimate(grid, alon, alat, np.stack([sh, o0, o1], axis=1), aw,
+                                smoothing, lower_bound, alpha, nbins=nbins)
+        stats['miso'], stats['xor'], stats['yor'] = means
+        rlon, rlat, area, rw = sel(feat & (p['area'] >= 0.0), 'lon', 'lat', 'area')
+        _, means, _ = _estimate(grid, rlon, rlat, area[:, None], rw, smoothing, lower_bound, alpha,
+                                nbins=nbins)
+        stats['marea'] = means[0]
+
+    # track density and mean lifetime
+    nmiss = np.add.reduceat(p['nfm'], first) if len(first) else np.zeros(0)
+    fb, fe = steps[first], steps[last]
+    dd = fe - fb + nmiss
+    d1 = np.where((fb < f1) & (fe >= f1), f1 - fb, 0)
+    d2 = np.where((fe > f2) & (fb <= f2), fe - f2, 0)
+    inside = ~((fe < f1) | (fb > f2)) & ((d1 + d2) < _LPERC * np.maximum(dd, 1))
+    ltm = np.zeros(len(tracks))
+    ltm[nonempty] = np.where(inside, dd * lifetime_step, 0.0)
+    use = ltm > _TTSTEP
+    if exact:
+        den, stats['mlif'] = _adaptive_track_density(grid, tracks, use, ltm, track_smoothing,
+                                                     lower_bound, alpha, weight)
+    else:
+        den, stats['mlif'] = _track_density(grid, tracks, use, ltm, track_smoothing, weight)
+    pdfs['tden'] = (den, int(use.sum()))
+
+    # scale the pdfs to number densities
+    for name, (den, n) in pdfs.items():
+        if scale is not None:
+            den = den * n * scale
+            if header.get('iper_num'):
+                den = den / header['sum_per']
+        stats[name] = den
+
+    shape = (len(grid.lat), len(grid.lon))
+    ds = xr.Dataset(
+        {name: (('lat', 'long'), stats[name].reshape(shape).astype(np.float32),
+                {'long_name': long_name, 'missing_value': np.float32(_STATMISS)})
+         for name, long_name in _STATS_FIELDS},
+        coords={'long': ('long', grid.lon.astype(np.float32), {'long_name': 'longitude'}),
+                'lat': ('lat', grid.lat.astype(np.float32), {'long_name': 'latitude'})})
+    ds.attrs['title'] = ("Tracking Statistics: number densities and mean attributes" if scale is not None
+                         else "Tracking Statistics: densities (pdf's) and mean attributes")
+    ds.attrs['history'] = "Track File: %s; Density Scaling: %f" % (trfil, 1.0 if scale is None else scale)
+
+    if output is not None:
+        ds.to_netcdf(output)
+    return ds
@@ -0,0 +1,252 @@
+import os
+import json
+import shutil
+import numpy as np
+
+from .io import read_tracks, Tracks
+
+__all__ = ['TrackStore', 'build_store']
+
+_INDEX = "index.json"
+
+
+def _frames_to_time(frames, start, step=6):
+    # YYYYMMDDHH of every frame, frame 1 being start (as in write_track_netcdf.c)
+    start = np.datetime64("%s-%s-%sT%s" % (start[:4], start[4:6], start[6:8], start[8:10]), 'h')
+    t = start + (np.asarray(frames, dtype=np.int64) - 1) * np.timedelta64(step, 'h')
+    years = t.astype('M8[Y]').astype(np.int64) + 1970
+    months = t.astype('M8[M]').astype(np.int64) % 12 + 1
+    days = (t.astype('M8[D]') - t.astype('M8[M]')).astype(np.int64) + 1
+    hours = (t - t.astype('M8[D]')).astype(np.int64)
+    return ((years * 100 + months) * 100 + days) * 100 + hours
+
+
+def _overlaps(lo, hi, qlo, qhi):
+    return lo <= qhi and qlo <= hi
+
+
+def _lon_mask(lon, lon_min, lon_max):
+    # a box with lon_min > lon_max crosses the Greenwich meridian
+    lon = np.mod(lon, 360)
+    lon_min, lon_max = lon_min % 360, lon_max % 360
+    if lon_min <= lon_max:
+        return (lon >= lon_min) & (lon <= lon_max)
+    return (lon >= lon_min) | (lon <= lon_max)
+
+
+def build_store(outdirectory=None, store=None, kind='ff_trs', sdate=None, start_year=None):
+    """
+    Consolidates the per year track files of track_uv() into a partitioned binary track store.
+
+    Every output_track/{hemisphere}_y{year} folder gives one partition per sign, stored as
+    {hemisphere}/{year}/{sign}/ with one .npy file per column. The index records the time and
+    latitude/longitude bounds of every partition, so that TrackStore.query() only opens the
+    partitions, and the columns, a query needs.
+
+    Parameters
+    ----------
+    outdirectory : str
+        Output directory of track_uv(), containing output_track. Defaults to the current directory.
+    store : str
+        Folder for the store. Defaults to output_track/track_store.
+    kind : str
+        Which track files to store - 'ff_trs' (default) or 'tr_trs'.
+    sdate : str
+        First time step in MMDDHH format, as passed to track_uv(). Used to convert the frame
+        numbers of the track files to YYYYMMDDHH times, at the 6 hourly step of tr2nc_vor().
+        Without it the store keeps frame numbers and can not be queried by time.
+    start_year : str
+        Year of the first time step for folders not split by year ({hemisphere}_yall).
+    """
+
+    if outdirectory is None:
+        outdirectory = os.getcwd()
+    track_dir = os.path.join(os.path.abspath(os.path.expanduser(outdirectory)), 'output_track')
+    if store is None:
+        store = os.path.join(track_dir, 'track_store')
+    store = os.path.abspath(os.path.expanduser(store))
+    os.makedirs(store, exist_ok=True)
+
+    partitions = []
+    for name in sorted(os.listdir(track_dir)):
+        if '_y' not in name or not os.path.isdir(os.path.join(track_dir, name)):
+            continue
+        hemisphere, year = name.split('_y', 1)
+        for sign in ['pos', 'neg']:
+            trs = os.path.join(track_dir, name, kind + '_' + sign)
+            if not os.path.exists(trs):
+                continue
+            print("Adding " + name + "/" + kind + "_" + sign + " to the track store")
+            tracks = read_tracks(trs)
+            part = _write_partition(store, tracks, hemisphere, year, sign,
+                                    sdate=sdate, start_year=start_year)
+            partitions.append(part)
+
+    index = dict(kind=kind, partitions=partitions)
+    tmp = os.path.join(store, _INDEX + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, os.path.join(store, _INDEX))
+
+    return TrackStore(store)
+
+
+def _write_partition(store, tracks, hemisphere, year, sign, sdate=None, start_year=None):
+    path = os.path.join(hemisphere, year, sign)
+    full = os.path.join(store, path)
+    if os.path.exists(full):
+        shutil.rmtree(full)
+    os.makedirs(full)
+
+    points = dict(tracks.points)
+    if 'frame' in points and sdate is not None:
+        Y = year if year != 'all' else start_year
+        if Y is None:
+            raise ValueError("start_year is needed to date the tracks of " + hemisphere + "_yall")
+        if len(Y) < 4:
+            Y = str(2000 + int(Y))
+        points['time'] = _frames_to_time(points['frame'], Y + sdate)
+
+    columns = {'track_id': tracks.track_id, 'offsets': tracks.offsets}
+    columns.update(points)
+    for col, values in columns.items():
+        np.save(os.path.join(full, col + ".npy"), np.ascontiguousarray(values))
+
+    part = dict(path=path, hemisphere=hemisphere, year=year, sign=sign,
+                ntracks=len(tracks), npoints=int(tracks.offsets[-1]), columns=list(points),
+                header={k: v for k, v in tracks.header.items() if k != 'weights'})
+    if len(tracks):
+        for col in ['time', 'frame', 'lat', 'lon']:
+            if col in points:
+                part[col] = [float(points[col].min()), float(points[col].max())]
+    return part
+
+
+class TrackStore(object):
+    """
+    Partitioned binary track store written by build_store().
+
+    Columns are memory mapped, so a query reads only the partitions that can contain matching
+    tracks, and within those only the columns it needs.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        with open(os.path.join(self.path, _INDEX)) as f:
+            index = json.load(f)
+        self.kind = index['kind']
+        self.partitions = index['partitions']
+
+    def _column(self, part, col):
+        return np.load(os.path.join(self.path, part['path'], col + ".npy"), mmap_mode='r')
+
+    def select(self, hemisphere=None, years=None, sign=None, time=None, bbox=None):
+        """
+        Returns the partitions that can hold tracks matching the query, see query().
+        """
+        out = []
+        for part in self.partitions:
+            if hemisphere is not None and part['hemisphere'] != hemisphere:
+                continue
+            if sign is not None and part['sign'] != sign:
+                continue
+            if years is not None and part['year'] != 'all':
+                if not years[0] <= int(part['year']) <= years[1]:
+                    continue
+            if part['ntracks'] == 0:
+                continue
+            if time is not None:
+                if 'time' not in part:
+                    raise ValueError("The store has no dates, rebuild it passing sdate")
+                if not _overlaps(part['time'][0], part['time'][1], time[0], time[1]):
+                    continue
+            if bbox is not None:
+                lon_min, lon_max, lat_min, lat_max = bbox
+                if not _overlaps(part['lat'][0], part['lat'][1], lat_min, lat_max):
+                    continue
+                if lon_min % 360 <= lon_max % 360 and not _overlaps(
+                        part['lon'][0], part['lon'][1], lon_min % 360, lon_max % 360):
+                    continue
+            out.append(part)
+        return out
+
+    def query(self, hemisphere=None, years=None, sign=None, time=None, months=None,
+              bbox=None, columns=None):
+        """
+        Returns the tracks with at least one point matching every given condition.
+
+        Parameters
+        ----------
+        hemisphere : str
+            'NH' or 'SH'.
+        years : tuple
+            First and last year (inclusive) of the partitions to search.
+        sign : str
+            'pos' or 'neg'.
+        time : tuple
+            First and last time (inclusive), as YYYYMMDDHH integers.
+        months : list
+            Months a point must fall in, e.g. [12, 1, 2] for DJF.
+        bbox : tuple
+            (lon_min, lon_max, lat_min, lat_max) in degrees. lon_min > lon_max selects a box
+            crossing the Greenwich meridian, e.g. (280, 10, 30, 70) for the North Atlantic.
+        columns : list
+            Point columns to return. Defaults to all columns.
+
+        Returns
+        -------
+        Tracks
+            Whole tracks matching the query, with the hemisphere, year and sign of every track in
+            the extra arrays hemisphere, year and sign.
+        """
+        parts = self.select(hemisphere=hemisphere, years=years, sign=sign, time=time, bbox=bbox)
+        if months is not None and any('time' not in part for part in parts):
+            raise ValueError("The store has no dates, rebuild it passing sdate")
+
+        results, labels = [], []
+        for part in parts:
+            offsets = np.asarray(self._column(part, 'offsets'))
+            mask = np.ones(part['npoints'], dtype=bool)
+            if time is not None or months is not None:
+                t = self._column(part, 'time')
+                if time is not None:
+                    mask &= (t >= time[0]) & (t <= time[1])
+                if months is not None:
+                    mask &= np.isin(t // 10000 % 100, months)
+            if bbox is not None:
+                lat = self._column(part, 'lat')
+                mask &= (lat >= bbox[2]) & (lat <= bbox[3])
+                mask &= _lon_mask(self._column(part, 'lon'), bbox[0], bbox[1])
+
+            # reduceat would credit a track without points with the first point of the next
+            # one, so only tracks with points are reduced
+            full = np.diff(offsets) > 0
+            hits = np.zeros(len(full), dtype=bool)
+            if full.any():
+                hits[full] = np.logical_or.reduceat(mask, offsets[:-1][full])
+            keep = np.flatnonzero(hits)
+            if len(keep) == 0:
+                continue
+
+            nums = offsets[keep + 1] - offsets[keep]
+            starts = np.repeat(offsets[keep] - np.cumsum(nums) + nums, nums)
+            index = starts + np.arange(nums.sum())
+            cols = part['columns'] if columns is None else columns
+            points = {col: np.asarray(self._column(part, col)[index]) for col in cols}
+
+            header = dict(part['header'])
+            track_id = np.asarray(self._column(part, 'track_id'))[keep]
+            start_time = points['time'][np.cumsum(nums) - nums] if 'time' in points else None
+            results.append(Tracks(header, track_id, start_time,
+                                  np.concatenate(([0], np.cumsum(nums))), points))
+            labels.append((part['hemisphere'], part['year'], part['sign'], len(keep)))
+
+        if not results:
+            cols = columns or (self.partitions[0]['columns'] if self.partitions else [])
+            tracks = Tracks({}, np.zeros(0, dtype=np.int64), None, np.zeros(1, dtype=np.int64),
+                            {col: np.zeros(0) for col in cols})
+        else:
+            tracks = Tracks.concatenate(results)
+        for i, name in enumerate(['hemisphere', 'year', 'sign']):
+            setattr(tracks, name, np.array([l[i] for l in labels for _ in range(l[3])]))
+        return tracks
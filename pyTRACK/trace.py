@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import tempfile
+from contextlib import contextmanager
+
+__all__ = ['Trace']
+
+# trace being recorded in this process, inherited by forked workers
+_ACTIVE = None
+
+
+def _proc_io(pid='self'):
+    # bytes passed through read and write calls, of the process and the children it waited for
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            io = dict(line.split(':') for line in f)
+        return int(io['rchar']), int(io['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _reset_peak():
+    # resets VmHWM to the current RSS (Linux), so that the peak of every stage is its own
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss():
+    # peak RSS in bytes since the last _reset_peak(), or of the whole process
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _usage():
+    # cpu seconds, bytes read and bytes written so far, by this process and the children it waited for
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    io = _proc_io()
+    if io is None:
+        # blocks of 512 bytes that went to disk
+        io = ((own.ru_inblock + children.ru_inblock) * 512, (own.ru_oublock + children.ru_oublock) * 512)
+    return cpu, io[0], io[1]
+
+
+def _child_usage(pid, wall):
+    # waits for the child process pid, and returns its exit status and the record of its resource
+    # use - its I/O is read from /proc before it is reaped
+    try:
+        os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+        io = _proc_io(pid)
+    except (OSError, AttributeError):
+        io = None
+    _, status, ru = os.wait4(pid, 0)
+    if io is None:
+        io = (ru.ru_inblock * 512, ru.ru_oublock * 512)
+    return status, dict(pid=pid, wall=wall, cpu=ru.ru_utime + ru.ru_stime, peak_rss=ru.ru_maxrss * 1024,
+                        read=io[0], written=io[1])
+
+
+class Trace(object):
+    """
+    Records the wall time, CPU time, peak memory and I/O of every stage of a workflow.
+
+    While a Trace is open, the stages of track_uv(), track_splice(), stats_track() and
+    tr2nc_batch(), and every TRACK run, are recorded with their parameters, including those run
+    in worker processes. The records are written to a JSON file when the trace is closed, and a
+    summary table per stage is printed.
+
+    CPU time and I/O of a stage include the worker processes it ran. Peak memory is the largest
+    RSS of any single process during the stage, I/O is the bytes passed through read and write
+    calls, from /proc/{pid}/io.
+
+    Usage
+    -----
+    with Trace('trace.json'):
+        pyTRACK.track_uv('uv.nc', 'out')
+    """
+
+    def __init__(self, path=None, summary=True):
+        """
+        Parameters
+        ----------
+        path : str or None
+            JSON file to write the trace to. None keeps the records in memory only, in records.
+        summary : bool
+            Print the summary table when the trace is closed.
+        """
+        self.path = path
+        self.summary = summary
+        self.records = []
+        self._stack = []
+        self._count = 0
+        self._spool = None
+        self._owner = None
+        self._previous = None
+
+    def __enter__(self):
+        global _ACTIVE
+        self._spool = tempfile.mkdtemp(prefix="pytrack_trace_")
+        self._owner = os.getpid()
+        self._start = time.time()
+        self._previous, _ACTIVE = _ACTIVE, self
+        return self
+
+    def __exit__(self, *args):
+        global _ACTIVE
+        _ACTIVE = self._previous
+        self._collect()
+        shutil.rmtree(self._spool, ignore_errors=True)
+        if self.path is not None:
+            self.write(self.path)
+        if self.summary and self.records:
+            print(self.table())
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        Records the block run inside it as the stage name, with the parameters in info.
+        """
+        self._count += 1
+        record = dict(id=f"{os.getpid()}-{self._count}", name=name, info=info, pid=os.getpid(),
+                      parent=self._stack[-1]['id'] if self._stack else None,
+                      start=time.time() - self._start)
+        if self._stack:
+            self._stack[-1]['peak_rss'] = max(self._stack[-1]['peak_rss'], _peak_rss())
+        _reset_peak()
+        cpu, read, written = _usage()
+        record.update(peak_rss=0, _extra=[0., 0, 0])
+        self._stack.append(record)
+        t0 = time.perf_counter()
+        record['status'] = 'error'
+        try:
+            yield record
+            record['status'] = 'ok'
+        finally:
+            wall = time.perf_counter() - t0
+            self._stack.pop()
+            self._collect(record)
+            end = _usage()
+            extra = record.pop('_extra')
+            record.update(wall=wall, cpu=end[0] - cpu + extra[0], read=end[1] - read + extra[1],
+                          written=end[2] - written + extra[2],
+                          peak_rss=max(record['peak_rss'], _peak_rss()))
+            self.records.append(record)
+            if self._stack:
+                parent = self._stack[-1]
+                parent['peak_rss'] = max(parent['peak_rss'], record['peak_rss'])
+                # the parent's own usage covers this stage already
+                for i, value in enumerate(extra):
+                    parent['_extra'][i] += value
+
+    def add(self, name, usage, **info):
+        """
+        Adds the record of a process this one did not wait for itself, such as a TRACK run of a
+        TrackSession worker, with usage as returned by _child_usage(). Its CPU time and I/O are
+        added to the open stages.
+        """
+        self._count += 1
+        record = dict(id=f"{os.getpid()}-{self._count}", name=name, info=info,
+                      parent=self._stack[-1]['id'] if self._stack else None,
+                      start=time.time() - self._start - usage['wall'], status='ok', **usage)
+        self.records.append(record)
+        if self._stack:
+            top = self._stack[-1]
+            top['peak_rss'] = max(top['peak_rss'], usage['peak_rss'])
+            for i, key in enumerate(('cpu', 'read', 'written')):
+                top['_extra'][i] += usage[key]
+
+    def _collect(self, parent=None):
+        # reads the records flushed by worker processes that finished, at any depth
+        if os.getpid() != self._owner:
+            return
+        for name in sorted(os.listdir(self._spool)):
+            path = os.path.join(self._spool, name)
+            if not name.endswith(".json"):
+                continue
+            with open(path) as f:
+                records = json.load(f)
+            os.remove(path)
+            self.records.extend(records)
+            if parent is not None:
+                # their CPU time and I/O are part of this process's once they are waited for
+                parent['peak_rss'] = max([parent['peak_rss']] + [r['peak_rss'] for r in records])
+
+    def flush(self):
+        """
+        Writes the records of a forked worker process to the trace of its parent.
+        """
+        if self._spool is None or not os.path.isdir(self._spool):
+            return
+        tmp = os.path.join(self._spool, f"{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.records, f)
+        os.replace(tmp, tmp[:-4] + ".json")
+        self.records = []
+
+    def totals(self):
+        """
+        Returns the calls, wall and CPU seconds, largest peak RSS and bytes read and written of
+        every stage name, summed over its records, in the order the stages were first started.
+        """
+        totals = {}
+        for r in sorted(self.records, key=lambda r: r['start']):
+            t = totals.setdefault(r['name'], dict(calls=0, wall=0., cpu=0., peak_rss=0, read=0, written=0))
+            t['calls'] += 1
+            t['peak_rss'] = max(t['peak_rss'], r['peak_rss'])
+            for key in ('wall', 'cpu', 'read', 'written'):
+                t[key] += r[key]
+        return totals
+
+    def table(self):
+        """
+        Returns the summary table of totals() as text.
+        """
+        lines = ["%-20s %6s %10s %10s %10s %10s %10s" % ("stage", "calls", "wall s", "cpu s",
+                                                       "peak MB", "read MB", "write MB")]
+        for name, t in self.totals().items():
+            lines.append("%-20s %6d %10.2f %10.2f %10.1f %10.1f %10.1f" % (
+                name, t['calls'], t['wall'], t['cpu'], t['peak_rss'] / 2**20,
+                t['read'] / 2**20, t['written'] / 2**20))
+        return "\n".join(lines)
+
+    def write(self, path):
+        """
+        Writes the trace to the JSON file path - when and where it ran, every record, and the totals.
+        """
+        import platform
+
+        meta = dict(start=time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._start)),
+                    argv=sys.argv, host=platform.node(), python=platform.python_version(),
+                    cpus=os.cpu_count())
+        tmp = str(path) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(dict(meta=meta, records=sorted(self.records, key=lambda r: r['start']),
+                           totals=self.totals()), f, indent=1)
+        os.replace(tmp, path)
+
+
+@contextmanager
+def _stage(name, **info):
+    # records the block inside it as a stage of the open Trace, if there is one
+    if _ACTIVE is None:
+        yield None
+    else:
+        with _ACTIVE.stage(name, **info) as record:
+            yield record
+
+
+def _add(name, usage, **info):
+    # adds the record of a child process to the open Trace, if there is one, see Trace.add()
+    if _ACTIVE is not None:
+        _ACTIVE.add(name, usage, **info)
+
+
+def _flush():
+    # passes the records of this forked worker on to the open Trace of its parent, if there is one
+    if _ACTIVE is not None:
+        _ACTIVE.flush()
+
+
+def _forked():
+    # a forked worker only passes on the records it makes itself
+    if _ACTIVE is not None:
+        _ACTIVE.records = []
+
+
+os.register_at_fork(after_in_child=_forked)
+
+
+def _tracing(trace, directory):
+    # the Trace for the trace argument of the workflows - a path, True for a file in directory,
+    # or None - or no new trace if one is open already
+    from contextlib import nullcontext
+
+    if not trace or _ACTIVE is not None:
+        return nullcontext()
+    if trace is True:
+        trace = os.path.join(directory, time.strftime("trace_%Y%m%d_%H%M%S.json"))
+    return Trace(trace)
@@ -1,5 +1,19 @@
+from collections import namedtuple
 
-def track(input_file="input.nc", ext='_ext', namelist=None):
+ChunkPlan = namedtuple('ChunkPlan', ['length', 'overlap', 'chunks'])
+ChunkPlan.__doc__ = ("Chunking of track_splice() - the frames per chunk, the frames shared by consecutive "
+                     "chunks, and the number, first and last frame (N, S, F) of every chunk.")
+
+# chunking used for 6 hourly data before it was worked out per run - 62 frames, sharing 2
+_CHUNK_HOURS = 62 * 6
+_OVERLAP_HOURS = 2 * 6
+# rough memory used by TRACK per grid point and frame of a chunk - the fields, objects and
+# tracks; see benchmarks/chunking.py to measure it for a given setup
+_BYTES_PER_POINT = 64
+
+
+
+def track(input_file="input.nc", ext='_ext', namelist=None, progress=None):
     """
     Runs TRACK.
 
@@ -9,41 +23,44 @@ def track(input_file="input.nc", ext='_ext', namelist=None):
 
     Parameters
     ----------
-    input_file : str
-        Name of the input file.
+    input_file : str, xarray.Dataset, xarray.DataArray or MemoryFile
+        Name of the input file. Fields that are already in memory are passed to TRACK
+        through an anonymous in-memory netCDF file instead, see utils.MemoryFile.
     ext : str
         Extension to append to the TRACK output files.
     namelist : str or None
         The namelist file to be fed to track.
         This file should have track inputs in the right order in seperate lines.
+    progress : callable or None
+        Called with the number of every frame TRACK reports as processed, while it runs. TRACK's
+        output is then read through a pipe by a separate thread, which calls progress and passes
+        the output on to where it went before.
     """
 
     import os
-    import ctypes
 
-    # Path to shared library
-    _LIB = os.path.join(os.path.dirname(__file__), "_lib", "libtrack.so")
+    if not isinstance(input_file, (str, os.PathLike)):
+        from .utils import MemoryFile
+        with MemoryFile(input_file) as f:
+            return track(f.path, ext=ext, namelist=namelist, progress=progress)
 
-    if not os.path.exists(_LIB):
-        raise FileNotFoundError(f"libtrack.so not found at {_LIB}")
+    input_file = os.fspath(input_file)
 
-    lib = ctypes.CDLL(_LIB)
+    from contextlib import nullcontext
+    from .trace import _stage
+    from .progress import _CaptureFrames
 
-    # Define function signature
-    lib.track_main.argtypes = [
-        ctypes.c_int,
-        ctypes.POINTER(ctypes.c_char_p)
-    ]
-    lib.track_main.restype = ctypes.c_int
+    with _stage("track", ext=ext, namelist=None if namelist is None else os.path.basename(namelist)), \
+            (nullcontext() if progress is None else _CaptureFrames(progress)):
+        _track(input_file, ext, namelist)
 
-    args = [
-        b"track",
-        b"-i", input_file.encode("utf-8"),
-        b"-f", ext.encode("utf-8")
-    ]
 
-    argc = len(args)
-    argv = (ctypes.c_char_p * argc)(*args)
+def _track(input_file, ext, namelist):
+    # the TRACK call of track()
+    import os
+
+    lib = _load_libtrack()
+    argc, argv = _track_args(input_file, ext)
 
     set_track_env()
 
@@ -66,6 +83,51 @@ def track(input_file="input.nc", ext='_ext', namelist=None):
         lib.track_main(argc, argv)
 
 
+_LIBTRACK = None
+
+def _load_libtrack():
+    """
+    Loads libtrack.so, once per process. Forked processes inherit the loaded library.
+    """
+    import os
+    import ctypes
+    global _LIBTRACK
+
+    if _LIBTRACK is None:
+        # Path to shared library
+        _LIB = os.path.join(os.path.dirname(__file__), "_lib", "libtrack.so")
+
+        if not os.path.exists(_LIB):
+            raise FileNotFoundError(f"libtrack.so not found at {_LIB}")
+
+        lib = ctypes.CDLL(_LIB)
+
+        # Define function signature
+        lib.track_main.argtypes = [
+            ctypes.c_int,
+            ctypes.POINTER(ctypes.c_char_p)
+        ]
+        lib.track_main.restype = ctypes.c_int
+        _LIBTRACK = lib
+
+    return _LIBTRACK
+
+
+def _track_args(input_file, ext):
+    # argc, argv of bin/track.linux -i {input_file} -f {ext}
+    import ctypes
+
+    args = [
+        b"track",
+        b"-i", input_file.encode("utf-8"),
+        b"-f", ext.encode("utf-8")
+    ]
+
+    argc = len(args)
+    argv = (ctypes.c_char_p * argc)(*args)
+    return argc, argv
+
+
 def set_track_env():
     """
     Automatically called when the track() function is run.
@@ -137,7 +199,250 @@ def set_track_env():
     os.environ["CONSDAT_SPHERY"] = os.path.join(pkgpath, "data", "constraints.dat.sphery")
 
 
-def track_splice(datin, ext, ntime, trunc, keep_all_files=False):
+def _replace_namelist(template_file, S, F, initial, first_run=True, flag=False):
+    """
+    Mimics sed namelist replacements.
+
+    If first_run=True: corresponds to N == 1 in csh script
+    If flag=True: applies special replacement for _A.in files
+    """
+    import re
+
+    out_lines = []
+
+    with open(template_file) as f:
+        for line in f:
+            # Replace leading numbers + #
+            if re.match(r"^[0-9]*#", line):
+                line = re.sub(r"^[0-9]*#", str(S), line)
+
+            # Replace leading numbers + !
+            if re.match(r"^[0-9]*!", line):
+                line = re.sub(r"^[0-9]*!", str(F), line)
+
+            # First run (N==1)
+            if first_run:
+                if line.lstrip().startswith("i%"):
+                    line = re.sub(r"^i%", "i", line)
+                if line.lstrip().startswith("n~"):
+                    line = re.sub(r"^n~", "n", line)
+            # Special flag (_A.in)
+            elif flag:
+                if line.lstrip().startswith("i%"):
+                    line = re.sub(r"^i%", "y", line)
+                # Do NOT delete lines starting with n~ (unlike the normal else)
+            # Normal else (N>1, not flag)
+            else:
+                if line.lstrip().startswith("i%"):
+                    line = re.sub(r"^i%", "y", line)
+                if line.lstrip().startswith("n~"):
+                    continue  # delete this line
+
+            # Replace %INITIAL% everywhere
+            line = line.replace("%INITIAL%", initial)
+            out_lines.append(line)
+
+    return "".join(out_lines)
+
+
+def _chunk_namelist(workdir, ext, S, F, initial, first_run, sign):
+    """
+    Writes the namelist for tracking frames S to F of the +ve (sign='max') or -ve (sign='min')
+    field into workdir, and returns its path.
+    """
+
+    import os
+    from pathlib import Path
+
+    RDAT = Path(os.path.dirname(__file__)) / "indat"
+    ODAT = Path(workdir)
+    RUNDT = "RUNDATIN.VOR"
+
+    if sign == "max":
+        namelist = ODAT / f"{RUNDT}.{ext}"
+        namelist.write_text(_replace_namelist(RDAT / f"{RUNDT}.in", S, F, initial, first_run))
+    else:
+        namelist = ODAT / f"{RUNDT}_A.{ext}"
+        namelist.write_text(_replace_namelist(RDAT / f"{RUNDT}_A.in", S, F, initial, first_run, flag=True))
+    return namelist
+
+
+def _collect_chunk(workdir, ext, out_dir):
+    """
+    Moves the outputs of a chunk tracked in workdir to out_dir.
+    """
+
+    import shutil
+    from pathlib import Path
+
+    # Move output files to DJF_MAX / DJF_MIN
+    file_list = ["RUNDATIN.VOR", "objout.new", "objout", "tdump", "idump"]
+    for fname in file_list:
+        for src_file in Path(workdir).glob(f"{fname}{ext}"):
+            shutil.move(str(src_file), str(Path(out_dir) / fname))
+
+
+def _track_chunk(datin, ext, S, F, initial, first_run, sign, out_dir, progress=None):
+    """
+    Tracks frames S to F of datin for the +ve (sign='max') or -ve (sign='min') field,
+    working in the current directory and moving the outputs to out_dir. progress is passed
+    on to track().
+    """
+
+    import os
+    from .utils import run_silent
+
+    namelist = _chunk_namelist(os.getcwd(), ext, S, F, initial, first_run, sign)
+
+    # --- Run TRACK ---
+    run_silent(track, input_file=datin, ext=ext, namelist=namelist, progress=progress)
+
+    _collect_chunk(os.getcwd(), ext, out_dir)
+
+
+def _splice_namelist(workdir, splice_text, out_prefix, nchunks, dir3):
+    """
+    Writes the RSPLICE namelist for splicing the chunk tracks listed in splice_text into
+    workdir, and returns its path.
+    """
+
+    import os
+    import re
+    from pathlib import Path
+
+    RDAT = Path(os.path.dirname(__file__)) / "indat"
+    rsplice = Path(workdir) / f"RSPLICE.{out_prefix}"
+
+    marker_re = re.compile(r"^[0-9]+!")
+
+    text = ""
+    with open(RDAT / "RSPLICE.in", "r") as f_in:
+        for line in f_in:
+            text += line
+            if marker_re.match(line):
+                text += splice_text
+
+    text = text.replace("initial", str(Path(dir3) / "initial"))
+    text = re.sub(r"^[0-9]+!", str(nchunks), text, flags=re.MULTILINE)
+
+    rsplice.write_text(text)
+    return rsplice
+
+
+def _collect_splice(workdir, ext, out_prefix, dir3):
+    """
+    Moves the outputs of a splice run in workdir to dir3 as {tr_trs,tr_grid,ff_trs}_{out_prefix}.
+    """
+
+    import shutil
+    from pathlib import Path
+
+    # Move outputs
+    prefixes = ["tr_trs", "tr_grid", "ff_trs"]
+    for prefix in prefixes:
+        for src in Path(workdir).glob(f"{prefix}{ext}*"):
+            name = src.name
+            suffix = ".nc" if name.endswith(".nc") else ""
+            dst = Path(dir3) / f"{prefix}_{out_prefix}{suffix}"
+
+            shutil.move(str(src), str(dst))
+    shutil.move(str(Path(workdir) / f"RSPLICE.{out_prefix}"), Path(dir3) / f"RSPLICE_{out_prefix}")
+
+
+def _run_splice(splice_text, out_prefix, datin, ext, nchunks, dir3):
+    """
+    Splices the chunk tracks listed in splice_text, working in the current directory
+    and moving the outputs to dir3 as {tr_trs,tr_grid,ff_trs}_{out_prefix}.
+    """
+
+    import os
+    from .utils import run_silent
+
+    rsplice = _splice_namelist(os.getcwd(), splice_text, out_prefix, nchunks, dir3)
+
+    # Run track in splice mode
+    run_silent(track, input_file=datin, ext=ext, namelist=rsplice)
+
+    _collect_splice(os.getcwd(), ext, out_prefix, dir3)
+
+
+def plan_chunks(ntime, nx=None, ny=None, timestep=6, workers=None, memory=None, length=None,
+                overlap=None, fill_workers=False):
+    """
+    Works out the chunks that track_splice() tracks separately before splicing them.
+
+    Every chunk starts overlap frames before the end of the one before, and the last chunk is
+    made longer to take in the remaining frames. By default chunks span 15.5 days of data
+    (62 frames of 6 hourly data) and share 12 hours, which are shortened where needed to
+    keep a chunk within memory.
+
+    The default plan does not depend on workers, so that the spliced tracks of a parallel run
+    are those of a serial one. Chunks are only shortened to share the memory among the workers
+    and to give every worker a chunk with fill_workers=True, which changes the tracks slightly.
+
+    Parameters
+    ----------
+    ntime : int
+        Number of frames to track.
+    nx, ny : int or None
+        Grid size of the tracked field, needed to apply memory.
+    timestep : float
+        Hours between frames.
+    workers : int or None
+        Number of TRACK runs at the same time, only used with fill_workers. Both signs of a chunk
+        are tracked at once, so there are then at least workers / 2 chunks where the frames allow.
+    memory : int, str or None
+        Memory for a TRACK run, in bytes or as a string like '8G'. With fill_workers, memory
+        for all the TRACK runs at the same time.
+    length : int or None
+        Frames per chunk, overriding the choice above.
+    overlap : int or None
+        Frames shared by consecutive chunks, overriding the choice above.
+    fill_workers : bool
+        Shorten the chunks for workers as described above. Default is False.
+
+    Returns
+    -------
+    ChunkPlan
+    """
+    from math import ceil
+    from .cache import _parse_size
+
+    if overlap is None:
+        overlap = max(2, int(ceil(_OVERLAP_HOURS / timestep)))
+    if length is None:
+        length = int(round(_CHUNK_HOURS / timestep))
+        running = max(1, workers or 1) if fill_workers else 1
+        memory = _parse_size(memory)
+        if memory is not None and nx and ny:
+            length = min(length, int(memory // (running * int(nx) * int(ny) * _BYTES_PER_POINT)))
+        if running > 1:
+            length = min(length, int(ceil(ntime / ceil(running / 2))) + overlap)
+        # long enough for the overlap to be a small part of a chunk
+        length = max(length, 8 * overlap)
+    if length <= overlap + 1:
+        raise ValueError("Chunks of " + str(length) + " frames are too short for an overlap of " +
+                         str(overlap) + " frames")
+
+    # chunk N + 1 starts overlap frames before the end of chunk N, and the last chunk is
+    # longer by a quarter, so that as few chunks as possible take in all ntime frames
+    I = length - 1
+    E = ceil(ntime / length)
+    while E > 1 and length + (E - 1) * I + length // 4 < ntime:
+        E += 1
+    chunks = []
+    S, F = 1, length
+    for N in range(1, E + 1):
+        if N == E and N > 1:
+            F += length // 4
+        chunks.append((N, S, F))
+        S = F - overlap
+        F = F + I
+    return ChunkPlan(length, overlap, chunks)
+
+
+def track_splice(datin, ext, ntime, trunc, keep_all_files=False, workers=None, session=None,
+                 append=False, plan=None, memory=None, timestep=6, progress=True):
     """
     Code to run feature tracking in parts and combine at the end.
     This is because tracking in one go can be really expensive for long time series.
@@ -158,18 +463,44 @@ def track_splice(datin, ext, ntime, trunc, keep_all_files=False):
     keep_all_files : bool
         Do you want to keep all the intermediate files? Default is no.
         Turn this on if you want to retreive these files, or during development.
+    workers : int or None
+        Number of TRACK runs to do at the same time. Default is None, which tracks the chunks
+        one after the other in the current process. If more than one, the +ve and -ve fields of
+        every chunk, and then the two splices, are run in separate processes inside scratch
+        folders under output_track/{ext}/scratch - workers=2 already tracks both signs at once.
+        The spliced output is identical to that of a serial run with the same plan.
+    session : TrackSession or None
+        Session to run the TRACK calls in, instead of starting one with workers processes.
+    append : bool
+        Keep the tracks of every chunk and a manifest of the chunks (output_track/{ext}/splice.json),
+        so that a later call with append=True on the same datin extended with new frames only
+        tracks the chunks holding new frames, and then splices all chunks again. Chunks are laid
+        out as for a single run on the whole of datin, with the chunk length and overlap of the
+        first run, so the spliced tracks are those of a full rerun.
+    plan : ChunkPlan, int or None
+        Chunks to track, as returned by plan_chunks(), or the number of frames per chunk.
+        Default is None, which lets plan_chunks() choose from ntime, the grid of datin and memory,
+        the same for any number of workers. The plan is printed, and recorded in splice.json in
+        append mode.
+    memory : int, str or None
+        Memory for a TRACK run, e.g. '4G', see plan_chunks().
+    timestep : float
+        Hours between the frames of datin.
+    progress : bool or callable
+        Show a bar of the frames tracked in the running chunks, with frames per second and ETA,
+        read from TRACK's output as it runs (default). A callable is called with the chunk number,
+        sign ('max' or 'min') and every frame tracked instead. False only shows the chunks done.
     """
 
+    import json
     import shutil
     from pathlib import Path
-    from math import ceil
-    import re
     import os
-    from .utils import run_silent
     from tqdm import tqdm
+    from .trace import _stage
+    from .progress import _chunk_progress
 
     SRCDIR = Path(os.path.dirname(__file__))
-    RDAT = SRCDIR / "indat"
     ODAT=Path(os.getcwd())
     DIR2 = ODAT / "output_track"
     DIR3 = DIR2 / ext
@@ -178,190 +509,158 @@ def track_splice(datin, ext, ntime, trunc, keep_all_files=False):
     INITIAL = os.path.join(SRCDIR, 'data', 'initial.T'+trunc+'_'+ext[:2])
     EXT=ext
 
-    ST = 1
-    FN = 62
-    BACK = 2
     FOREWARD = 3
-    TERMFR = -1
-    NN = 1
 
     RUNDT = "RUNDATIN.VOR"
     RUNOUT = "RUNDATOUT"
 
-    # get number of timesteps and number of chunks for tracking
-    EE = ceil(ntime/FN)
-
     DIR2.mkdir(exist_ok=True)
     DIR3.mkdir(exist_ok=True)
 
-    def replace_namelist(template_file, S, F, initial, first_run=True, flag=False):
-        """
-        Mimics sed namelist replacements.
-        
-        If first_run=True: corresponds to N == 1 in csh script
-        If flag=True: applies special replacement for _A.in files
-        """
-        out_lines = []
-
-        with open(template_file) as f:
-            for line in f:
-                # Replace leading numbers + #
-                if re.match(r"^[0-9]*#", line):
-                    line = re.sub(r"^[0-9]*#", str(S), line)
-
-                # Replace leading numbers + !
-                if re.match(r"^[0-9]*!", line):
-                    line = re.sub(r"^[0-9]*!", str(F), line)
-
-                # First run (N==1)
-                if first_run:
-                    if line.lstrip().startswith("i%"):
-                        line = re.sub(r"^i%", "i", line)
-                    if line.lstrip().startswith("n~"):
-                        line = re.sub(r"^n~", "n", line)
-                # Special flag (_A.in)
-                elif flag:
-                    if line.lstrip().startswith("i%"):
-                        line = re.sub(r"^i%", "y", line)
-                    # Do NOT delete lines starting with n~ (unlike the normal else)
-                # Normal else (N>1, not flag)
-                else:
-                    if line.lstrip().startswith("i%"):
-                        line = re.sub(r"^i%", "y", line)
-                    if line.lstrip().startswith("n~"):
-                        continue  # delete this line
-
-                # Replace %INITIAL% everywhere
-                line = line.replace("%INITIAL%", initial)
-                out_lines.append(line)
-
-        return "".join(out_lines)
-
-    S = ST
-    F = FN
-    I = F - S
-
-    N = NN
-    E = EE
-    QQ = 0
-
-    for N in tqdm(range(1, E + 1), desc="Tracking in parts"):
-
-        # --- Prepare input files ---
-        fileA = ODAT / f"{RUNDT}.{EXT}"
-        fileB = ODAT / f"{RUNDT}_A.{EXT}"
-
-        first_run = N == 1
-        templateA = RDAT / f"{RUNDT}.in"
-        templateB = RDAT / f"{RUNDT}_A.in"
-
-        fileA.write_text(replace_namelist(templateA, S, F, INITIAL, first_run))
-
-        # --- Create output directories ---
+    # an append run keeps the chunk length and overlap of the run it extends
+    MANIFEST = DIR3 / "splice.json"
+    manifest = None
+    if append and MANIFEST.exists():
+        with open(MANIFEST) as f:
+            manifest = json.load(f)
+        plan = ChunkPlan(manifest.get('length', 62), manifest.get('overlap', 2), None)
+
+    # work out the frame range of every chunk up front
+    if isinstance(plan, ChunkPlan):
+        if not plan.chunks:
+            plan = plan_chunks(ntime, length=plan.length, overlap=plan.overlap)
+    elif plan is not None:
+        plan = plan_chunks(ntime, timestep=timestep, length=int(plan))
+    else:
+        nx = ny = None
+        try:
+            from .io import _field_header
+            with open(DATIN, 'rb') as f:
+                nx, ny = _field_header(f)[:2]
+        except (OSError, ValueError):
+            pass
+        plan = plan_chunks(ntime, nx, ny, timestep=timestep, memory=memory)
+    chunks = [tuple(c) for c in plan.chunks]
+    E = len(chunks)
+    print("Tracking " + str(ntime) + " frames in " + str(E) + " chunks of " + str(plan.length) +
+          " frames, overlapping by " + str(plan.overlap))
+
+    # chunks tracked by an earlier append run over the same frames, and complete then - the
+    # last chunk of that run is always tracked again, as its frames ran past the end of the data
+    done = set()
+    if manifest is not None:
+        if manifest['trunc'] != trunc:
+            raise ValueError("Can not append T" + trunc + " tracking to the T" + manifest['trunc'] +
+                             " tracking in " + str(DIR3))
+        for N, S, F in manifest['chunks'][:-1]:
+            files = [DIR3 / f"DJF_{sign}_{N}" / name for sign in ("MAX", "MIN")
+                     for name in ("objout.new", "tdump")]
+            if (N, S, F) in chunks and F <= manifest['ntime'] and all(f.exists() for f in files):
+                done.add(N)
+    todo = [(N, S, F) for N, S, F in chunks if N not in done]
+    if done:
+        print("Reusing the tracks of " + str(len(done)) + " of " + str(len(chunks)) + " chunks")
+
+    # --- Create output directories ---
+    for N, S, F in chunks:
+        (DIR3 / f"DJF_MAX_{N}").mkdir(parents=True, exist_ok=True)
+        (DIR3 / f"DJF_MIN_{N}").mkdir(parents=True, exist_ok=True)
+
+    # --- Prepare splice files, in chunk order ---
+    splice_max = ""
+    splice_min = ""
+    for N, S, F in chunks:
         max_dir = DIR3 / f"DJF_MAX_{N}"
         min_dir = DIR3 / f"DJF_MIN_{N}"
-        max_dir.mkdir(parents=True, exist_ok=True)
-        min_dir.mkdir(parents=True, exist_ok=True)
-
-        # --- Run TRACK for +ve field ---
-        run_silent(track, input_file=DATIN, ext=ext, namelist=fileA)
-
-
-        # Move output files to DJF_MAX
-        file_list = [RUNDT, "objout.new", "objout", "tdump", "idump"]
-        for fname in file_list:
-            for src_file in ODAT.glob(f"{fname}{ext}"):
-                dst_file = max_dir / fname
-                shutil.move(str(src_file), str(dst_file))
-        
-        fileB.write_text(replace_namelist(templateB, S, F, INITIAL, first_run, flag=True))
-        # --- Run TRACK for -ve field ---
-        run_silent(track,input_file=DATIN, ext=ext, namelist=fileB)
-
-        # Move output files to DJF_MIN
-        file_list = [RUNDT, "objout.new", "objout", "tdump", "idump"]
-        for fname in file_list:
-            for src_file in ODAT.glob(f"{fname}{ext}"):
-                dst_file = min_dir / fname
-                shutil.move(str(src_file), str(dst_file))
-
-        # --- Prepare splice files ---
-        splice_max = ODAT / f"splice_max.{EXT}"
-        splice_min = ODAT / f"splice_min.{EXT}"
         mode = 1 if N == 1 else FOREWARD
 
-        with open(splice_max, "a") as f:
-            f.write(f"{max_dir}/objout.new\n{max_dir}/tdump\n{mode}\n")
-        with open(splice_min, "a") as f:
-            f.write(f"{min_dir}/objout.new\n{min_dir}/tdump\n{mode}\n")
-
-        if QQ > 0:
-            break
-
-        # --- Update loop counters ---
-        N += 1
-        S = F - BACK
-        F = F + I if N < E else F + I + 15
-
-        if TERMFR > 0 and F > TERMFR:
-            F = TERMFR
-            E = N
-            QQ = 1
-
-    shutil.move("initial"+ext, DIR3 / "initial")
-
-    def run_splice(splice_file, out_prefix, ext):
-        temp_file = ODAT / f"RSPLICE.temp.{out_prefix}"
-        rsplice = ODAT / f"RSPLICE.{out_prefix}"
-
-        ODAT.mkdir(parents=True, exist_ok=True)
+        splice_max += f"{max_dir}/objout.new\n{max_dir}/tdump\n{mode}\n"
+        splice_min += f"{min_dir}/objout.new\n{min_dir}/tdump\n{mode}\n"
 
-        marker_re = re.compile(r"^[0-9]+!")
+    if session is None and (workers is None or workers <= 1):
+        for N, S, F in tqdm(todo, desc="Tracking in parts"):
+            for sign, out_dir in (("max", DIR3 / f"DJF_MAX_{N}"), ("min", DIR3 / f"DJF_MIN_{N}")):
+                with _stage("track_chunk", ext=ext, chunk=N, sign=sign, frames=[S, F]), \
+                        _chunk_progress(progress, [(N, sign, S, min(F, ntime))], f"Chunk {N} {sign}") as report:
+                    _track_chunk(DATIN, ext, S, F, INITIAL, N == 1, sign, out_dir,
+                                 progress=None if report is None else lambda frame: report(0, frame))
 
-        with open(RDAT / "RSPLICE.in", "r") as f_in, open(temp_file, "w") as f_temp:
-            splice_text = splice_file.read_text()
-            for line in f_in:
-                f_temp.write(line)
-                if marker_re.match(line):
-                    f_temp.write(splice_text)
+        shutil.move("initial"+ext, DIR3 / "initial")
 
-        text = temp_file.read_text()
-        text = text.replace("initial", str(DIR3 / "initial"))
-        text = re.sub(r"^[0-9]+!", str(E), text, flags=re.MULTILINE)
-
-        rsplice.write_text(text)
-
-        temp_file.unlink()
-        splice_file.unlink()
-
-        # Run track in splice mode
-        run_silent(track,input_file=DATIN, ext=ext, namelist=rsplice)
-
-        # Move outputs
-
-        prefixes = ["tr_trs", "tr_grid", "ff_trs"]
-        for prefix in prefixes:
-            for src in ODAT.glob(f"{prefix}{ext}*"):
-                name = src.name
-                suffix = ".nc" if name.endswith(".nc") else ""
-                dst = DIR3 / f"{prefix}_{out_prefix}{suffix}"
+        # Run splice for positive and negative
+        print("Combining individual track splits with output to "+str(DIR3))
+        for text, prefix in ((splice_max, "pos"), (splice_min, "neg")):
+            with _stage("splice", ext=ext, sign=prefix, chunks=E):
+                _run_splice(text, prefix, DATIN, ext, E, DIR3)
+    else:
+        # every (chunk, sign) pair runs in its own scratch folder, in a TrackSession worker
+        from .session import TrackSession
 
-                shutil.move(str(src), str(dst))
-        shutil.move(str(rsplice), DIR3 / f"RSPLICE_{out_prefix}")
+        own_session = session is None
+        if own_session:
+            session = TrackSession(workers)
 
+        try:
+            SCRATCH = DIR3 / "scratch"
+            datin_abs = os.path.abspath(DATIN)
+            jobs = []
+            outputs = []
+            runs = []
+            for N, S, F in todo:
+                for sign, out_dir in (("max", DIR3 / f"DJF_MAX_{N}"), ("min", DIR3 / f"DJF_MIN_{N}")):
+                    runs.append((N, sign, S, min(F, ntime)))
+                    workdir = SCRATCH / f"chunk_{N}_{sign}"
+                    workdir.mkdir(parents=True, exist_ok=True)
+                    namelist = _chunk_namelist(workdir, ext, S, F, INITIAL, N == 1, sign)
+                    jobs.append(dict(input_file=datin_abs, ext=ext, namelist=str(namelist), workdir=str(workdir)))
+                    outputs.append((workdir, out_dir))
+
+            with tqdm(total=len(jobs), desc="Tracking in parts") as pbar, \
+                    _stage("track_chunks", ext=ext, chunks=len(todo), workers=session.workers), \
+                    _chunk_progress(progress, runs, "Frames") as report:
+                session.map(jobs, callback=lambda i, result: pbar.update(1), progress=report)
+            for workdir, out_dir in outputs:
+                _collect_chunk(workdir, ext, out_dir)
+
+            # the serial run leaves the initialisation file of the last chunk
+            shutil.move(str(outputs[-1][0] / ("initial"+ext)), DIR3 / "initial")
+
+            # Run splice for positive and negative at the same time
+            print("Combining individual track splits with output to "+str(DIR3))
+            jobs = []
+            for text, prefix in ((splice_max, "pos"), (splice_min, "neg")):
+                workdir = SCRATCH / f"splice_{prefix}"
+                workdir.mkdir(parents=True, exist_ok=True)
+                rsplice = _splice_namelist(workdir, text, prefix, E, DIR3)
+                jobs.append(dict(input_file=datin_abs, ext=ext, namelist=str(rsplice), workdir=str(workdir)))
+            with _stage("splice", ext=ext, sign="both", chunks=E):
+                session.map(jobs)
+            for prefix in ("pos", "neg"):
+                _collect_splice(SCRATCH / f"splice_{prefix}", ext, prefix, DIR3)
+        finally:
+            if own_session:
+                session.close()
 
-    # Run splice for positive and negative
-    print("Combining individual track splits with output to "+str(DIR3))
-    run_splice(ODAT / f"splice_max.{EXT}", "pos", ext=ext)
-    run_splice(ODAT / f"splice_min.{EXT}", "neg", ext=ext)
+    if append:
+        tmp = DIR3 / "splice.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(dict(trunc=trunc, ntime=ntime, length=plan.length, overlap=plan.overlap,
+                           chunks=chunks), f, indent=1)
+        os.replace(tmp, MANIFEST)
 
-    
     # Cleanup
     for f in ODAT.glob(f"{RUNDT}*.{EXT}"):
         f.unlink()
     if not keep_all_files:
         for f in DIR3.iterdir():
-            if not (f.name.startswith("ff") or f.name.startswith("tr")):
+            if append and f == MANIFEST:
+                continue
+            if append and f.name.startswith("DJF_"):
+                # only the chunk tracks are needed to splice again
+                for name in ("objout", "idump", "RUNDATIN.VOR"):
+                    if (f / name).exists():
+                        (f / name).unlink()
+            elif not (f.name.startswith("ff") or f.name.startswith("tr")):
                 if f.is_file():
                     f.unlink()
                 elif f.is_dir():
@@ -3,7 +3,10 @@ import os
 from typing import Literal
 from math import ceil
 from .track import track, track_splice
-from .utils import data_indat, regrid, run_silent
+from .utils import data_indat, regrid, run_silent, run_isolated, preprocess, is_gaussian, MemoryFile
+from .cache import _as_cache
+from .trace import _stage, _tracing
+from tqdm import tqdm
 
 try:
     from cdo import *
@@ -11,9 +14,51 @@ try:
 except Exception as e:
     cdo = None
 
-__all__ = ['track_uv', 'calc_vorticity']
+__all__ = ['track_uv', 'calc_vorticity', 'tr2nc_batch', 'tr2nc_output']
 
-def calc_vorticity(uv_file, outfile='vorticity_out.dat', ext='_ext'):
+EARTH_RADIUS_M = 6.37e+6  # as in TRACK's include/geo_values.h
+
+def calc_vorticity(uv_file, outfile='vorticity_out.dat', ext='_ext', cache=None,
+                   backend: Literal['track', 'numpy'] = 'track', block_size=None):
+    """
+    Computes 850hPa relative vorticity from u-v wind data, either with TRACK or with numpy.
+
+    Parameters
+    ----------
+    uv_file : str
+        Name of the input file containing ua and va.
+    outfile : str
+        Name of the vorticity file to write, in TRACK's binary format.
+    ext : str
+        Extension to append to the TRACK output files.
+    cache : FieldCache, str or None
+        Cache to look the vorticity up in before computing it, see FieldCache.
+        A folder name uses a FieldCache in that folder.
+    backend : str
+        'track' (default) fits splines to the winds with TRACK, frame by frame.
+        'numpy' computes the vorticity on the same grid with vectorized finite differences
+        (spectral in longitude for global grids), many frames at a time. The output file
+        has the same layout, and differs from the TRACK one only by the differencing error.
+    block_size : int or None
+        Number of frames computed at once by the numpy backend. Defaults to as many as
+        fit in about 256MB.
+    """
+
+    cache = _as_cache(cache)
+    if cache is not None:
+        key = cache.key(uv_file, 'vorticity', lev=85000, backend=backend)
+        if cache.get(key, outfile) is not None:
+            print("Using cached vorticity for "+outfile)
+            return
+
+    if backend == 'numpy':
+        print("Computing vorticity with numpy and outputting to "+outfile)
+        _calc_vorticity_numpy(uv_file, outfile, lev=85000, block_size=block_size)
+        if cache is not None:
+            cache.put(key, outfile)
+        return
+    elif backend != 'track':
+        raise ValueError("Unknown vorticity backend " + str(backend) + ". Please pass 'track' or 'numpy'")
 
     # gather information about data
     year = cdo.showyear(input=uv_file)[0]
@@ -33,15 +78,132 @@ def calc_vorticity(uv_file, outfile='vorticity_out.dat', ext='_ext'):
     print("Computing vorticity and outputting to "+outfile)
     # track(input_file=uv_file, namelist=f'calcvor_onelev_{ext}.in', ext=ext)
     run_silent(track, input_file=uv_file, namelist=f'calcvor_onelev_{ext}.in', ext=ext)
-    
+
+    if cache is not None:
+        cache.put(key, outfile)
+
+
+def _relative_vorticity(u, v, lon, lat):
+    """
+    Relative vorticity (1/(a cos(lat))) * (dv/dlon - d(u cos(lat))/dlat) of u and v with shape
+    (..., nlat, nlon) on the grid lon, lat in degrees. Longitude derivatives are spectral on
+    global uniform grids and centred differences otherwise. Rows at the poles, where cos(lat)
+    vanishes, get the mean vorticity of the polar cap bounded by the next row, from the
+    circulation of u around it.
+    """
+
+    import numpy as np
+
+    lam = np.deg2rad(np.asarray(lon, dtype=np.float64))
+    phi = np.deg2rad(np.asarray(lat, dtype=np.float64))
+    coslat = np.cos(phi)[:, None]
+
+    nx = len(lam)
+    dx = lam[1] - lam[0]
+    if np.allclose(np.diff(lam), dx) and abs(nx * dx - 2 * np.pi) < 1e-4:
+        k = np.arange(nx // 2 + 1, dtype=np.float64)
+        if nx % 2 == 0:
+            k[-1] = 0.0  # derivative of the Nyquist wave is not resolved
+        dvdl = np.fft.irfft(np.fft.rfft(v, axis=-1) * (1j * k), n=nx, axis=-1)
+    else:
+        dvdl = np.gradient(v, lam, axis=-1)
+
+    ducdp = np.gradient(u * coslat, phi, axis=-2)
+
+    vor = (dvdl - ducdp) / (EARTH_RADIUS_M * coslat)
+
+    for pole, edge in ((0, 1), (-1, -2)):
+        if len(phi) > 1 and abs(abs(phi[pole]) - np.pi / 2) < 1e-6:
+            # circulation around the cap divided by its area, anticlockwise seen from above the pole
+            sign = np.sign(phi[pole])
+            cap = EARTH_RADIUS_M * (1 - abs(np.sin(phi[edge])))
+            vor[..., pole, :] = (sign * np.mean(u[..., edge, :], axis=-1) * np.cos(phi[edge]) / cap)[..., None]
+
+    return vor
+
+def _calc_vorticity_numpy(uv_file, outfile, lev=85000, block_size=None):
+    """
+    Computes the relative vorticity of ua and va in uv_file in blocks of frames and writes it
+    in TRACK's binary format, with latitudes in ascending order as TRACK would.
+
+    lev and outfile may also be lists, of levels and the files to write each of them to. Every
+    block of frames is then read once for all the levels, and their vorticity computed together.
+    """
+
+    import numpy as np
+    from contextlib import ExitStack
+    from netCDF4 import Dataset
+    from .io import FieldWriter
+
+    levels = list(lev) if isinstance(lev, (list, tuple)) else [lev]
+    outfiles = list(outfile) if isinstance(outfile, (list, tuple)) else [outfile]
+    if len(levels) != len(outfiles):
+        raise ValueError("Pass one output file for every level")
+
+    with Dataset(uv_file, 'r') as ds:
+        uvar = ds.variables['ua'] if 'ua' in ds.variables else ds.variables[list(ds.variables)[-2]]
+        vvar = ds.variables['va'] if 'va' in ds.variables else ds.variables[list(ds.variables)[-1]]
+        lon = np.asarray(ds.variables['lon'][:], dtype=np.float64)
+        lat = np.asarray(ds.variables['lat'][:], dtype=np.float64)
+        nt = uvar.shape[0]
+
+        # pick the levels the same way calcvor_onelev.in does for 4D data
+        index = ()
+        if uvar.ndim == 4:
+            levs = np.asarray(ds.variables[uvar.dimensions[1]][:], dtype=np.float64)
+            found = []
+            for lev in levels:
+                match = np.where((np.abs(levs - lev) < 1e-5) | (np.abs(levs - lev / 100.) < 1e-5))[0]
+                if len(match) == 0:
+                    raise ValueError("Level " + str(lev) + " not found in " + uv_file)
+                found.append(int(match[0]))
+            # netCDF4 reads a sorted list of levels in one go
+            read = sorted(set(found))
+            index = (read,) if len(levels) > 1 else (found[0],)
+            pick = [read.index(i) for i in found]
+        elif len(levels) > 1:
+            raise ValueError("No level dimension in " + uv_file + " to pick levels from")
+
+        # TRACK expects longitudes in [0, 360) and latitudes south to north
+        lon = np.mod(lon, 360.)
+        xorder = np.argsort(lon, kind='stable')
+        yorder = np.argsort(lat, kind='stable')
+        lon = lon[xorder]
+        lat = lat[yorder]
+
+        if block_size is None:
+            block_size = max(1, 2**28 // (len(lon) * len(lat) * 8 * 6 * len(levels)))
+
+        with ExitStack() as stack:
+            # the frame count is known up front, for an outfile that is a pipe
+            outs = [stack.enter_context(FieldWriter(f, lon, lat, nframes=nt)) for f in outfiles]
+            for t0 in range(0, nt, block_size):
+                sel = (slice(t0, min(t0 + block_size, nt)),) + index
+                u = np.ma.filled(uvar[sel], 0.).astype(np.float64)[..., yorder, :][..., xorder]
+                v = np.ma.filled(vvar[sel], 0.).astype(np.float64)[..., yorder, :][..., xorder]
+                vor = _relative_vorticity(u, v, lon, lat)
+                if len(levels) == 1:
+                    outs[0].write(vor)
+                else:
+                    for out, k in zip(outs, pick):
+                        out.write(vor[:, k])
 
 def track_uv(infile,
              outdirectory=None,
-             hemisphere: Literal['NH', 'SH'] = 'NH',
+             hemisphere: Literal['NH', 'SH', 'both'] = 'NH',
              ysplit: bool = False,
              sdate=None,
              trunc: Literal['42', '63'] = '42',
-             keep_all_files: bool = False,):
+             keep_all_files: bool = False,
+             workers=None,
+             cache=None,
+             vorticity_backend: Literal['track', 'numpy', None] = None,
+             append: bool = False,
+             chunk_length=None,
+             memory=None,
+             trace=None,
+             stream: bool = False,
+             levels=None):
     """
     Workflow to track features on 850hPa u-v wind data. Tracks both cyclones and anticyclones.
     The input file should contain 6-hourly data, and should have dimensions {time, lat, lon} (no height dimension!)
@@ -49,15 +211,24 @@ def track_uv(infile,
     First computes vorticity from the input data and then truncates and spectrally filters out small wavenumbers.
 
     Tracks features on this data. Outputs to outdirectory in folders of {hemisphere}_y{year}.
+    If both hemispheres are requested, the vorticity and filtering are done only once and
+    the filtered field is tracked for each hemisphere.
 
     If sdate is passed, then rewrites the .nc files with date_time matching the passed sdate.
 
     Parameters
     ----------
-    infile : str
-        Name of the input file.
+    infile : str, list or xarray.Dataset
+        Name of the input file, or a Dataset with ua and va that is already in memory.
+        A Dataset is read through an anonymous in-memory netCDF file, without writing the
+        input to disk - cdo, which regrids input that is not on a Gaussian grid, reads a copy
+        in /dev/shm. Several files, such as one file per month or separate ua and va files,
+        can be passed as a list of names or as a glob pattern like 'uv_2000*.nc'. They are
+        read as one time series straight into the processed input, without merging them first.
     outdirectory : str
         Path to the output directory, will be created if it does not already exist.
+    hemisphere : str or list
+        Hemisphere to track - 'NH', 'SH', or 'both' (equivalently ['NH', 'SH']).
     ysplit : bool
         Should tracking be done for each year separately.
         Turn this on if you're tracking by season!
@@ -70,11 +241,72 @@ def track_uv(infile,
     keep_all_files : bool
         Do you want to keep all the intermediate files? Default is no.
         Turn this on if you want to retreive these files, or during development.
+    workers : int or None
+        Number of worker processes. Default is None, which runs everything one after the other.
+        With ysplit=True and more than one year, this many years are tracked at the same time,
+        each in its own scratch folder under outdirectory/scratch_years, and the finished
+        {hemisphere}_y{year} folders are moved into output_track. Otherwise it is passed on to
+        track_splice() to track the chunks of the single time series at the same time.
+    cache : FieldCache, str, bool or None
+        Cache for the processed input, vorticity and filtered vorticity, see FieldCache.
+        These are looked up before being computed, so reruns on the same input file with
+        e.g. a different sdate or hemisphere skip the preprocessing. A folder name uses a
+        FieldCache in that folder, True uses the default ~/.cache/pyTRACK. Default is no cache.
+    vorticity_backend : str or None
+        How calc_vorticity() computes the vorticity - 'track' or 'numpy'. Default is None, which
+        is 'track' for a single level and 'numpy' with levels, which only the numpy backend reads.
+    append : bool
+        Keep the state needed to extend the tracking with newly arrived data - the filtered
+        vorticity, in output_track/append, and the tracks of every chunk, see track_splice().
+        If that state is already in outdirectory, infile should only hold the time steps after
+        those tracked so far. Only these are then preprocessed, filtered and tracked, and the
+        chunks are spliced again, giving the same tracks as a run on the whole time series.
+        With ysplit, years that were not tracked before are tracked from scratch.
+    chunk_length : int or None
+        Frames per chunk in track_splice(). Default is None, which chooses the chunks from the
+        number of frames, the grid and memory, see plan_chunks().
+    memory : int, str or None
+        Memory for a TRACK run, e.g. '4G', used to choose the chunks.
+    trace : str, bool or None
+        Record the time, CPU, peak memory and I/O of every stage and TRACK run, see Trace.
+        A file name writes the trace there, True writes it to outdirectory/trace_{date}.json.
+        A summary table is printed at the end. Default is no trace.
+    stream : bool
+        Pass the vorticity straight on to the spectral filter through a named pipe, with the two
+        running at the same time, instead of writing the whole vorticity field to disk and
+        reading it back. Only the filtered field is written. The vorticity is then not kept with
+        keep_all_files, nor put in the cache. Default is False.
+    levels : list or None
+        Pressure levels to track in hPa, e.g. [850, 700, 500, 250], for input with a pressure
+        level dimension, {time, plev, lat, lon}. The input is preprocessed once, and the
+        vorticity of all the levels is computed together, reading every block of time steps of
+        ua and va once, with the numpy backend. Every level is then filtered and tracked in its
+        own folder outdirectory/{level}hPa, which holds an output_track folder laid out as for a
+        single level, and can be passed as outdirectory to stats_track() or tr2nc_output().
+        With workers, the levels are filtered and tracked at the same time. Default is None,
+        which tracks a single level - 850hPa of 4D input.
     """
 
-    # copy infile to output directory and change directory
-    infile = os.path.abspath(os.path.expanduser(infile))
-    infile_copied=False
+    if hemisphere == 'both':
+        hemispheres = ['NH', 'SH']
+    elif isinstance(hemisphere, str):
+        hemispheres = [hemisphere]
+    else:
+        # each hemisphere once, in the order given
+        hemispheres = list(dict.fromkeys(hemisphere))
+    if not hemispheres or any(h not in ('NH', 'SH') for h in hemispheres):
+        raise ValueError("Invalid hemisphere " + str(hemisphere) + ". Please pass 'NH', 'SH' or 'both'")
+    if isinstance(levels, int):
+        levels = [levels]
+    if levels is not None and not levels:
+        raise ValueError("No levels given to track")
+    if vorticity_backend is None:
+        vorticity_backend = 'track' if levels is None else 'numpy'
+    if levels is not None and vorticity_backend != 'numpy':
+        raise ValueError("levels are only read by vorticity_backend='numpy', not " + repr(vorticity_backend))
+    if levels is not None and stream:
+        raise ValueError("stream can not be used with levels, whose vorticity is computed for all "
+                         "levels together")
 
     if outdirectory is None:
         outdir = os.getcwd()
@@ -82,177 +314,706 @@ def track_uv(infile,
         outdir = os.path.abspath(os.path.expanduser(outdirectory))
         os.makedirs(outdir, exist_ok=True)
 
-    dest_file = os.path.join(outdir, os.path.basename(infile))
+    with _tracing(trace, outdir), _stage("track_uv", hemispheres=hemispheres, ysplit=ysplit, trunc=trunc):
+        # the processed input is written to the output directory
+        memfile = None
+        if isinstance(infile, (str, os.PathLike, list, tuple)):
+            infile = _input_files(infile)
+            name = os.path.basename(infile[0])
+            if len(infile) == 1:
+                infile = infile[0]
+        else:
+            memfile = MemoryFile(infile)
+            infile = memfile.path
+            name = "input_array.nc"
+
+        dest_file = os.path.join(outdir, name)
+        infile_e = dest_file[:-3] + "_processed.nc"
+
+        cache = _as_cache(cache)
+        pkey = None
+        if cache is not None:
+            # in-memory input has no meaningful name or mtime, so is identified by its content
+            pkey = cache.key(infile, 'processed', hash_content=True if memfile else None,
+                             grid='gaussian', fill=0)
+
+        if cache is not None and cache.get(pkey, infile_e) is not None:
+            print("Using cached processed input " + infile_e)
+            os.chdir(outdir)
+        else:
+            os.chdir(outdir)
+
+            with _stage("preprocess", infile=infile):
+                _preprocess(infile, infile_e)
+            if cache is not None:
+                cache.put(pkey, infile_e)
+
+        if memfile is not None:
+            memfile.close()
+
+        # get final data info
+        data = data_indat(infile_e)
+        nx, ny = data.get_nx_ny()
+
+        # Years
+        years = cdo.showyear(input=infile_e)[0].split()
+        print("Years: ", years)
+
+        if not ysplit:
+            Y=years[0]
+            years = ["all"]
+
+        append_dir = os.path.join(outdir, "output_track", "append") if append else None
+        # the chunks span a fixed number of hours, whatever the time step of the input
+        splice_kwargs = dict(plan=chunk_length, memory=memory, timestep=_timestep(infile_e))
+
+        # do tracking for one year at a time
+        if levels is not None:
+            _track_levels(levels, years, None if ysplit else Y, infile_e, nx, ny, hemispheres, ysplit,
+                          sdate, trunc, keep_all_files, workers, outdir, cache=cache, pkey=pkey,
+                          append=append, splice_kwargs=splice_kwargs)
+        elif ysplit and workers is not None and workers > 1 and len(years) > 1:
+            # every year gets its own process and scratch folder inside outdir,
+            # the finished output_track/{ext} folder is then moved into place
+            scratch = os.path.join(outdir, "scratch_years")
+            os.makedirs(os.path.join(outdir, "output_track"), exist_ok=True)
+            jobs = [
+                (os.path.join(scratch, year), _track_year_isolated,
+                 dict(year=year, Y=year, infile_e=infile_e, nx=nx, ny=ny, hemispheres=hemispheres,
+                      ysplit=ysplit, sdate=sdate, trunc=trunc, keep_all_files=keep_all_files,
+                      outdir=outdir, cache=cache, pkey=pkey, backend=vorticity_backend,
+                      append_dir=append_dir, splice_kwargs=splice_kwargs, stream=stream))
+                for year in years
+            ]
+            print("Running TRACK for years " + ", ".join(years) + " on " + str(workers) + " workers...")
+            with tqdm(total=len(jobs), desc="Tracking years") as pbar:
+                run_isolated(jobs, workers=workers, callback=lambda i: pbar.update(1))
+            if not keep_all_files:
+                shutil.rmtree(scratch)
+        else:
+            for year in years:
+                os.chdir(outdir)
+                if ysplit:
+                    Y=year
 
-    if os.path.abspath(infile) != os.path.abspath(dest_file):
-        shutil.copy2(infile, dest_file)
-        infile_copied=True
+                with _stage("year", year=year):
+                    _track_year(year, Y, infile_e, nx, ny, hemispheres, ysplit, sdate, trunc,
+                                keep_all_files, workers, cache, pkey, vorticity_backend, append_dir,
+                                splice_kwargs, stream)
+                os.chdir(outdir)
 
-    infile = dest_file
-    os.chdir(outdir)
+    return
+
+def _input_files(infile):
+    """
+    Returns the absolute paths of the files matching infile - a file name, a glob pattern,
+    or a list of these.
+    """
+    import glob
+
+    names = [infile] if isinstance(infile, (str, os.PathLike)) else list(infile)
+    files = []
+    for name in names:
+        name = os.path.abspath(os.path.expanduser(os.fspath(name)))
+        if any(c in name for c in "*?[") and not os.path.exists(name):
+            matches = sorted(glob.glob(name))
+            if not matches:
+                raise FileNotFoundError("No input files match " + name)
+            files += matches
+        else:
+            files.append(name)
+    if not files:
+        raise ValueError("No input files given")
+    return files
+
+def _preprocess(infile, infile_e):
+    """
+    Removes the bounds variables, regrids to a Gaussian grid if needed and fills
+    missing values of infile, writing the result to infile_e.
+
+    The input is read once by preprocess(), straight from where it is. Only data that
+    is not on a Gaussian grid goes through an extra cdo regridding pass first, one file at a
+    time for a list of files.
+    """
+
+    from contextlib import ExitStack
+    from .utils import _shared_path
+
+    files = infile if isinstance(infile, list) else [infile]
 
     # read data characteristics
-    data = data_indat(infile)
-    gridtype = data.get_grid_type()
-    if ("va" not in data.vars) or ("ua" not in data.vars):
+    variables = set()
+    for file in files:
+        data = data_indat(file)
+        variables.update(data.vars)
+        if file == files[0]:
+            gaussian = is_gaussian(data.data.variables['lat'][:])
+        data.data.close()
+    if ("va" not in variables) or ("ua" not in variables):
         raise Exception("Invalid input variable type. Please input eithe " +
                             "a combined uv file or both ua and va")
-    
-    print("Remove unnecessary variables.")
-    
-    infile_e = infile[:-3] + "_processed.nc"
-    if "time_bnds" in data.vars:
-        ncks = "time_bnds"
-        if "lat_bnds" in data.vars:
-            ncks += ",lat_bnds,lon_bnds"
-        os.system("ncks -C -O -x -v " + ncks + " " + input + " " + infile_e)
-    elif "lat_bnds" in data.vars:
-        os.system("ncks -C -O -x -v lat_bnds,lon_bnds " + input + " " + infile_e)
-    else:
-        os.system("cp " + infile + " " + infile_e)
+
+    print("Remove unnecessary variables and fill missing values.")
 
     # interpolate, if not gaussian
-    infile_eg = infile_e[:-3] + "_gaussian.nc"
-    if gridtype == 'gridtype  = gaussian':
+    if gaussian:
         print("No regridding needed.")
+        preprocess(infile, infile_e)
     else:
-    # regrid
-        regrid(infile_e, infile_eg)
-    os.system("mv " + infile_eg + " " + infile_e)
+        regridded = []
+        with ExitStack() as stack:
+            for i, file in enumerate(files):
+                infile_eg = infile_e[:-3] + "_gaussian" + (str(i) if len(files) > 1 else "") + ".nc"
+                # cdo does not inherit the descriptor of an in-memory input, so reads a copy in /dev/shm
+                regrid(_shared_path(file, stack), infile_eg)
+                # cdo may recognise the grid as Gaussian after all
+                regridded.append(infile_eg if os.path.exists(infile_eg) else file)
+        preprocess(regridded if len(files) > 1 else regridded[0], infile_e)
+        for file in regridded:
+            if file not in files:
+                os.remove(file)
+
+def _track_year(year, Y, infile_e, nx, ny, hemispheres, ysplit, sdate, trunc,
+                keep_all_files=False, workers=None, cache=None, pkey=None, backend='track',
+                append_dir=None, splice_kwargs=None, stream=False, level=850, vorticity=None,
+                filtered=None):
+    """
+    Computes vorticity, filters and tracks one year (or 'all') of the processed data,
+    working in the current directory. The filtered field is computed once and tracked for
+    every hemisphere in hemispheres, with output to output_track/{hemisphere}_y{year}.
+    If a cache is passed, the vorticity and filtered fields are looked up under keys derived
+    from pkey, the key of the processed data. If append_dir is passed, the filtered field is
+    appended to the one kept there and tracked in append mode. splice_kwargs are passed on to
+    track_splice(). With stream, the vorticity is piped into the spectral filter instead of being
+    written out. level is the pressure level in hPa. vorticity is the name of the vorticity field
+    of the year at that level if it was computed already, and filtered the cache metadata of its
+    filtered field if that was taken from the cache already, see _track_levels(). Returns the list
+    of output extensions.
+    """
 
-    # fill missing values, modified to be xarray for now - ASh
-    infile_egf = infile_e[:-3] + "_filled.nc"
+    print("Running TRACK for year: " + year + "...")
+    # extension of the shared intermediate files
+    ext='_'.join(hemispheres)+'_y'+year
+    exts=[h+'_y'+year for h in hemispheres]
+
+    vor850_name = "vor"+str(level)+"_"+ext+".dat"
+    fname = "T"+trunc+"filt_" + vor850_name
+
+    info = filtered
+    if cache is not None:
+        vkey, fkey = _field_keys(cache, pkey, year, level, backend, trunc)
+        if info is None:
+            info = cache.get(fkey, fname)
+
+    if info is not None:
+        print('Using cached T'+trunc+' filtered vorticity for '+fname)
+        ntime = info['ntime']
+        if vorticity is not None:
+            os.remove(vorticity)
+    else:
+        if vorticity is not None:
+            # computed already, together with the other levels
+            from .io import open_field
+            if os.path.abspath(vorticity) != os.path.abspath(vor850_name):
+                os.rename(vorticity, vor850_name)
+            with open_field(vor850_name) as field:
+                ntime = len(field)
+        else:
+            # select year from data
+            if ysplit:
+                year_file = os.path.basename(infile_e)[:-3] + "_" + year + ".nc"
+                cdo.selyear(year, input=infile_e, output=year_file)
+            else:
+                year_file=infile_e
 
-    os.system("cdo setmisstoc,0 " + infile_e +
-              " " + infile_egf)
-    
-    # check if ncatted exists
-    if shutil.which("ncatted") is None:
-        print("If on a conda env, conda install conda-forge::pynco to resolve this")
-        raise RuntimeError("Error: 'ncatted' command not found. Please install NCO before running this script.")
+            data = data_indat(year_file)
+            ntime = data.get_timesteps()
 
-    os.system("ncatted -a _FillValue,,d,, -a missing_value,,d,, " + infile_egf)
-    os.system("mv " + infile_egf + " " + infile_e)
-    
-    # get final data info
-    data = data_indat(infile_e)
-    nx, ny = data.get_nx_ny()
-    if (not keep_all_files) and infile_copied:
-        os.remove(infile) # keep_all_files?
+        indat=os.path.join(os.path.dirname(__file__), "indat", "specfilt.in")
+        spec_namelist = "spec_T"+trunc+"_nx" + nx + "_ny" + ny + ".in"
+        os.system(
+        'sed -e "s/NX/{nx}/;s/NY/{ny}/;s/TRUNC/{trunc}/" {indat} > {namelist}'
+        .format(nx=nx, ny=ny, indat=indat, trunc=trunc, namelist=spec_namelist)
+        )
 
-    # Years
-    years = cdo.showyear(input=infile_e)[0].split()
-    print("Years: ", years)
+        # calculate vorticity from UV
+        streamed = False
+        if vorticity is not None:
+            if cache is not None:
+                cache.put(vkey, vor850_name)
+        elif cache is not None and cache.get(vkey, vor850_name) is not None:
+            print("Using cached vorticity for "+vor850_name)
+            if ysplit and not keep_all_files:
+                os.remove(year_file)
+        elif stream:
+            # the vorticity goes straight into the spectral filter through a named pipe and is
+            # never written out, the two TRACK runs each need a process of their own
+            vext = ext+'_vor'
+            print('Computing vorticity and T'+trunc+' filtering it through a pipe to output file '+fname)
+            os.mkfifo(vor850_name)
+            try:
+                with _stage("vorticity_filter", backend=backend, year=year, trunc=trunc, ext=ext):
+                    run_isolated([(os.getcwd(), calc_vorticity,
+                                   dict(uv_file=year_file, outfile=vor850_name, ext=vext, backend=backend)),
+                                  (os.getcwd(), _spectral_filter,
+                                   dict(vorticity=vor850_name, ext=ext, namelist=spec_namelist))],
+                                 workers=2, stop_on_error=True)
+            finally:
+                os.remove(vor850_name)
+            streamed = True
+            if not keep_all_files:
+                for leftover in ['calcvor_onelev_'+vext+'.in', 'initial'+vext]:
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                if ysplit:
+                    os.remove(year_file)
+        else:
+            with _stage("calc_vorticity", backend=backend, year=year):
+                calc_vorticity(year_file, outfile=vor850_name, ext=ext, backend=backend)
+            if not keep_all_files:
+                # only written by the TRACK backend
+                for leftover in ['calcvor_onelev_'+ext+'.in', 'initial'+ext]:
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                if ysplit:
+                    os.remove(year_file)
+            if cache is not None:
+                cache.put(vkey, vor850_name)
+
+        if not streamed:
+            print('T'+trunc+' truncation and filtering out small wavenumbers to output file '+fname)
+            with _stage("spectral_filter", trunc=trunc, ext=ext):
+                _spectral_filter(vor850_name, ext, spec_namelist)
+        os.rename("specfil_band000."+ext+"_band000", fname)
+        if not keep_all_files:
+            os.remove(spec_namelist) # keep_all_files?
+            os.remove('initial'+ext)
+            if not streamed:
+                os.remove(vor850_name)
+        if cache is not None:
+            cache.put(fkey, fname, ntime=ntime)
+
+    datin = fname
+    if append_dir is not None:
+        datin, ntime, state = _append_filtered(append_dir, ext, fname, ntime, trunc,
+                                               _time_range(infile_e, year if ysplit else None), Y)
+        Y = state['start_year']
+
+    splice_kwargs = dict(splice_kwargs or {}, append=append_dir is not None)
+    curr = os.getcwd()
+    if len(exts) > 1 and workers is not None and workers > 1:
+        # track the hemispheres at the same time, each in its own scratch folder
+        os.makedirs(os.path.join(curr, "output_track"), exist_ok=True)
+        splice_workers = workers // len(exts) if workers // len(exts) > 1 else None
+        jobs = [
+            (os.path.join(curr, "scratch_" + hext), _track_splice_isolated,
+             dict(datin=os.path.abspath(datin), ext=hext, ntime=ntime, trunc=trunc,
+                  keep_all_files=keep_all_files, workers=splice_workers, outdir=curr,
+                  **splice_kwargs))
+            for hext in exts
+        ]
+        run_isolated(jobs, workers=workers)
+        if not keep_all_files:
+            for job in jobs:
+                shutil.rmtree(job[0])
+    else:
+        for hext in exts:
+            with _stage("track_splice", ext=hext, ntime=ntime):
+                track_splice(datin, hext, ntime, trunc, keep_all_files=keep_all_files, workers=workers,
+                             **splice_kwargs)
+            if not keep_all_files:
+                # only left behind in the working directory when track_splice ran serially
+                for leftover in ['interp_th'+hext, 'initial'+hext]:
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+    if append_dir is not None:
+        # the new frames are only recorded once they are tracked
+        _write_state(append_dir, ext, state)
+    elif not keep_all_files:
+        os.remove(fname)
+
+    if sdate is not None:
+        print('sdate passed - rewriting .nc files with Gregorian dates')
+        files = [os.path.join(curr, 'output_track', hext, file) for hext in exts
+                 for file in ["tr_trs_pos", "tr_trs_neg", "ff_trs_pos", "ff_trs_neg"]]
+        tr2nc_batch(files, _start_datetime(Y, sdate), workers=workers)
+
+    return exts
+
+def _track_levels(levels, years, Y, infile_e, nx, ny, hemispheres, ysplit, sdate, trunc,
+                  keep_all_files, workers, outdir, cache=None, pkey=None, append=False,
+                  splice_kwargs=None):
+    """
+    Tracks every pressure level in levels (hPa) of the processed data, a year at a time, each in
+    its own folder outdir/{level}hPa with the output_track layout of a single level run. The
+    vorticity of all levels is computed in one pass over the year, reading every block of time
+    steps of ua and va once, and the levels are then filtered and tracked by _track_year(), at
+    the same time in their own processes if workers is more than 1.
+    """
 
-    if not ysplit:
-        Y=years[0]
-        years = ["all"]
+    dirs = [os.path.join(outdir, str(level) + "hPa") for level in levels]
+    for folder in dirs:
+        os.makedirs(folder, exist_ok=True)
 
-    # do tracking for one year at a time
-    
     for year in years:
         os.chdir(outdir)
         if ysplit:
-            Y=year
-
-        print("Running TRACK for year: " + year + "...")
-        ext=hemisphere+'_y'+year
+            Y = year
+
+        ext = '_'.join(hemispheres)+'_y'+year
+        # levels whose filtered field is cached need no vorticity
+        filtered = [None] * len(levels)
+        if cache is not None:
+            filtered = [cache.get(_field_keys(cache, pkey, year, level, 'numpy', trunc)[1],
+                                  os.path.join(folder, "T" + trunc + "filt_vor" + str(level) + "_" + ext + ".dat"))
+                        for level, folder in zip(levels, dirs)]
+        vorticity = [os.path.join(folder, "vor" + str(level) + "_" + ext + ".dat") if info is None else None
+                     for level, folder, info in zip(levels, dirs, filtered)]
+        missing = [i for i, vor in enumerate(vorticity) if vor is not None]
+
+        if missing:
+            if ysplit:
+                year_file = os.path.basename(infile_e)[:-3] + "_" + year + ".nc"
+                cdo.selyear(year, input=infile_e, output=year_file)
+            else:
+                year_file = infile_e
+            print("Computing vorticity at " + ", ".join(str(levels[i]) for i in missing) + "hPa for year: " + year)
+            with _stage("calc_vorticity", backend='numpy', year=year, levels=[levels[i] for i in missing]):
+                _calc_vorticity_numpy(year_file, [vorticity[i] for i in missing],
+                                      lev=[levels[i] * 100 for i in missing])
+            if ysplit and not keep_all_files:
+                os.remove(year_file)
 
-        # select year from data
-        if ysplit:
-            year_file = infile_e[:-3] + "_" + year + ".nc"
-            cdo.selyear(year, input=infile_e, output=year_file)
+        jobs = [
+            (folder, _track_year,
+             dict(year=year, Y=Y, infile_e=infile_e, nx=nx, ny=ny, hemispheres=hemispheres,
+                  ysplit=ysplit, sdate=sdate, trunc=trunc, keep_all_files=keep_all_files,
+                  cache=cache, pkey=pkey, backend='numpy',
+                  append_dir=os.path.join(folder, "output_track", "append") if append else None,
+                  splice_kwargs=splice_kwargs, level=level, vorticity=vor, filtered=info))
+            for level, folder, vor, info in zip(levels, dirs, vorticity, filtered)
+        ]
+        if workers is not None and workers > 1 and len(levels) > 1:
+            print("Running TRACK for levels " + ", ".join(str(level) for level in levels) +
+                  "hPa on " + str(workers) + " workers...")
+            # workers left over are shared out among the levels, for their chunks
+            level_workers = workers // len(levels) if workers // len(levels) > 1 else None
+            for job in jobs:
+                job[2]['workers'] = level_workers
+            run_isolated(jobs, workers=min(workers, len(levels)))
         else:
-            year_file=infile_e
+            for folder, func, kwargs in jobs:
+                os.chdir(folder)
+                with _stage("level", level=kwargs['level'], year=year):
+                    func(workers=workers, **kwargs)
+        os.chdir(outdir)
 
-        data = data_indat(year_file)
-        ntime = data.get_timesteps()
+def _field_keys(cache, pkey, year, level, backend, trunc):
+    """
+    Returns the cache keys of the vorticity and of the filtered vorticity of year (or 'all') of
+    the processed data with key pkey, at level (hPa).
+    """
 
-        # calculate vorticity from UV
-        vor850_name = "vor850_"+ext+".dat"
-        calc_vorticity(year_file, outfile=vor850_name, ext=ext)
-        if not keep_all_files:
-            os.remove('calcvor_onelev_'+ext+'.in') # keep_all_files?
-            os.remove('initial'+ext)
-            if ysplit:
-                os.remove(year_file)
+    vkey = cache.derive(pkey, 'vorticity', year=year, lev=level*100, backend=backend)
+    return vkey, cache.derive(vkey, 'specfilt', trunc=trunc)
 
-        fname = "T"+trunc+"filt_" + vor850_name
-        indat=os.path.join(os.path.dirname(__file__), "indat", "specfilt.in")
-        os.system(
-        'sed -e "s/NX/{nx}/;s/NY/{ny}/;s/TRUNC/{trunc}/" {indat} > spec_T{trunc}_nx{nx}_ny{ny}.in'
-        .format(nx=nx, ny=ny, indat=indat, trunc=trunc)
-        )
-        print('T'+trunc+' truncation and filtering out small wavenumbers to output file '+fname)
-        run_silent(track, input_file=vor850_name, ext=ext, namelist="spec_T"+trunc+"_nx" + nx + "_ny" + ny + ".in")
-        os.system("mv "+ "specfil_band001."+ext+"_band001 " + fname)
-        if not keep_all_files:
-            os.remove("spec_T"+trunc+"_nx" + nx + "_ny" + ny + ".in") # keep_all_files?
-            os.remove('initial'+ext)
-            os.remove("specfil_band000."+ext+"_band000")
-            os.remove(vor850_name)
+def _spectral_filter(vorticity, ext, namelist):
+    """
+    Truncates the vorticity field and filters out the large scales with TRACK, keeping total
+    wavenumbers from 6 up to the truncation. Only this band is computed, and it is written to
+    specfil_band000.{ext}_band000.
+    """
 
-        track_splice(fname, ext, ntime, trunc, keep_all_files=keep_all_files)
-        if not keep_all_files:
-            os.remove('interp_th'+ext) # keep_all_files?
-            os.remove('initial'+ext)
-            os.remove(fname)
-
-        if sdate is not None:
-            print('sdate passed - rewriting .nc files with Gregorian dates')
-            os.chdir('output_track/'+ext)
-            if len(Y)<4:
-                YY=str(2000+int(Y))
-                print('Year needs to be later than 1979 - shifting year to', YY)
-            
-            # convert initial date to string for util/count, in format YYYYMMDDHH
-            datetime=YY+sdate[:2]+sdate[2:4]+sdate[4:6]
-            datetime_exp=YY+'-'+sdate[:2]+'-'+sdate[2:4]+' '+sdate[4:6]
-            timedelta=6
+    run_silent(track, input_file=vorticity, ext=ext, namelist=namelist)
 
-            for file in ["tr_trs_pos", "tr_trs_neg", "ff_trs_pos", "ff_trs_neg"]:
-                print('Writing', file+'.nc')
-                tr2nc_vor(file, datetime, datetime_exp, timedelta)
-            os.remove('tr2nc.meta.elinor')
+def _append_filtered(append_dir, ext, fname, ntime, trunc, times, Y):
+    """
+    Appends the filtered field fname, of ntime frames from times[0] to times[1], to the filtered
+    field of ext kept in append_dir, or keeps it there if there is none yet. Returns the kept
+    file, its number of frames and the state to record once it is tracked.
+    """
+    import json
+    from .io import append_field
+
+    os.makedirs(append_dir, exist_ok=True)
+    kept = os.path.join(append_dir, os.path.basename(fname))
+    state_file = os.path.join(append_dir, ext + ".json")
+
+    if not os.path.exists(state_file):
+        shutil.move(fname, kept)
+        return kept, ntime, dict(trunc=trunc, ntime=ntime, start_year=Y,
+                                 first_time=times[0], last_time=times[1])
+
+    with open(state_file) as f:
+        state = json.load(f)
+    if state['trunc'] != trunc:
+        raise ValueError("Can not append T" + trunc + " data to the T" + state['trunc'] +
+                         " filtered field in " + append_dir)
+    if times[0] <= state['last_time']:
+        raise ValueError("The new data starts at " + times[0] + ", but the data tracked in " +
+                         append_dir + " already runs to " + state['last_time'])
+
+    print("Appending " + str(ntime) + " new frames to the " + str(state['ntime']) + " already tracked")
+    ntime = append_field(kept, fname, nframes=state['ntime'])
+    os.remove(fname)
+    state.update(ntime=ntime, last_time=times[1])
+    return kept, ntime, state
+
+def _write_state(append_dir, ext, state):
+    import json
+
+    state_file = os.path.join(append_dir, ext + ".json")
+    with open(state_file + ".tmp", "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(state_file + ".tmp", state_file)
+
+def _time_range(infile, year=None):
+    """
+    Returns the first and last time of infile, or of the given year of it, as ISO strings.
+    """
+    from netCDF4 import Dataset, num2date
 
-    return
+    with Dataset(infile) as nc:
+        time = nc.variables['time']
+        dates = num2date(time[:], time.units, getattr(time, 'calendar', 'standard'))
+    if year is not None:
+        dates = [d for d in dates if d.year == int(year)]
+    return dates[0].isoformat(), dates[-1].isoformat()
 
-def tr2nc_vor(input, datetime, datetime_exp, timedelta):
+def _timestep(infile):
     """
-    Function to rewrite .nc files with Gregorian date-time.
+    Returns the hours between the first two times of infile, or 6 if it has one time or
+    no time units.
     """
-    import os
-    import ctypes
+    from netCDF4 import Dataset, num2date
 
-    curr=os.getcwd()
-    pkgpath=os.path.dirname(__file__)
-    indat=os.path.join(pkgpath, "indat", "tr2nc.meta.elinor")
-    os.system(
-    'sed -e "s/START/{datetime}/;s/STEP/{step}/;s/DATETIME/{datetime_exp}/" {indat} > {curr}/tr2nc.meta.elinor'
-    .format(datetime=datetime, datetime_exp=datetime_exp, step=timedelta, indat=indat, curr=curr))
+    with Dataset(infile) as nc:
+        time = nc.variables['time']
+        if len(time) < 2 or not hasattr(time, 'units'):
+            return 6
+        dates = num2date(time[:2], time.units, getattr(time, 'calendar', 'standard'))
+    return (dates[1] - dates[0]).total_seconds() / 3600.
+
+def _track_splice_isolated(datin, ext, ntime, trunc, keep_all_files, workers, outdir, append=False,
+                           **splice_kwargs):
+    """
+    Runs track_splice() in the current (scratch) directory and then moves the finished
+    output_track/{ext} folder into outdir/output_track. In append mode the existing
+    output_track/{ext} folder is first moved into the scratch directory, to be extended there.
+    """
 
-    _LIB = os.path.join(os.path.dirname(__file__), "_lib", "libtrackutils.so")
+    if append:
+        _restore_output(os.getcwd(), outdir, ext)
+    track_splice(datin, ext, ntime, trunc, keep_all_files=keep_all_files, workers=workers,
+                 append=append, **splice_kwargs)
+    _move_output(os.getcwd(), outdir, ext)
 
-    if not os.path.exists(_LIB):
-        raise FileNotFoundError(f"libtrackutils.so not found at {_LIB}")
+def _restore_output(scratch, outdir, ext):
+    """
+    Moves outdir/output_track/{ext}, if there is one, to scratch/output_track/{ext}.
+    """
 
-    lib = ctypes.CDLL(_LIB)
+    src = os.path.join(outdir, "output_track", ext)
+    if os.path.exists(src):
+        os.makedirs(os.path.join(scratch, "output_track"), exist_ok=True)
+        os.rename(src, os.path.join(scratch, "output_track", ext))
 
-    # Define function signature
-    lib.tr2nc_main.argtypes = [
-        ctypes.c_int,
-        ctypes.POINTER(ctypes.c_char_p)
-    ]
-    lib.tr2nc_main.restype = ctypes.c_int
+def _move_output(scratch, outdir, ext):
+    """
+    Moves scratch/output_track/{ext} to outdir/output_track/{ext}, replacing any older copy.
+    """
+
+    src = os.path.join(scratch, "output_track", ext)
+    dst = os.path.join(outdir, "output_track", ext)
+
+    # os.rename is atomic on the same filesystem, but can not replace a non-empty folder
+    if os.path.exists(dst):
+        old = os.path.join(scratch, "output_track", ext + "_old")
+        os.rename(dst, old)
+        os.rename(src, dst)
+        shutil.rmtree(old)
+    else:
+        os.rename(src, dst)
+
+def _track_year_isolated(year, Y, infile_e, nx, ny, hemispheres, ysplit, sdate, trunc,
+                         keep_all_files, outdir, cache=None, pkey=None, backend='track',
+                         append_dir=None, splice_kwargs=None, stream=False):
+    """
+    Runs _track_year() in the current (scratch) directory and then moves the finished
+    output_track/{ext} folders into outdir/output_track, replacing any older copy.
+    """
+
+    scratch = os.getcwd()
+    if append_dir is not None:
+        for h in hemispheres:
+            _restore_output(scratch, outdir, h + '_y' + year)
+    exts = _track_year(year, Y, infile_e, nx, ny, hemispheres, ysplit, sdate, trunc,
+                       keep_all_files, cache=cache, pkey=pkey, backend=backend,
+                       append_dir=append_dir, splice_kwargs=splice_kwargs, stream=stream)
+    for ext in exts:
+        _move_output(scratch, outdir, ext)
+
+def _start_datetime(Y, sdate):
+    # initial date in format YYYYMMDDHH, from the year Y and sdate in format MMDDHH
+    YY=Y
+    if len(Y)<4:
+        YY=str(2000+int(Y))
+        print('Year needs to be later than 1979 - shifting year to', YY)
+    return YY+sdate[:2]+sdate[2:4]+sdate[4:6]
+
+_TRACKUTILS = None
+
+def _load_trackutils():
+    # loaded once per process, and inherited by the forked conversion workers
+    import ctypes
+    global _TRACKUTILS
 
+    if _TRACKUTILS is None:
+        _LIB = os.path.join(os.path.dirname(__file__), "_lib", "libtrackutils.so")
+        if not os.path.exists(_LIB):
+            raise FileNotFoundError(f"libtrackutils.so not found at {_LIB}")
+
+        lib = ctypes.CDLL(_LIB)
+        lib.tr2nc_main.argtypes = [
+            ctypes.c_int,
+            ctypes.POINTER(ctypes.c_char_p)
+        ]
+        lib.tr2nc_main.restype = ctypes.c_int
+        _TRACKUTILS = lib
+
+    return _TRACKUTILS
+
+def _render_tr2nc_meta(start, timedelta, meta):
+    """
+    Writes the tr2nc metadata file meta for tracks starting at start (YYYYMMDDHH) with
+    timedelta hours between frames.
+    """
+    datetime_exp=start[:4]+'-'+start[4:6]+'-'+start[6:8]+' '+start[8:10]
+    indat=os.path.join(os.path.dirname(__file__), "indat", "tr2nc.meta.elinor")
+    with open(indat) as f:
+        text = f.read()
+    text = text.replace("START", start).replace("STEP", str(timedelta)).replace("DATETIME", datetime_exp)
+    with open(meta, "w") as f:
+        f.write(text)
+
+def _tr2nc_file(input, meta):
+    import ctypes
+
+    lib = _load_trackutils()
+    # file names are limited to MAXCHR characters, so convert from the file's own folder
+    curr = os.getcwd()
+    os.chdir(os.path.dirname(input))
     args = [
         b"track",
-        input.encode("utf-8"),
-        b"s", (curr+'/tr2nc.meta.elinor').encode("utf-8")
+        os.path.basename(input).encode("utf-8"),
+        b"s", meta.encode("utf-8")
     ]
     argc = len(args)
     argv = (ctypes.c_char_p * argc)(*args)
 
-    lib.tr2nc_main(argc, argv)
+    try:
+        with _stage("tr2nc", file=input):
+            lib.tr2nc_main(argc, argv)
+    finally:
+        os.chdir(curr)
 
-    return
+def tr2nc_batch(files, start, timedelta=6, workers=None):
+    """
+    Converts TRACK track files to netCDF with Gregorian date-time, writing {file}.nc next
+    to every file.
+
+    The metadata is rendered once for the whole batch. With workers > 1 the files are converted
+    concurrently, each in its own forked process with libtrackutils.so already loaded.
+
+    Parameters
+    ----------
+    files : list
+        Track files to convert, e.g. output_track/NH_y1980/ff_trs_pos.
+    start : str
+        Date-time of the first frame, in YYYYMMDDHH format.
+    timedelta : int
+        Hours between frames.
+    workers : int or None
+        Number of files converted at the same time. None or 1 converts them one by one
+        in this process.
+    """
+    import tempfile
+
+    files = [os.path.abspath(f) for f in files]
+    _load_trackutils()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        meta = os.path.join(tmp, "tr2nc.meta.elinor")
+        _render_tr2nc_meta(start, timedelta, meta)
+
+        if workers is not None and workers > 1 and len(files) > 1:
+            jobs = [(os.path.dirname(f), _tr2nc_file, dict(input=f, meta=meta)) for f in files]
+            run_isolated(jobs, workers=workers)
+        else:
+            for f in files:
+                print('Writing', os.path.basename(f)+'.nc')
+                _tr2nc_file(f, meta)
+
+def tr2nc_output(outdirectory=None, sdate='010100', start_year=None, timedelta=6, workers=None):
+    """
+    Converts all track files of a track_uv() output directory to netCDF with Gregorian
+    date-time, after the fact. The start of every output_track/{hemisphere}_y{year} folder
+    is worked out from its year and sdate, as track_uv() does when sdate is passed.
+
+    Parameters
+    ----------
+    outdirectory : str
+        Output directory of track_uv(), containing output_track. Defaults to the current directory.
+    sdate : str
+        First time step in MMDDHH format.
+    start_year : str
+        Year of the first time step for folders not split by year ({hemisphere}_yall).
+    timedelta : int
+        Hours between frames.
+    workers : int or None
+        Number of files converted at the same time.
+    """
+    import tempfile
+
+    if outdirectory is None:
+        outdirectory = os.getcwd()
+    track_dir = os.path.join(os.path.abspath(os.path.expanduser(outdirectory)), 'output_track')
+    _load_trackutils()
+
+    jobs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in sorted(os.listdir(track_dir)):
+            folder = os.path.join(track_dir, name)
+            if '_y' not in name or not os.path.isdir(folder):
+                continue
+            Y = name.split('_y', 1)[1]
+            if Y == 'all':
+                if start_year is None:
+                    raise ValueError("start_year is needed to date the tracks in " + name)
+                Y = str(start_year)
+
+            # one metadata file per start date
+            start = _start_datetime(Y, sdate)
+            meta = os.path.join(tmp, "tr2nc.meta." + start)
+            if not os.path.exists(meta):
+                _render_tr2nc_meta(start, timedelta, meta)
+            for file in ["tr_trs_pos", "tr_trs_neg", "ff_trs_pos", "ff_trs_neg"]:
+                if os.path.exists(os.path.join(folder, file)):
+                    jobs.append((folder, _tr2nc_file, dict(input=os.path.join(folder, file), meta=meta)))
+
+        print("Converting " + str(len(jobs)) + " track files to netCDF...")
+        with tqdm(total=len(jobs), desc="tr2nc") as pbar:
+            if workers is not None and workers > 1:
+                run_isolated(jobs, workers=workers, callback=lambda i: pbar.update(1))
+            else:
+                for folder, func, kwargs in jobs:
+                    func(**kwargs)
+                    pbar.update(1)
+
+def tr2nc_vor(input, datetime, datetime_exp, timedelta):
+    """
+    Function to rewrite .nc files with Gregorian date-time.
+    datetime_exp is worked out from datetime, and kept for compatibility.
+    """
+
+    tr2nc_batch([input], datetime, timedelta=timedelta)
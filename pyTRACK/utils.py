@@ -171,4 +171,388 @@ def run_silent(func, *args, **kwargs):
     finally:
         os.dup2(old_stdout, 1)
         os.dup2(old_stderr, 2)
-        os.close(devnull)
\ No newline at end of file
+        os.close(devnull)
+
+def _run_in_workdir(workdir, func, kwargs):
+    # entry point of the forked process - TRACK writes to the cwd, so move there first
+    from .trace import _stage, _flush
+
+    os.chdir(workdir)
+    try:
+        with _stage("worker", job=getattr(func, '__name__', str(func)), workdir=workdir):
+            func(**kwargs)
+    finally:
+        _flush()
+
+
+def run_isolated(jobs, workers=1, callback=None, stop_on_error=False):
+    """
+    Runs jobs concurrently, each in its own freshly forked process.
+
+    libtrack keeps global state and calls exit() on errors, so TRACK calls
+    cannot share a process. Every job gets a new process whose working directory
+    is set to the job's own scratch directory before the job function is called.
+
+    Parameters
+    ----------
+    jobs : list
+        List of (workdir, func, kwargs) tuples. func(**kwargs) is called inside workdir.
+    workers : int
+        Maximum number of jobs running at the same time.
+    callback : callable or None
+        Called with the index of each job as it finishes, e.g. to update a progress bar.
+    stop_on_error : bool
+        Terminate the jobs still running as soon as one fails, instead of letting them finish.
+        Needed for jobs that wait on each other, such as the two ends of a pipe.
+    """
+    import sys
+    import multiprocessing
+    from multiprocessing.connection import wait
+
+    ctx = multiprocessing.get_context("fork")
+    workers = max(1, int(workers))
+
+    pending = list(enumerate(jobs))
+    running = {}
+    failed = []
+
+    try:
+        while pending or running:
+            while pending and len(running) < workers and not failed:
+                i, (workdir, func, kwargs) = pending.pop(0)
+                os.makedirs(workdir, exist_ok=True)
+                # flush so that buffered output is not duplicated in the child
+                sys.stdout.flush()
+                sys.stderr.flush()
+                p = ctx.Process(target=_run_in_workdir, args=(str(workdir), func, kwargs))
+                p.start()
+                running[i] = p
+
+            if not running:
+                break
+
+            finished = wait([p.sentinel for p in running.values()])
+            for i, p in list(running.items()):
+                if p.sentinel in finished:
+                    p.join()
+                    del running[i]
+                    if p.exitcode != 0:
+                        failed.append((i, jobs[i][0], p.exitcode))
+                    elif callback is not None:
+                        callback(i)
+            if failed and stop_on_error:
+                break
+    finally:
+        for p in running.values():
+            p.terminate()
+            p.join()
+
+    if failed:
+        i, workdir, code = failed[0]
+        raise RuntimeError(f"TRACK job {i} in {workdir} failed with exit code {code}")
+
+
+def is_gaussian(lat, tol=1e-3):
+    """
+    Checks whether the latitudes lat (in degrees, any order) are those of a Gaussian grid.
+    """
+    import numpy as np
+
+    lat = np.sort(np.asarray(lat, dtype=np.float64))
+    gauss = np.sort(np.rad2deg(np.arcsin(np.polynomial.legendre.leggauss(len(lat))[0])))
+    return bool(np.allclose(lat, gauss, atol=tol))
+
+
+def _dates(time):
+    # time steps of a time variable as ISO dates, or as plain values if it has no units
+    from netCDF4 import num2date
+
+    if "units" not in time.ncattrs():
+        return [float(v) for v in time[:]]
+    return [d.isoformat() for d in num2date(time[:], time.units, getattr(time, "calendar", "standard"))]
+
+
+def _time_groups(files):
+    """
+    Opens the files of a multi-file input and groups them by time steps.
+
+    Files with the same time steps (e.g. a u and a v file) form one group, and their variables
+    are combined. Returns the groups in time order, each as a list of open Datasets and the time
+    values of the group in the units and calendar of the earliest file, and the list of all
+    open Datasets.
+    """
+    from netCDF4 import num2date, date2num
+
+    opened = []
+    try:
+        groups = {}
+        for f in files:
+            nc = Dataset(f, "r")
+            opened.append(nc)
+            key = tuple(_dates(nc.variables["time"])) if "time" in nc.variables else ()
+            groups.setdefault(key, []).append(nc)
+
+        keys = sorted(groups, key=lambda k: k[:1])
+        for k1, k2 in zip(keys[:-1], keys[1:]):
+            if not k1 or not k2 or k1[-1] >= k2[0]:
+                raise ValueError("Input files overlap in time, at " + str(k2[0] if k2 else k1[0]))
+
+        ref = groups[keys[0]][0].variables.get("time")
+        out = []
+        for key in keys:
+            nc = groups[key][0]
+            time = nc.variables.get("time")
+            if time is None:
+                values = []
+            elif "units" not in ref.ncattrs() or (time.units, getattr(time, "calendar", None)) == \
+                    (ref.units, getattr(ref, "calendar", None)):
+                values = time[:]
+            else:
+                # converted to the units of the earliest file
+                calendar = getattr(ref, "calendar", "standard")
+                values = date2num(num2date(time[:], time.units, getattr(time, "calendar", "standard")),
+                                  ref.units, calendar)
+            out.append((groups[key], values))
+    except Exception:
+        for nc in opened:
+            nc.close()
+        raise
+    return out, opened
+
+
+def preprocess(infile, outfile, block_size=None):
+    """
+    Prepares a netCDF file for TRACK in a single streaming pass.
+
+    Drops the bounds variables (time_bnds, lat_bnds, ...), sets missing values to 0 and
+    writes the data without _FillValue or missing_value attributes. Variables with a time
+    dimension are copied a block of time steps at a time, so memory use does not grow with the
+    length of the file. Equivalent to the ncks -x, cdo setmisstoc,0 and ncatted chain.
+
+    A list of files is read as one time series, without merging them first. Files holding
+    the same time steps, such as a u and a v file, have their variables combined, and these
+    groups of files are joined in time order, as cdo merge and mergetime would.
+
+    Parameters
+    ----------
+    infile : string or list
+        Path to the input .nc file, or a list of paths
+    outfile : string
+        Path of the processed file
+    block_size : int or None
+        Number of time steps copied at once. Defaults to as many as fit in about 256MB.
+    """
+    import numpy as np
+
+    drop_attrs = ("_FillValue", "missing_value", "scale_factor", "add_offset", "bounds")
+
+    files = [infile] if isinstance(infile, (str, os.PathLike)) else list(infile)
+    groups, opened = _time_groups(files)
+    try:
+        src = groups[0][0][0]
+        bounds = set()
+        for nc in opened:
+            bounds |= {name for name in nc.variables
+                       if name.endswith(("_bnds", "_bounds")) or name in ("bnds", "bounds")}
+            for var in nc.variables.values():
+                if "bounds" in var.ncattrs():
+                    bounds.add(var.getncattr("bounds"))
+
+        # where every variable is read from in each group - the first file that has it
+        sources = []
+        for members, values in groups:
+            found = {}
+            for nc in members:
+                for name in nc.variables:
+                    if name in bounds:
+                        continue
+                    if name in found and nc.variables[name].ndim > 1:
+                        raise ValueError("More than one input file holds " + name + " at the same times")
+                    found.setdefault(name, nc)
+            sources.append(found)
+        keep = list(sources[0])
+        for found in sources[1:]:
+            if set(found) != set(keep):
+                raise ValueError("Input files do not all hold the same variables: " +
+                                 ", ".join(sorted(set(found) ^ set(keep))))
+        for name in ("lat", "lon"):
+            for found in sources:
+                if name in keep and not np.array_equal(found[name].variables[name][:],
+                                                       src.variables[name][:]):
+                    raise ValueError("Input files are not all on the same grid")
+
+        template = sources[0]
+        dims = {}
+        for name in keep:
+            for dim in template[name].variables[name].dimensions:
+                dims[dim] = template[name].dimensions[dim]
+
+        fmt = src.data_model if src.data_model != "NETCDF3_64BIT_DATA" else "NETCDF4"
+        with Dataset(outfile, "w", format=fmt) as dst:
+            dst.setncatts({att: src.getncattr(att) for att in src.ncattrs()})
+            for name, dim in dims.items():
+                # joined files need an unlimited time dimension
+                unlimited = dim.isunlimited() or (name == "time" and len(groups) > 1)
+                dst.createDimension(name, None if unlimited else len(dim))
+
+            t_off = 0
+            for found, (members, values) in zip(sources, groups):
+                for name in keep:
+                    var = found[name].variables[name]
+                    if name not in dst.variables:
+                        # packed data is unpacked by netCDF4, so is written as floats
+                        dtype = var.dtype
+                        if "scale_factor" in var.ncattrs() or "add_offset" in var.ncattrs():
+                            dtype = np.float32
+                        out = dst.createVariable(name, dtype, var.dimensions)
+                        out.setncatts({att: var.getncattr(att) for att in var.ncattrs()
+                                       if att not in drop_attrs})
+                    out = dst.variables[name]
+
+                    if var.ndim == 0:
+                        out.assignValue(var.getValue())
+                        continue
+
+                    if "time" not in var.dimensions:
+                        if t_off == 0:
+                            data = var[:]
+                            out[:] = np.ma.filled(data, 0) if np.ma.isMaskedArray(data) else data
+                        continue
+
+                    if name == "time":
+                        out[t_off:t_off + len(values)] = values
+                        continue
+
+                    axis = var.dimensions.index("time")
+                    nt = var.shape[axis]
+                    if var.ndim == 1:
+                        data = var[:]
+                        sel = [slice(t_off, t_off + nt)]
+                        out[tuple(sel)] = np.ma.filled(data, 0) if np.ma.isMaskedArray(data) else data
+                        continue
+
+                    frame = int(np.prod(var.shape)) // max(nt, 1) * np.dtype(out.dtype).itemsize
+                    block = block_size or max(1, 2**28 // max(frame, 1))
+                    for t0 in range(0, nt, block):
+                        sel = [slice(None)] * var.ndim
+                        sel[axis] = slice(t0, min(t0 + block, nt))
+                        data = np.ma.filled(var[tuple(sel)], 0)
+                        if np.issubdtype(data.dtype, np.floating):
+                            data = np.nan_to_num(data, nan=0.0, posinf=0.0, neginf=0.0)
+                        sel[axis] = slice(t_off + t0, t_off + min(t0 + block, nt))
+                        out[tuple(sel)] = data
+                t_off += len(values)
+    finally:
+        for nc in opened:
+            nc.close()
+
+    return outfile
+
+
+class MemoryFile(object):
+    """
+    Exposes an in-memory field to TRACK as a netCDF file that is never written to disk.
+
+    The data is written in classic netCDF format to an anonymous memory-backed file created
+    with memfd_create, and is available to TRACK, and to processes forked from this one after
+    the file was made, through the path /proc/self/fd/N. Other programs, such as cdo, and the
+    workers of a TrackSession, which are forked before, can not open that path. These read a
+    file in /dev/shm instead, see the shared parameter, which is also used where memfd is not
+    available. The memory is released by close(), or when used as a context manager.
+
+    Usage
+    -----
+    with MemoryFile(dataset) as f:
+        track(f.path, namelist='namelist.in')
+    """
+
+    def __init__(self, data, lon=None, lat=None, time=None, name='field', shared=False):
+        """
+        Parameters
+        ----------
+        data : xarray.Dataset, xarray.DataArray or numpy.ndarray
+            Data to expose. A numpy array should have dimensions (time, lat, lon) and needs
+            the lon and lat coordinates to be passed.
+        lon, lat, time : array-like or None
+            Coordinates for a numpy array input. time defaults to 0, 1, 2, ...
+        name : str
+            Variable name for a numpy array or an unnamed DataArray.
+        shared : bool
+            Write the file to /dev/shm instead, so that it can be opened by processes that are
+            not forked from this one, such as cdo or the workers of a TrackSession.
+        """
+        import numpy as np
+        import xarray as xr
+
+        if isinstance(data, np.ndarray):
+            if lon is None or lat is None:
+                raise ValueError("lon and lat are needed to pass a numpy array to TRACK")
+            if time is None:
+                time = np.arange(data.shape[0], dtype=np.float64)
+            data = xr.DataArray(data, dims=("time", "lat", "lon"),
+                                coords={"time": time, "lat": lat, "lon": lon}, name=name)
+        if isinstance(data, xr.DataArray):
+            data = data.to_dataset(name=data.name or name)
+
+        self._open(name, shared)
+
+        unlimited = ["time"] if "time" in data.dims else None
+        # HDF5 can not open /proc/self/fd paths, classic netCDF can
+        data.to_netcdf(self.path, format="NETCDF3_64BIT", unlimited_dims=unlimited)
+
+    def _open(self, name, shared):
+        # the memfd, or the /dev/shm file where memfd is not available or shared is set
+        import tempfile
+
+        self._memfd = not shared
+        if self._memfd:
+            try:
+                self._fd = os.memfd_create("pyTRACK_" + name, 0)
+                self.path = "/proc/self/fd/" + str(self._fd)
+                return
+            except (AttributeError, OSError):
+                self._memfd = False
+        shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        self._fd, self.path = tempfile.mkstemp(suffix=".nc", dir=shm)
+
+    @classmethod
+    def _copy(cls, path):
+        # a shared MemoryFile holding the bytes of the file at path
+        import shutil
+
+        self = cls.__new__(cls)
+        self._open("copy", True)
+        shutil.copyfile(path, self.path)
+        return self
+
+    def close(self):
+        if self._fd is None:
+            return
+        os.close(self._fd)
+        if not self._memfd:
+            os.remove(self.path)
+        self._fd = None
+
+    def __fspath__(self):
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _shared_path(input_file, stack):
+    """
+    Returns a path to input_file that processes which are not forked from this one, such as cdo
+    or the workers of a TrackSession, can open. The /proc/self/fd/N path of a MemoryFile only
+    names the file in this process and its children, so it is copied to /dev/shm, and fields
+    that are in memory are written there. The copies are closed by the ExitStack stack.
+    """
+    if not isinstance(input_file, (str, os.PathLike)):
+        return stack.enter_context(MemoryFile(input_file, shared=True)).path
+    path = os.fspath(input_file)
+    if path.startswith(("/proc/self/fd/", "/dev/fd/")):
+        return stack.enter_context(MemoryFile._copy(path)).path
+    return path
@@ -81,6 +81,20 @@ struct dpt {
 };
 
 
+/* bounding cap of a run of consecutive track points, for the track density */
+
+struct trcap {
+     struct fet_pt_tr *ip;   /* first track point of the run */
+     int np;                 /* number of points in the run  */
+     double cvec[3];         /* centre of the cap            */
+     double cosr;            /* cosine of the cap radius     */
+     double sinr;            /* sine of the cap radius       */
+};
+
+#define  NCAP     8              /* number of track points per bounding cap */
+#define  TOLCAP   1.0e-6         /* tolerance for the bounding cap test */
+
+
 #define   DBAND     20.0000000   /* smoothing parameter at which evaluation 
                                     of exponential of fisher density changes. */
 
@@ -50,6 +50,8 @@ void select_region(float * , float * , float * , float * );
 struct pt_stat *assign_sample_pt(struct tot_stat * , float , float , float , float );
 struct dpt *extract_data(struct fet_pt_tr *at, struct dpt *, int * , float , float , float , float , int , float * , int );
 double arc(struct fet_pt_tr * , struct dpt * );
+struct trcap *track_caps(struct tot_tr * , int , float * , float , int * , int * );
+struct fet_pt_tr *nearest_track_point(struct tot_tr * , struct trcap * , int , struct dpt * , double * );
 float *weights(float * , int , float , int );
 void available_stats(void);
 double area_sp_triangle(SQT * , VEC * , int );
@@ -93,6 +95,7 @@ void statistic(struct tot_tr *all_tr, int trackn)
 
    int i, j, k, ip=0, ifmp=0;
    int dcount=0;
+   int *capoff=NULL, maxcap=0;
    int trphn=0;                   /* total number of phase speed tracks */
    int tot_fet=0;
    int nb, nbx=0, nby=0;
@@ -137,7 +140,6 @@ void statistic(struct tot_tr *all_tr, int trackn)
    float ta=0.0, bl=0.0, ypos=0.0;
    float *ltm=NULL;
    float ts;
-   float arcm=0, arcl;
    float xaa=0., yaa=0.;
    float xat1=0., yat1=0., xat2=0., yat2=0.;
    float xa1=0., xa2=0., ya1=0., ya2=0.;
@@ -149,6 +151,7 @@ void statistic(struct tot_tr *all_tr, int trackn)
 
    double **den=NULL;
    double sscale=0.0;
+   double *ub=NULL;
 
    float *wdtr=NULL, *wdgn=NULL, *wdly=NULL, *wdph=NULL, *wdtd=NULL;
    float *wdgr=NULL, *wdan=NULL, *wdar=NULL, *wdtn=NULL;
@@ -165,6 +168,7 @@ void statistic(struct tot_tr *all_tr, int trackn)
 
    struct dpt *dtr=NULL, *dgn=NULL, *dly=NULL, *dph=NULL, *dtd=NULL;
    struct dpt *dgr=NULL, *dan=NULL, *dtn=NULL, *dar=NULL;
+   struct trcap *caps=NULL;
 
    struct dpt *stat=NULL;       /* grid data converted to Cartesian (X, Y, Z) coordinates */
    struct dpt *stt=NULL;
@@ -1970,6 +1974,16 @@ printf("\n");*/
            mem_er((dtd == NULL) ? 0 : 1, trackn * sizeof(float));
         }
 
+/* bounding caps of the tracks for the search of the closest track points */
+
+        capoff = (int * )calloc(trackn + 1, sizeof(int));
+        mem_er((capoff == NULL) ? 0 : 1, (trackn + 1) * sizeof(int));
+
+        caps = track_caps(all_tr, trackn, ltm, TTSTEP, capoff, &maxcap);
+
+        ub = (double * )calloc((maxcap > 0) ? maxcap : 1, sizeof(double));
+        mem_er((ub == NULL) ? 0 : 1, maxcap * sizeof(double));
+
         for(i=0; i < trsav->ptnum; i++){
 
           stt = stat + i;
@@ -1981,23 +1995,8 @@ printf("\n");*/
 
               if(altr->trpt != NULL && *(ltm + j) > TTSTEP){
 
-                 for(k=0; k < altr->num; k++){
-
-                     at = altr->trpt + k;
-
-                     arcl = (float) arc(at, stt);
-
-                     if(k == 0) {
-                        arcm = arcl;
-                        memcpy(&att, at, mfpts);
-                     }
-
-                     else if(arcl > arcm) {
-                        arcm = arcl;
-                        memcpy(&att, at, mfpts);
-                     }
-
-                 }
+                 at = nearest_track_point(altr, caps + *(capoff + j), *(capoff + j + 1) - *(capoff + j), stt, ub);
+                 memcpy(&att, at, mfpts);
 
                  att.zf = *(ltm + j);                 
 
@@ -2052,6 +2051,9 @@ printf("\n");*/
 
         free(dtd);
         free(wdtd);
+        free(caps);
+        free(capoff);
+        free(ub);
 
         trd = 0;
 
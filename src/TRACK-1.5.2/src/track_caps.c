@@ -0,0 +1,178 @@
+#include <Stdio.h>
+#include <stdlib.h>
+#include <Math.h>
+#include "statistic.h"
+#include "splice.h"
+#include "mem_er.h"
+
+/* functions to find the point of every track closest to a sample point for the
+   track density, without computing the arc to every point of the track.
+
+   The points of a track are split into runs of NCAP consecutive points, each
+   with a bounding spherical cap. For a sample point the caps give an upper
+   bound on the arc cosine to the points of the run, so that only the runs
+   which can hold a point at least as close as the closest found so far are
+   searched. The point returned is the same as for a full search, including
+   the first point being kept when points are equally close.                  */
+
+double arc(struct fet_pt_tr * , struct dpt * );
+
+struct trcap *track_caps(struct tot_tr *all_tr, int trackn, float *ltm, float ltol, int *capoff, int *maxcap)
+
+{
+
+    int i, j, k, n;
+    int ncap=0;
+
+    double cx, cy, cz, norm, dd;
+
+    struct tot_tr *altr=NULL;
+    struct fet_pt_tr *at=NULL;
+    struct trcap *caps=NULL, *cp=NULL;
+
+    *maxcap = 0;
+    *capoff = 0;
+
+    for(i=0; i < trackn; i++){
+
+        altr = all_tr + i;
+
+        n = (altr->trpt != NULL && *(ltm + i) > ltol) ? (altr->num + NCAP - 1) / NCAP : 0;
+        *(capoff + i + 1) = *(capoff + i) + n;
+        if(n > *maxcap) *maxcap = n;
+
+    }
+
+    ncap = *(capoff + trackn);
+
+    caps = (struct trcap * )calloc((ncap > 0) ? ncap : 1, sizeof(struct trcap));
+    mem_er((caps == NULL) ? 0 : 1, ncap * sizeof(struct trcap));
+
+    for(i=0; i < trackn; i++){
+
+        altr = all_tr + i;
+
+        for(j=*(capoff + i); j < *(capoff + i + 1); j++){
+
+            cp = caps + j;
+            cp->ip = altr->trpt + (j - *(capoff + i)) * NCAP;
+            cp->np = altr->num - (j - *(capoff + i)) * NCAP;
+            if(cp->np > NCAP) cp->np = NCAP;
+
+            cx = cy = cz = 0.0;
+
+            for(k=0; k < cp->np; k++){
+                at = cp->ip + k;
+                cx += at->pp[0];
+                cy += at->pp[1];
+                cz += at->pp[2];
+            }
+
+            norm = sqrt(cx * cx + cy * cy + cz * cz);
+
+/* points spread over the sphere, the cap covers the whole sphere */
+
+            if(norm < TOLCAP){
+               cp->cvec[0] = cp->cvec[1] = cp->cvec[2] = 0.0;
+               cp->cosr = -1.0;
+               cp->sinr = 0.0;
+               continue;
+            }
+
+            cp->cvec[0] = cx / norm;
+            cp->cvec[1] = cy / norm;
+            cp->cvec[2] = cz / norm;
+
+            cp->cosr = 1.0;
+
+            for(k=0; k < cp->np; k++){
+                at = cp->ip + k;
+                dd = cp->cvec[0] * at->pp[0] + cp->cvec[1] * at->pp[1] + cp->cvec[2] * at->pp[2];
+                if(dd < cp->cosr) cp->cosr = dd;
+            }
+
+            cp->cosr -= TOLCAP;
+            if(cp->cosr < -1.0) cp->cosr = -1.0;
+
+            dd = 1.0 - cp->cosr * cp->cosr;
+            cp->sinr = (dd > 0.0) ? sqrt(dd) : 0.0;
+
+        }
+
+    }
+
+    return caps;
+
+}
+
+
+struct fet_pt_tr *nearest_track_point(struct tot_tr *altr, struct trcap *caps, int ncap, struct dpt *stt, double *ub)
+
+{
+
+    int i, k, ic=0;
+    int km=-1, kp;
+
+    float arcm=0.0, arcl;
+
+    double ca, sa;
+
+    struct trcap *cp=NULL;
+    struct fet_pt_tr *at=NULL, *atm=NULL;
+
+    if(ncap <= 0) return NULL;
+
+/* upper bound of the arc cosine between the sample point and the points of every cap */
+
+    for(i=0; i < ncap; i++){
+
+        cp = caps + i;
+
+        ca = cp->cvec[0] * stt->xdt + cp->cvec[1] * stt->ydt + cp->cvec[2] * stt->zdt;
+
+        if(cp->cosr <= -1.0 || ca >= cp->cosr) *(ub + i) = 1.0;
+
+        else {
+
+           sa = 1.0 - ca * ca;
+           sa = (sa > 0.0) ? sqrt(sa) : 0.0;
+           *(ub + i) = ca * cp->cosr + sa * cp->sinr;
+
+        }
+
+        if(*(ub + i) > *(ub + ic)) ic = i;
+
+    }
+
+/* search the most promising cap first, then the caps that can hold a point as close */
+
+    for(i=-1; i < ncap; i++){
+
+        if(i == ic) continue;
+
+        cp = caps + ((i < 0) ? ic : i);
+
+        if(km >= 0 && *(ub + (cp - caps)) + TOLCAP < arcm) continue;
+
+        for(k=0; k < cp->np; k++){
+
+            at = cp->ip + k;
+            kp = at - altr->trpt;
+
+            arcl = (float) arc(at, stt);
+
+            if(km < 0 || arcl > arcm || (arcl == arcm && kp < km)){
+
+               arcm = arcl;
+               km = kp;
+               atm = at;
+
+            }
+
+        }
+
+    }
+
+    return atm;
+
+}
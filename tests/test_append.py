@@ -0,0 +1,65 @@
+import numpy as np
+
+from pyTRACK.io import FieldWriter, append_field
+
+
+def _field(path, frames, lon, lat):
+    with FieldWriter(path, lon, lat) as w:
+        w.write(frames)
+
+
+def test_append_field(tmp_path):
+    lon, lat = np.arange(0, 360, 30.), np.linspace(-60, 60, 5)
+    frames = np.random.default_rng(0).normal(size=(7, len(lat), len(lon))).astype(np.float32)
+    _field(tmp_path / "all.dat", frames, lon, lat)
+    _field(tmp_path / "old.dat", frames[:4], lon, lat)
+    _field(tmp_path / "new.dat", frames[4:], lon, lat)
+
+    assert append_field(tmp_path / "old.dat", tmp_path / "new.dat") == 7
+    assert (tmp_path / "old.dat").read_bytes() == (tmp_path / "all.dat").read_bytes()
+
+    # appending again after the first 4 frames drops the frames of the earlier append
+    assert append_field(tmp_path / "old.dat", tmp_path / "new.dat", nframes=4) == 7
+    assert (tmp_path / "old.dat").read_bytes() == (tmp_path / "all.dat").read_bytes()
+
+
+def test_track_splice_append(tmp_path, monkeypatch):
+    import sys
+    import json
+
+    # pyTRACK.track is shadowed by the function of the same name
+    module = sys.modules["pyTRACK.track"]
+    calls = []
+
+    def track_chunk(datin, ext, S, F, initial, first_run, sign, out_dir, progress=None):
+        # stands in for the TRACK run of a chunk, leaving the files the splice reads
+        calls.append((S, F, sign))
+        for name in ("objout.new", "tdump"):
+            (out_dir / name).write_text(str((S, F)))
+        (tmp_path / ("initial" + ext)).write_text("")
+
+    def run_splice(splice_text, out_prefix, datin, ext, nchunks, dir3):
+        (dir3 / ("tr_trs_" + out_prefix)).write_text(splice_text)
+
+    monkeypatch.setattr(module, "_track_chunk", track_chunk)
+    monkeypatch.setattr(module, "_run_splice", run_splice)
+    monkeypatch.chdir(tmp_path)
+
+    module.track_splice("datin.dat", "NH_yall", 130, "42", append=True, progress=False)
+    first = module.plan_chunks(130).chunks
+    assert sorted(set(c[:2] for c in calls)) == [(S, F) for N, S, F in first]
+
+    # the new frames only need the last chunk of the first run again, and the new chunks
+    calls.clear()
+    module.track_splice("datin.dat", "NH_yall", 300, "42", append=True, progress=False)
+    chunks = module.plan_chunks(300).chunks
+    assert chunks[:len(first) - 1] == first[:-1]
+    assert sorted(set(c[:2] for c in calls)) == [(S, F) for N, S, F in chunks[len(first) - 1:]]
+    assert sorted(c[2] for c in calls).count("max") == len(chunks) - len(first) + 1
+
+    manifest = json.loads((tmp_path / "output_track" / "NH_yall" / "splice.json").read_text())
+    assert manifest["ntime"] == 300
+    assert [tuple(c) for c in manifest["chunks"]] == chunks
+    # all chunks are spliced again, reused or not
+    splice = (tmp_path / "output_track" / "NH_yall" / "tr_trs_pos").read_text()
+    assert splice.count("objout.new") == len(chunks)
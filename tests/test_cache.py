@@ -0,0 +1,56 @@
+import os
+import time
+
+from pyTRACK.cache import FieldCache
+
+
+def test_cache_roundtrip_and_eviction(tmp_path):
+
+    cache = FieldCache(tmp_path / "cache", max_size=250)
+
+    src = tmp_path / "vor.dat"
+    src.write_bytes(b"x" * 100)
+    key = cache.key(str(src), "vorticity", lev=85000)
+
+    assert key != cache.key(str(src), "vorticity", lev=70000)
+    assert cache.get(key, str(tmp_path / "miss.dat")) is None
+
+    cache.put(key, str(src), ntime=124)
+    assert cache.get(key, str(tmp_path / "hit.dat")) == {"ntime": 124}
+    assert (tmp_path / "hit.dat").read_bytes() == b"x" * 100
+
+    # derived keys depend on the parent key and the stage parameters
+    fkey = cache.derive(key, "specfilt", trunc="42")
+    assert fkey != cache.derive(key, "specfilt", trunc="63")
+
+    time.sleep(0.01)
+    cache.put(fkey, str(src))
+    time.sleep(0.01)
+    cache.get(key, str(tmp_path / "hit.dat"))
+
+    # a third entry does not fit, so the least recently used one (fkey) goes
+    other = cache.derive(key, "specfilt", trunc="63")
+    cache.put(other, str(src))
+    keys = [e[0] for e in cache.entries()]
+    assert sorted(keys) == sorted([key, other])
+    assert cache.size() == 200
+
+
+def test_cache_entry_survives_rewrite(tmp_path):
+
+    cache = FieldCache(tmp_path / "cache")
+    src = tmp_path / "vor.dat"
+    src.write_bytes(b"a" * 10)
+    key = cache.key(str(src), "vorticity")
+    cache.put(key, str(src))
+
+    # working files are rewritten in place, as preprocess() and FieldWriter do
+    with open(src, "wb") as f:
+        f.write(b"b" * 10)
+    assert cache.get(key, str(tmp_path / "hit.dat")) == {}
+    assert (tmp_path / "hit.dat").read_bytes() == b"a" * 10
+
+    with open(tmp_path / "hit.dat", "wb") as f:
+        f.write(b"c" * 10)
+    cache.get(key, str(tmp_path / "again.dat"))
+    assert (tmp_path / "again.dat").read_bytes() == b"a" * 10
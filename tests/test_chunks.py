@@ -0,0 +1,80 @@
+import sys
+from math import ceil
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from pyTRACK import track_uv
+from pyTRACK.track import plan_chunks
+
+
+def _legacy(ntime):
+    # chunks of the original TRACK splice scripts
+    S, F, I, N, E, chunks = 1, 62, 61, 1, ceil(ntime / 62), []
+    while N <= E:
+        chunks.append((N, S, F))
+        N += 1
+        S = F - 2
+        F = F + I if N < E else F + I + 15
+    return chunks
+
+
+@pytest.mark.parametrize("ntime", [10, 62, 63, 124, 130, 1460])
+def test_default_plan(ntime):
+    plan = plan_chunks(ntime)
+    assert (plan.length, plan.overlap) == (62, 2)
+    assert plan.chunks == _legacy(ntime)
+
+
+def test_plan_covers_all_frames():
+    for ntime in [5844, 14600]:
+        chunks = plan_chunks(ntime).chunks
+        assert chunks[-1][2] >= ntime
+        assert all(c2[1] == c1[2] - 2 for c1, c2 in zip(chunks[:-1], chunks[1:]))
+
+
+def test_plan_limits():
+    # hourly data spans the same time per chunk and overlap
+    assert plan_chunks(1000, timestep=1)[:2] == (372, 12)
+    # memory for a run of 20 frames of a 128x64 grid at 64 bytes per point
+    assert plan_chunks(1000, 128, 64, memory=20 * 128 * 64 * 64).length == 20
+    # shared by 4 runs
+    assert plan_chunks(1000, 128, 64, workers=4, memory=4 * 20 * 128 * 64 * 64,
+                       fill_workers=True).length == 20
+    # every worker gets a chunk, but chunks are at least 8 overlaps long
+    assert plan_chunks(100, workers=4, fill_workers=True).length == 52
+    assert plan_chunks(100, workers=64, fill_workers=True).length == 16
+    assert plan_chunks(100, length=30, overlap=3)[:2] == (30, 3)
+    with pytest.raises(ValueError):
+        plan_chunks(100, length=3, overlap=2)
+
+
+@pytest.mark.parametrize("ntime", [100, 1460, 5844])
+def test_plan_independent_of_workers(ntime):
+    # parallel runs splice the same chunks as serial ones
+    assert plan_chunks(ntime, workers=1) == plan_chunks(ntime, workers=8)
+    assert plan_chunks(ntime, 128, 64, workers=1, memory='1G') == \
+        plan_chunks(ntime, 128, 64, workers=8, memory='1G')
+
+
+def test_track_uv_timestep(tmp_path, monkeypatch):
+    # the time step of the processed input is passed on to track_splice
+    module = sys.modules["pyTRACK.track_uv"]
+
+    class _Cdo(object):
+        def showyear(self, input):
+            return ["2000"]
+
+    lat = np.rad2deg(np.arcsin(np.polynomial.legendre.leggauss(4)[0]))
+    time = xr.DataArray(np.arange(5.), dims="time", attrs={"units": "hours since 2000-01-01"})
+    ua = np.zeros((5, 4, 8), dtype=np.float32)
+    ds = xr.Dataset({"ua": (("time", "lat", "lon"), ua), "va": (("time", "lat", "lon"), ua)},
+                    coords={"time": time, "lat": lat, "lon": np.arange(8) * 45.})
+
+    splice_kwargs = []
+    monkeypatch.setattr(module, "cdo", _Cdo())
+    monkeypatch.setattr(module, "_track_year", lambda *args: splice_kwargs.append(args[15]))
+    track_uv(ds, outdirectory=str(tmp_path))
+    assert splice_kwargs == [dict(plan=None, memory=None, timestep=1.0)]
+    assert plan_chunks(1000, timestep=splice_kwargs[0]["timestep"]).length == 372
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from pyTRACK.io import open_field
+
+
+def test_open_field(tmp_path):
+    lon, lat = np.arange(0, 360, 15.), np.linspace(-80, 80, 9)
+    frames = np.random.default_rng(1).normal(size=(5, len(lat), len(lon))).astype(np.float32)
+    path = tmp_path / "field.dat"
+    with open_field(path, 'w', lon, lat) as w:
+        w.write(frames[:3])
+    with open_field(path, 'a') as w:
+        w.write(frames[3:])
+
+    with open_field(path) as field:
+        assert field.shape == frames.shape
+        assert len(field) == 5
+        assert list(field.frames) == [1, 2, 3, 4, 5]
+        np.testing.assert_allclose(field.lon, lon)
+        np.testing.assert_array_equal(field[1:4], frames[1:4])
+        # frames are views of the file, not copies
+        assert isinstance(field.values, np.memmap)
+        assert np.shares_memory(field[2], field.values)
+        with pytest.raises(ValueError):
+            field[0][0, 0] = 1
+
+    with open_field(path, 'r+') as field:
+        field[4][:] = 0
+        field.flush()
+    with open_field(path) as field:
+        assert not field[4].any()
+        np.testing.assert_array_equal(field[:4], frames[:4])
+
+    with pytest.raises(ValueError):
+        open_field(path, 'a', lon[:-1], lat)
+
+    # a file whose header counts more frames than it holds
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) - 10])
+    with pytest.raises(ValueError):
+        open_field(path)
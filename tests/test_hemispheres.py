@@ -0,0 +1,79 @@
+import os
+import sys
+
+import pytest
+
+from pyTRACK import FieldCache, track_uv
+
+# pyTRACK.track_uv is shadowed by the function of the same name
+module = sys.modules["pyTRACK.track_uv"]
+
+
+@pytest.mark.parametrize("hemisphere", ["EQ", [], ["NH", "XX"], "nh"])
+def test_invalid_hemisphere(tmp_path, hemisphere):
+    # checked before anything is read or written
+    with pytest.raises(ValueError, match="Invalid hemisphere"):
+        track_uv(str(tmp_path / "uv.nc"), outdirectory=str(tmp_path / "out"), hemisphere=hemisphere)
+    assert not (tmp_path / "out").exists()
+
+
+def test_duplicate_hemispheres(tmp_path, monkeypatch):
+    # each hemisphere is tracked once, in the order given
+    hemispheres = []
+
+    def stage(name, **kwargs):
+        hemispheres.append(kwargs["hemispheres"])
+        raise RuntimeError("stop")
+
+    monkeypatch.setattr(module, "_stage", stage)
+    with pytest.raises(RuntimeError, match="stop"):
+        track_uv(str(tmp_path / "uv.nc"), outdirectory=str(tmp_path), hemisphere=["SH", "NH", "SH", "NH"])
+    assert hemispheres == [["SH", "NH"]]
+
+
+def _filtered(tmp_path, monkeypatch):
+    # a cache holding the filtered field of the processed input, so no vorticity or filtering is run
+    processed = tmp_path / "uv_processed.nc"
+    processed.write_text("")
+    cache = FieldCache(tmp_path / "cache")
+    pkey = cache.key(str(processed), "processed")
+    vkey = cache.derive(pkey, "vorticity", year="all", lev=85000, backend="track")
+    field = tmp_path / "filtered.dat"
+    field.write_text("filtered")
+    cache.put(cache.derive(vkey, "specfilt", trunc="42"), str(field), ntime=124)
+
+    calls = []
+
+    def track_splice(datin, ext, ntime, trunc, keep_all_files=False, workers=None, **kwargs):
+        calls.append((os.path.basename(datin), ext, ntime))
+        os.makedirs(os.path.join("output_track", ext))
+        with open(datin) as f, open(os.path.join("output_track", ext, "ff_trs_pos"), "w") as out:
+            out.write(f.read())
+
+    monkeypatch.setattr(module, "track_splice", track_splice)
+    monkeypatch.chdir(tmp_path)
+    return cache, pkey, calls
+
+
+def test_both_hemispheres_share_filtered_field(tmp_path, monkeypatch):
+    cache, pkey, calls = _filtered(tmp_path, monkeypatch)
+    exts = module._track_year("all", "1980", "uv_processed.nc", "96", "48", ["NH", "SH"], False, None,
+                              "42", cache=cache, pkey=pkey)
+
+    assert exts == ["NH_yall", "SH_yall"]
+    # one filtered field, named after both hemispheres, tracked for each
+    assert calls == [("T42filt_vor850_NH_SH_yall.dat", "NH_yall", 124),
+                     ("T42filt_vor850_NH_SH_yall.dat", "SH_yall", 124)]
+    assert not (tmp_path / "T42filt_vor850_NH_SH_yall.dat").exists()
+
+
+def test_both_hemispheres_in_parallel(tmp_path, monkeypatch):
+    cache, pkey, calls = _filtered(tmp_path, monkeypatch)
+    exts = module._track_year("all", "1980", "uv_processed.nc", "96", "48", ["NH", "SH"], False, None,
+                              "42", workers=2, cache=cache, pkey=pkey)
+
+    # each hemisphere is tracked in its own scratch folder, and its output moved into place
+    assert exts == ["NH_yall", "SH_yall"]
+    for ext in exts:
+        assert (tmp_path / "output_track" / ext / "ff_trs_pos").read_text() == "filtered"
+        assert not (tmp_path / ("scratch_" + ext)).exists()
@@ -0,0 +1,54 @@
+import numpy as np
+
+from pyTRACK.io import Tracks
+from pyTRACK.index import TrackIndex
+from pyTRACK.stats import _unit_vectors, _EARTH_RADIUS
+from pyTRACK.store import _frames_to_time
+
+
+def _tracks(ntracks=400, seed=0):
+    # random walks over the globe, with 6 hourly dated points
+    rng = np.random.default_rng(seed)
+    nums = rng.integers(1, 40, ntracks)
+    offsets = np.concatenate(([0], np.cumsum(nums)))
+    lon, lat, frame = [], [], []
+    for n in nums:
+        lon.append(rng.uniform(0, 360) + np.cumsum(rng.normal(0, 3, n)))
+        lat.append(np.clip(rng.uniform(-90, 90) + np.cumsum(rng.normal(0, 2, n)), -90, 90))
+        frame.append(rng.integers(1, 1400) + np.arange(n))
+    frame = np.concatenate(frame)
+    points = dict(time=_frames_to_time(frame, "2000010100"), lon=np.mod(np.concatenate(lon), 360),
+                  lat=np.concatenate(lat))
+    return Tracks({}, np.arange(ntracks) + 1, None, offsets, points), frame
+
+
+def test_radius():
+    tracks, frame = _tracks()
+    index = TrackIndex(tracks, time_bin=48)
+    for lon, lat, r in [(355., 51.5, 500.), (0., 89., 800.), (180., -30., 2500.), (10., 0., 15000.)]:
+        hits = index.radius(lon, lat, r, time=(2000021000, 2000063018))
+        cos = _unit_vectors(tracks.points['lon'], tracks.points['lat']) @ _unit_vectors(lon, lat)
+        t = tracks.points['time']
+        expected = np.flatnonzero((cos >= np.cos(r / _EARTH_RADIUS)) & (t >= 2000021000) & (t <= 2000063018))
+        np.testing.assert_array_equal(hits.point, expected)
+        np.testing.assert_array_equal(hits.track_id, np.unique(np.searchsorted(tracks.offsets, expected,
+                                                                               side='right')))
+
+
+def test_bbox_polygon():
+    tracks, frame = _tracks(seed=1)
+    index = TrackIndex(tracks)
+    lon, lat = tracks.points['lon'], tracks.points['lat']
+
+    hits = index.bbox(280, 10, 30, 70)
+    expected = np.flatnonzero(((lon >= 280) | (lon <= 10)) & (lat >= 30) & (lat <= 70))
+    np.testing.assert_array_equal(hits.point, expected)
+    assert len(index.bbox(0, 360, -90, 90).point) == len(index)
+
+    # the same box as a polygon crossing the Greenwich meridian, and a triangle
+    hits = index.polygon([280, 10, 10, 280], [30, 30, 70, 70])
+    np.testing.assert_array_equal(hits.point, expected)
+    hits = index.polygon([-20, 40, 10], [-10, -10, 40])
+    x = np.where(lon > 180, lon - 360, lon)
+    inside = (lat > -10) & (np.abs(x - 10) < 30 * (40 - lat) / 50)
+    assert set(hits.point) == set(np.flatnonzero(inside))
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+
+import pytest
+
+from pyTRACK.utils import run_isolated
+
+# pyTRACK.track_uv is shadowed by the function of the same name
+module = sys.modules["pyTRACK.track_uv"]
+
+
+def _write_cwd(name):
+    with open(name, "w") as f:
+        f.write(str(os.getpid()))
+
+
+def _fail():
+    raise SystemExit(3)
+
+
+def _sleep_then_write(name):
+    time.sleep(5)
+    _write_cwd(name)
+
+
+def test_run_isolated(tmp_path):
+    jobs = [(tmp_path / str(i), _write_cwd, dict(name="out")) for i in range(4)]
+    done = []
+    run_isolated(jobs, workers=2, callback=done.append)
+
+    # every job ran in its own process, inside its own working directory
+    pids = {(tmp_path / str(i) / "out").read_text() for i in range(4)}
+    assert len(pids) == 4 and str(os.getpid()) not in pids
+    assert sorted(done) == [0, 1, 2, 3]
+    assert not (tmp_path / "out").exists()
+
+
+def test_run_isolated_failure(tmp_path):
+    jobs = [(tmp_path / "ok", _write_cwd, dict(name="out")), (tmp_path / "bad", _fail, {})]
+    with pytest.raises(RuntimeError, match="in .*bad failed with exit code 3"):
+        run_isolated(jobs, workers=2)
+    assert (tmp_path / "ok" / "out").exists()
+
+    # with stop_on_error the other jobs are stopped
+    jobs = [(tmp_path / "slow", _sleep_then_write, dict(name="out")), (tmp_path / "bad", _fail, {})]
+    start = time.time()
+    with pytest.raises(RuntimeError):
+        run_isolated(jobs, workers=2, stop_on_error=True)
+    assert time.time() - start < 4
+    assert not (tmp_path / "slow" / "out").exists()
+
+
+def test_move_output(tmp_path):
+    scratch, outdir = tmp_path / "scratch", tmp_path / "out"
+    (scratch / "output_track" / "NH_y1980").mkdir(parents=True)
+    (scratch / "output_track" / "NH_y1980" / "ff_trs_pos").write_text("new")
+    (outdir / "output_track" / "NH_y1980").mkdir(parents=True)
+    (outdir / "output_track" / "NH_y1980" / "ff_trs_pos").write_text("old")
+
+    # an older copy is replaced
+    module._move_output(str(scratch), str(outdir), "NH_y1980")
+    assert (outdir / "output_track" / "NH_y1980" / "ff_trs_pos").read_text() == "new"
+    assert os.listdir(scratch / "output_track") == []
+
+    module._restore_output(str(scratch), str(outdir), "NH_y1980")
+    assert (scratch / "output_track" / "NH_y1980" / "ff_trs_pos").read_text() == "new"
+    assert not (outdir / "output_track" / "NH_y1980").exists()
+    # nothing to restore
+    module._restore_output(str(scratch), str(outdir), "SH_y1980")
+    assert not (scratch / "output_track" / "SH_y1980").exists()
+
+
+def test_track_years_isolated(tmp_path, monkeypatch):
+    def track_year(year, Y, infile_e, nx, ny, hemispheres, ysplit, sdate, trunc, keep_all_files, **kwargs):
+        # stands in for vorticity, filtering and tracking of one year, in the scratch folder
+        exts = [h + "_y" + year for h in hemispheres]
+        for ext in exts:
+            os.makedirs(os.path.join("output_track", ext))
+            _write_cwd(os.path.join("output_track", ext, "ff_trs_pos"))
+        return exts
+
+    monkeypatch.setattr(module, "_track_year", track_year)
+    (tmp_path / "output_track").mkdir()
+    jobs = [(tmp_path / "scratch_years" / year, module._track_year_isolated,
+             dict(year=year, Y=year, infile_e="in.nc", nx="96", ny="48", hemispheres=["NH", "SH"],
+                  ysplit=True, sdate=None, trunc="42", keep_all_files=False, outdir=str(tmp_path)))
+             for year in ["1980", "1981", "1982"]]
+    run_isolated(jobs, workers=3)
+
+    assert sorted(os.listdir(tmp_path / "output_track")) == \
+        sorted(h + "_y" + year for h in ["NH", "SH"] for year in ["1980", "1981", "1982"])
+    pids = {(tmp_path / "output_track" / ("NH_y" + year) / "ff_trs_pos").read_text()
+            for year in ["1980", "1981", "1982"]}
+    assert len(pids) == 3
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import netCDF4
+import xarray as xr
+
+from pyTRACK import track_uv
+from pyTRACK.utils import MemoryFile, preprocess
+
+
+def _dataset():
+    lon = np.arange(0, 360, 30.0)
+    lat = np.linspace(-60, 60, 5)
+    time = np.arange(4.0)
+    ua = np.random.default_rng(0).standard_normal((4, 5, 12)).astype(np.float32)
+    return xr.Dataset({"ua": (("time", "lat", "lon"), ua),
+                       "va": (("time", "lat", "lon"), -ua)},
+                      coords={"time": time, "lat": lat, "lon": lon})
+
+
+def test_memory_file_roundtrip():
+    ds = _dataset()
+    with MemoryFile(ds) as f:
+        with netCDF4.Dataset(f.path) as nc:
+            assert nc.dimensions["time"].isunlimited()
+            np.testing.assert_array_equal(nc.variables["ua"][:], ds.ua.values)
+
+
+def test_memory_file_numpy(tmp_path):
+    ds = _dataset()
+    with MemoryFile(ds.ua.values, lon=ds.lon.values, lat=ds.lat.values, name="vo") as f:
+        preprocess(f.path, str(tmp_path / "out.nc"))
+    with netCDF4.Dataset(str(tmp_path / "out.nc")) as nc:
+        np.testing.assert_array_equal(nc.variables["vo"][:], ds.ua.values)
+        assert len(nc.dimensions["time"]) == 4
+
+
+def test_track_uv_memory_regrid(tmp_path, monkeypatch):
+    # input on a regular grid is regridded by cdo, a separate program that does not inherit the
+    # descriptor behind the /proc/self/fd path of a MemoryFile
+    module = sys.modules["pyTRACK.track_uv"]
+    regridded = []
+
+    def regrid(input, outfile):
+        regridded.append(input)
+        subprocess.run(["cp", input, outfile], check=True)
+
+    class _Cdo(object):
+        def showyear(self, input):
+            return ["2000"]
+
+    tracked = []
+    monkeypatch.setattr(module, "regrid", regrid)
+    monkeypatch.setattr(module, "cdo", _Cdo())
+    monkeypatch.setattr(module, "_track_year", lambda year, Y, infile_e, nx, ny, *args: tracked.append((nx, ny)))
+    shm = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+    track_uv(_dataset(), outdirectory=str(tmp_path))
+
+    assert not regridded[0].startswith("/proc/")
+    assert tracked == [("12", "5")]
+    with netCDF4.Dataset(str(tmp_path / "input_array_processed.nc")) as nc:
+        np.testing.assert_array_equal(nc.variables["ua"][:], _dataset().ua.values)
+    # the copy is removed once cdo is done
+    assert (set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()) == shm
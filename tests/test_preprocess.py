@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from pyTRACK.utils import preprocess, is_gaussian
+
+
+def test_preprocess_drops_bounds_and_fills(tmp_path):
+
+    infile = str(tmp_path / "in.nc")
+    outfile = str(tmp_path / "out.nc")
+
+    lat = np.rad2deg(np.arcsin(np.polynomial.legendre.leggauss(4)[0]))
+    with Dataset(infile, "w") as ds:
+        ds.createDimension("time", None)
+        ds.createDimension("bnds", 2)
+        ds.createDimension("lat", 4)
+        ds.createDimension("lon", 8)
+        time = ds.createVariable("time", "f8", ("time",))
+        time.bounds = "time_bnds"
+        time[:] = np.arange(5.)
+        ds.createVariable("time_bnds", "f8", ("time", "bnds"))[:] = np.zeros((5, 2))
+        ds.createVariable("lat", "f8", ("lat",))[:] = lat
+        ds.createVariable("lon", "f8", ("lon",))[:] = np.arange(8) * 45.
+        ua = ds.createVariable("ua", "f4", ("time", "lat", "lon"), fill_value=1e20)
+        ua.missing_value = np.float32(1e20)
+        data = np.ones((5, 4, 8), dtype=np.float32)
+        data[2, 1, 3] = 1e20
+        ua[:] = np.ma.masked_equal(data, 1e20)
+
+    preprocess(infile, outfile, block_size=2)
+
+    with Dataset(outfile) as ds:
+        assert "time_bnds" not in ds.variables
+        assert "bnds" not in ds.dimensions
+        assert ds.dimensions["time"].isunlimited()
+        ua = ds.variables["ua"]
+        assert "_FillValue" not in ua.ncattrs()
+        assert "missing_value" not in ua.ncattrs()
+        assert "bounds" not in ds.variables["time"].ncattrs()
+        values = ua[:]
+        assert values[2, 1, 3] == 0
+        assert values.sum() == 5 * 4 * 8 - 1
+
+    assert is_gaussian(lat[::-1])
+    assert not is_gaussian(np.linspace(-90, 90, 4))
+
+
+def _month(path, var, start, units, values):
+    with Dataset(path, "w") as ds:
+        ds.createDimension("time", None)
+        ds.createDimension("lat", 2)
+        ds.createDimension("lon", 3)
+        time = ds.createVariable("time", "f8", ("time",))
+        time.units = units
+        time.calendar = "standard"
+        time[:] = start + 6. * np.arange(len(values))
+        ds.createVariable("lat", "f8", ("lat",))[:] = [-30., 30.]
+        ds.createVariable("lon", "f8", ("lon",))[:] = [0., 120., 240.]
+        ds.createVariable(var, "f4", ("time", "lat", "lon"))[:] = values
+
+
+def test_preprocess_multiple_files(tmp_path):
+    # u and v files for two months, with different time units, given out of order
+    data = np.arange(6 * 2 * 3, dtype=np.float32).reshape(6, 2, 3)
+    _month(tmp_path / "u_02.nc", "ua", 0., "hours since 2000-02-01", data[4:])
+    _month(tmp_path / "u_01.nc", "ua", 30 * 24., "hours since 2000-01-01", data[:4])
+    _month(tmp_path / "v_01.nc", "va", 30 * 24., "hours since 2000-01-01", -data[:4])
+    _month(tmp_path / "v_02.nc", "va", 0., "hours since 2000-02-01", -data[4:])
+    outfile = str(tmp_path / "out.nc")
+
+    preprocess([str(tmp_path / f) for f in ["u_02.nc", "v_01.nc", "u_01.nc", "v_02.nc"]], outfile)
+
+    with Dataset(outfile) as ds:
+        np.testing.assert_array_equal(ds.variables["ua"][:], data)
+        np.testing.assert_array_equal(ds.variables["va"][:], -data)
+        np.testing.assert_array_equal(ds.variables["time"][:], 30 * 24. + 6. * np.arange(6))
+        assert ds.variables["time"].units == "hours since 2000-01-01"
+
+    with pytest.raises(ValueError):
+        preprocess([str(tmp_path / "u_01.nc"), str(tmp_path / "u_01.nc")], outfile)
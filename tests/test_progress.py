@@ -0,0 +1,40 @@
+import time
+import ctypes
+
+from pyTRACK.progress import _FrameParser, _CaptureFrames
+
+
+def test_frame_parser():
+    parser = _FrameParser()
+    assert parser.feed(b"Number of frames in file is 8\nProcessing fr") == []
+    assert parser.feed(b"ame 3 \nProcessing frame 4 \nFrame 5, time 1.0 of Variable 1, ua\n") == [3, 4, 5]
+    # the netCDF reader reports every variable of a frame
+    assert parser.feed(b"Frame 5, time 1.0 of Variable 2, va\nFrame 6, Variable 1, ua\n") == [6]
+
+
+def test_capture_frames(capfd):
+    libc = ctypes.CDLL(None)
+    frames = []
+    with _CaptureFrames(frames.append):
+        for frame in range(1, 4):
+            libc.printf(b"Processing frame %d \n", ctypes.c_int(frame))
+            # frames arrive while the C code runs, not when its output is flushed at the end
+            start = time.time()
+            while frame not in frames and time.time() - start < 5:
+                time.sleep(0.01)
+            assert frames[-1] == frame
+        libc.printf(b"****INFORMATION****, done\n")
+
+    assert frames == [1, 2, 3]
+    # the output still goes where it went before
+    assert "Processing frame 2" in capfd.readouterr().out
+
+
+def test_capture_restores_buffering():
+    libc = ctypes.CDLL(None)
+    stdout = ctypes.c_void_p.in_dll(libc, 'stdout')
+    before = (libc.__flbf(stdout), libc.__fbufsize(stdout))
+    with _CaptureFrames(lambda frame: None):
+        assert libc.__flbf(stdout)
+    # TRACK output after the capture is buffered as it was before
+    assert (libc.__flbf(stdout), libc.__fbufsize(stdout)) == before
@@ -0,0 +1,65 @@
+import numpy as np
+
+from pyTRACK.io import read_tracks, iter_tracks, ADD_UNDEF
+
+
+def _write(path, ntracks=5, aniso=False, awt=0, nfwpos=(1, 0)):
+    # writes a track file the way meantrd.c does
+    rng = np.random.default_rng(1)
+    nfld = sum(3 if p else 1 for p in nfwpos)
+    expected = []
+    with open(path, "w") as f:
+        f.write("%d\n" % (1 if aniso else 0))
+        if awt:
+            f.write("WT_INFO %1d %12.5f\n" % (awt, 2.5))
+        f.write("0 0\n")
+        f.write("TRACK_NUM  %8d ADD_FLD  %3d %3d &%s\n" %
+                (ntracks, len(nfwpos), nfld, "".join(str(p) for p in nfwpos)))
+        for i in range(ntracks):
+            num = 3 + i
+            f.write("TRACK_ID  %d START_TIME %10ld\n" % (i + 1, 1979010100 + i))
+            f.write("POINT_NUM  %d\n" % num)
+            for j in range(num):
+                row = [1979010100 + i + j] + list(rng.uniform(0, 90, 3))
+                line = "%10ld %f %f %e " % tuple(row)
+                add = [ADD_UNDEF if j == 0 else v for v in rng.uniform(0, 10, nfld)]
+                line += "& " + "".join("%e & " % v for v in add)
+                row += add
+                if aniso:
+                    line += "%f %f %f %e " % (0.5, 0.1, 0.2, 1e-3)
+                if awt:
+                    line += "%f " % 1.0
+                nfm = j % 2
+                f.write(line + ("%d\n" % nfm if nfm else "\n"))
+                expected.append(row + [nfm])
+    return np.array(expected)
+
+
+def test_read_tracks(tmp_path):
+    path = str(tmp_path / "ff_trs_pos")
+    expected = _write(path)
+    tr = read_tracks(path)
+
+    assert len(tr) == 5
+    assert list(tr.num_points) == [3, 4, 5, 6, 7]
+    assert tr.header["nfwpos"] == [1, 0]
+    np.testing.assert_array_equal(tr.track_id, np.arange(1, 6))
+    np.testing.assert_array_equal(tr.points["time"], expected[:, 0])
+    np.testing.assert_allclose(tr.points["lon"], expected[:, 1], atol=1e-6)
+    np.testing.assert_allclose(tr.points["intensity"], expected[:, 3], rtol=1e-6)
+    np.testing.assert_allclose(tr.points["field1_lat"], expected[:, 5], rtol=1e-6)
+    np.testing.assert_allclose(tr.points["field2"], expected[:, 7], rtol=1e-6)
+    np.testing.assert_array_equal(tr.points["nfm"], expected[:, -1])
+    assert tr[2]["lat"].shape == (5,)
+
+
+def test_read_tracks_weights_chunked(tmp_path):
+    path = str(tmp_path / "tr_trs_neg")
+    _write(path, ntracks=7, aniso=True, awt=1, nfwpos=())
+    chunks = list(iter_tracks(path, chunk_size=3))
+    assert [len(c) for c in chunks] == [3, 3, 1]
+    tr = read_tracks(path, chunk_size=3)
+    assert tr.header["awt"] == 1 and tr.header["aniso"]
+    np.testing.assert_array_equal(tr.points["wght"], 1.0)
+    np.testing.assert_array_equal(tr.points["area"], 1e-3)
+    np.testing.assert_array_equal(tr.offsets, read_tracks(path).offsets)
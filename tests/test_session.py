@@ -0,0 +1,117 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from pyTRACK import TrackSession
+from pyTRACK.utils import MemoryFile
+
+LIB = os.path.join(os.path.dirname(__file__), "..", "pyTRACK", "_lib", "libtrack.so")
+
+
+class _FakeLibTrack(object):
+    # stands in for libtrack.so - reads the namelist from stdin, reports two frames and writes
+    # the namelist to out{ext} in the working directory. A namelist 'exit N' exits with status N,
+    # and a namelist 'input' writes the contents of the input file instead.
+
+    def track_main(self, argc, argv):
+        ext = argv[4].decode()
+        namelist = os.read(0, 1 << 16)
+        if namelist.startswith(b"exit"):
+            os._exit(int(namelist.split()[1]))
+        if namelist == b"input":
+            with open(argv[2], "rb") as f:
+                namelist = f.read()
+        os.write(1, b"Processing frame 1\nProcessing frame 2\n")
+        with open("out" + ext, "wb") as f:
+            f.write(namelist)
+        return 0
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(sys.modules["pyTRACK.track"], "_load_libtrack", lambda: _FakeLibTrack())
+    with TrackSession(workers=2) as session:
+        yield session
+
+
+def _jobs(tmp_path, namelists):
+    jobs = []
+    for i, text in enumerate(namelists):
+        (tmp_path / ("namelist%d" % i)).write_text(text)
+        jobs.append(dict(input_file="input.nc", ext="_%d" % i, namelist=str(tmp_path / ("namelist%d" % i)),
+                         workdir=str(tmp_path / ("run%d" % i))))
+    return jobs
+
+
+def test_session_map(tmp_path, session):
+    done = []
+    frames = []
+    jobs = _jobs(tmp_path, ["a", "b", "c"])
+    results = session.map(jobs, callback=lambda i, result: done.append(i),
+                          progress=lambda i, frame: frames.append((i, frame)))
+
+    # every run gets its namelist on stdin, in its own working directory
+    assert [r.status for r in results] == [0, 0, 0]
+    assert all(b"Processing frame 2" in r.output for r in results)
+    for i, text in enumerate(["a", "b", "c"]):
+        assert (tmp_path / ("run%d" % i) / ("out_%d" % i)).read_text() == text
+    assert sorted(done) == [0, 1, 2]
+    assert sorted(frames) == [(i, frame) for i in range(3) for frame in (1, 2)]
+
+
+def test_session_failures(tmp_path, session):
+    jobs = _jobs(tmp_path, ["exit 3", "b"])
+    with pytest.raises(RuntimeError, match="TRACK job 0 .* exit code 3"):
+        session.map(jobs)
+
+    # a TRACK call that exits only ends its own child, the workers go on
+    results = session.map(jobs, check=False)
+    assert [r.status for r in results] == [3, 0]
+    assert session.run(**jobs[1]).status == 0
+
+    # a worker that dies is replaced, and its job run again
+    for process, conn in session._pool:
+        process.kill()
+        process.join()
+    assert [r.status for r in session.map(jobs[1:] * 3)] == [0, 0, 0]
+
+
+def test_session_missing_namelist(tmp_path, session):
+    with pytest.raises(FileNotFoundError):
+        session.run(namelist=str(tmp_path / "missing.in"), workdir=str(tmp_path))
+
+
+def _shm():
+    return set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+
+
+def test_session_memory_file(tmp_path, session):
+    # the /proc/self/fd path of a MemoryFile only names the file in this process and its children,
+    # not in the workers, which are forked before it is made
+    ds = xr.Dataset({"ua": (("time", "lat", "lon"), np.arange(24.).reshape(2, 3, 4))},
+                    coords={"time": [0., 6.], "lat": [-30., 0., 30.], "lon": [0., 90., 180., 270.]})
+    before = _shm()
+    with MemoryFile(ds) as f:
+        expected = open(f.path, "rb").read()
+        jobs = _jobs(tmp_path, ["input"] * 4)
+        for job, input_file in zip(jobs, [f, f.path, f, ds]):
+            job["input_file"] = input_file
+        results = session.map(jobs)
+
+    assert [r.status for r in results] == [0] * 4
+    for i in range(3):
+        assert (tmp_path / ("run%d" % i) / ("out_%d" % i)).read_bytes() == expected
+    with xr.open_dataset(tmp_path / "run3" / "out_3") as out:
+        np.testing.assert_array_equal(out.ua.values, ds.ua.values)
+    # the copies in /dev/shm are removed once the jobs are done
+    assert _shm() == before
+
+
+@pytest.mark.skipif(not os.path.exists(LIB), reason="libtrack.so not built")
+def test_session_starts_with_libtrack():
+    with TrackSession(workers=2) as session:
+        assert session.workers == 2
+        assert all(process.is_alive() for process, conn in session._pool)
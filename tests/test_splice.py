@@ -0,0 +1,107 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from pyTRACK.track import _chunk_namelist
+
+# pyTRACK.track is shadowed by the function of the same name
+module = sys.modules["pyTRACK.track"]
+
+
+def _fake_track(input_file="input.nc", ext='_ext', namelist=None, **kwargs):
+    # stands in for a TRACK run, leaving the files it would in the current directory, each
+    # holding the namelist it was run with
+    text = Path(namelist).read_text()
+    if Path(namelist).name.startswith("RSPLICE"):
+        outputs = ("tr_trs", "ff_trs")
+    else:
+        outputs = ("objout.new", "tdump", "initial")
+    for output in outputs:
+        Path(output + ext).write_text(text)
+
+
+class _FakeSession(object):
+    # stands in for a TrackSession, running _fake_track in the job's workdir
+
+    workers = 4
+
+    def __init__(self):
+        self.batches = []
+
+    def map(self, jobs, callback=None, check=True, progress=None):
+        self.batches.append([Path(job['namelist']).name for job in jobs])
+        cwd = os.getcwd()
+        for i, job in enumerate(jobs):
+            os.chdir(job['workdir'])
+            try:
+                _fake_track(job['input_file'], job['ext'], job['namelist'])
+            finally:
+                os.chdir(cwd)
+            if callback is not None:
+                callback(i, None)
+        return [None] * len(jobs)
+
+
+def _outputs(folder):
+    # every file under folder and its contents, with folder itself taken out of the paths
+    return {str(p.relative_to(folder)): p.read_text().replace(str(folder), "")
+            for p in sorted(Path(folder).rglob("*")) if p.is_file() and "scratch" not in p.parts}
+
+
+def test_parallel_splice_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(module, "track", _fake_track)
+    for name, session in [("serial", None), ("parallel", _FakeSession())]:
+        (tmp_path / name).mkdir()
+        monkeypatch.chdir(tmp_path / name)
+        module.track_splice(str(tmp_path / "datin.dat"), "NH_yall", 130, "42", keep_all_files=True,
+                            session=session, progress=False)
+
+    serial = _outputs(tmp_path / "serial" / "output_track")
+    parallel = _outputs(tmp_path / "parallel" / "output_track")
+    # the splice namelists list the same chunk tracks, in the same order
+    assert serial["NH_yall/RSPLICE_pos"].count("tdump") == 3
+    assert serial == parallel
+
+
+@pytest.mark.parametrize("sign, template, mode", [("max", "RUNDATIN.VOR.NH_yall", "1"),
+                                                  ("min", "RUNDATIN.VOR_A.NH_yall", "0")])
+def test_chunk_namelist(tmp_path, sign, template, mode):
+    namelist = _chunk_namelist(tmp_path, "NH_yall", 60, 123, "/data/initial.T42_NH", False, sign)
+    assert namelist == tmp_path / template
+    lines = namelist.read_text().splitlines()
+    # the frame range, initialisation file and sign of the field
+    assert (lines[2], lines[12], lines[14], lines[16]) == ("/data/initial.T42_NH", mode, "60", "123")
+
+
+def test_track_splice_signs_together(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session = _FakeSession()
+    module.track_splice("datin.dat", "NH_yall", 130, "42", session=session, progress=False)
+
+    # both signs of every chunk are tracked in one batch, and then both splices in another
+    assert len(session.batches) == 2
+    assert sorted(session.batches[0]) == sorted(["RUNDATIN.VOR.NH_yall", "RUNDATIN.VOR_A.NH_yall"] * 3)
+    assert sorted(session.batches[1]) == ["RSPLICE.neg", "RSPLICE.pos"]
+
+    out = tmp_path / "output_track" / "NH_yall"
+    # the chunk folders and scratch folders are removed
+    assert sorted(p.name for p in out.iterdir()) == ["ff_trs_neg", "ff_trs_pos", "tr_trs_neg", "tr_trs_pos"]
+
+
+def test_track_splice_chunk_outputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    module.track_splice("datin.dat", "NH_yall", 130, "42", session=_FakeSession(), keep_all_files=True,
+                        progress=False)
+
+    out = tmp_path / "output_track" / "NH_yall"
+    for N in (1, 2, 3):
+        assert (out / f"DJF_MAX_{N}" / "tdump").read_text().splitlines()[12] == "1"
+        assert (out / f"DJF_MIN_{N}" / "tdump").read_text().splitlines()[12] == "0"
+    # the splices list the chunks of their own sign, in order
+    rsplice = (out / "RSPLICE_neg").read_text()
+    assert (out / "tr_trs_neg").read_text() == rsplice
+    assert "DJF_MAX" not in rsplice
+    assert [line for line in rsplice.splitlines() if line.endswith("tdump")] == \
+        [str(out / f"DJF_MIN_{N}" / "tdump") for N in (1, 2, 3)]
@@ -0,0 +1,205 @@
+import os
+
+import numpy as np
+import pytest
+
+from pyTRACK import stats_track
+from pyTRACK.io import Tracks
+from pyTRACK.stats import (compute_stats, _Grid, _adaptive_track_density, _bandwidths, _kernel_sums,
+                           _stats_namelist, _unit_vectors)
+
+LIB = os.path.join(os.path.dirname(__file__), "..", "pyTRACK", "_lib", "libtrack.so")
+
+
+def _write(path, tracks):
+    # frame numbered track file, as written by TRACK
+    with open(path, "w") as f:
+        f.write("0\n0 0\nTRACK_NUM  %8d ADD_FLD    0   0 &\n" % len(tracks))
+        for i, points in enumerate(tracks):
+            f.write("TRACK_ID  %d\nPOINT_NUM  %d\n" % (i + 1, len(points)))
+            for frame, lon, lat, z in points:
+                f.write("%d %f %f %e \n" % (frame, lon, lat, z))
+
+
+def test_kernel_sums():
+    # only evaluating the kernels inside their support gives the full sums
+    rng = np.random.default_rng(0)
+    lon, lat = rng.uniform(0, 360, 500), rng.uniform(-90, 90, 500)
+    d = _unit_vectors(lon, lat)
+    h = np.exp(rng.uniform(np.log(0.1), np.log(500), 500))
+    tsm = (1 + h) / h
+    grid = _Grid(np.arange(0, 360, 5.0), np.arange(-87.5, 90, 5.0))
+    pairs = grid.pairs(lon, lat, np.degrees(np.arccos(1 / tsm)), max_pairs=1000)
+    sums = _kernel_sums(grid.xyz, d, tsm, np.ones(500), pairs, lat[:, None])
+
+    k = np.maximum(tsm * (grid.xyz @ d.T) - 1, 0)
+    np.testing.assert_allclose(sums[:, 0], k.sum(axis=1), atol=1e-9)
+    np.testing.assert_allclose(sums[:, 1], k @ lat, atol=1e-7)
+
+
+def _pilot_bandwidths(d, weight, sm, dsm, alpha):
+    # sqt_cvalln.c and sp_kernal_estimate.c, between every pair of points
+    tsm = (1 + sm) / sm
+    k = np.maximum(tsm * (d @ d.T) - 1, 0)
+    np.fill_diagonal(k, 0)
+    pilot = (k @ weight + 1e-5) * tsm / (tsm - 1) ** 2 / np.pi / (weight.sum() - weight)
+    return np.maximum((pilot / np.exp(np.log(pilot).mean())) ** 0.5 * sm, dsm)
+
+
+def test_bandwidths():
+    rng = np.random.default_rng(2)
+    d = _unit_vectors(rng.uniform(0, 360, 600), rng.uniform(20, 70, 600))
+    weight = rng.uniform(0.5, 2, 600)
+    group = rng.integers(0, 3, 600)
+    np.testing.assert_allclose(_bandwidths(d, weight, 50., 0.1, 0.5),
+                               _pilot_bandwidths(d, weight, 50., 0.1, 0.5), rtol=1e-10)
+    h = _bandwidths(d, weight, 50., 0.1, 0.5, group=group)
+    for g in range(3):
+        np.testing.assert_allclose(h[group == g], _pilot_bandwidths(d[group == g], weight[group == g],
+                                                                     50., 0.1, 0.5), rtol=1e-10)
+
+
+def test_adaptive_track_density():
+    # every grid point gets its own adaptive estimate from the closest point of every track
+    rng = np.random.default_rng(3)
+    num = rng.integers(3, 10, 40)
+    offsets = np.concatenate([[0], np.cumsum(num)])
+    lon = np.concatenate([(rng.uniform(0, 360) + 3 * np.arange(n)) % 360 for n in num])
+    lat = rng.uniform(20, 70, len(lon))
+    tracks = Tracks({}, np.arange(1, 41), None, offsets, {'lon': lon, 'lat': lat})
+    use = np.ones(40, dtype=bool)
+    use[3] = False
+    ltm = rng.uniform(1, 5, 40)
+    grid = _Grid(np.arange(0, 360, 10.0), np.arange(-85, 90, 10.0))
+    den, lif = _adaptive_track_density(grid, tracks, use, ltm, 20., batch_size=2000)
+
+    d = _unit_vectors(lon, lat)
+    ids = np.flatnonzero(use)
+    for g, den_g, lif_g in zip(grid.xyz, den, lif):
+        closest = np.array([d[offsets[j] + np.argmax(d[offsets[j]:offsets[j + 1]] @ g)] for j in ids])
+        h = _pilot_bandwidths(closest, np.ones(len(ids)), 20., 0.1, 0.5)
+        tsm = (1 + h) / h
+        k = np.maximum(tsm * (closest @ g) - 1, 0) * tsm / (tsm - 1) ** 2
+        np.testing.assert_allclose(den_g, k.sum() / np.pi / len(ids), rtol=1e-9, atol=1e-15)
+        if den_g > 1e-4:
+            np.testing.assert_allclose(lif_g, k @ ltm[ids] / k.sum(), rtol=1e-9)
+
+
+def test_compute_stats(tmp_path):
+    rng = np.random.default_rng(1)
+    tracks = []
+    for i in range(300):
+        n = rng.integers(4, 20)
+        start = rng.integers(1, 100)
+        lon = (rng.uniform(0, 360) + 2 * np.arange(n)) % 360
+        lat = rng.uniform(30, 60) + 0.5 * np.arange(n)
+        tracks.append(list(zip(range(start, start + n), lon, lat, np.full(n, 5.0))))
+    _write(str(tmp_path / "ff_trs_pos"), tracks)
+
+    lon, lat = np.arange(0, 360, 2.5), np.arange(-88.75, 90, 2.5)
+    area = np.cos(np.radians(lat))[:, None] * np.radians(2.5) ** 2
+    ds = compute_stats(str(tmp_path / "ff_trs_pos"), lon=lon, lat=lat, scale=None)
+    assert ds["fden"].shape == (len(lat), len(lon))
+    # densities are pdfs on the sphere, every track covering at least the kernel of one point
+    assert abs(float((ds["fden"] * area).sum()) - 1) < 1e-3
+    assert float((ds["tden"] * area).sum()) > 1
+    # constant intensity, and speed of about 2 degrees in longitude every 6 hours
+    fden = ds["fden"].values > 1e-2
+    np.testing.assert_allclose(ds["mstr"].values[fden], 5.0, rtol=1e-5)
+    assert float(ds["yvel"].values[fden].min()) > 0
+
+    out = tmp_path / "stats_ff_trs_pos.nc"
+    scaled = compute_stats(str(tmp_path / "ff_trs_pos"), lon=lon, lat=lat, output=str(out))
+    assert out.exists()
+    ngen = sum(t[0][0] > 1 for t in tracks)
+    assert abs(float((scaled["gden"] * area).sum()) / 0.023909410 - ngen) < 0.01 * ngen
+
+
+class _FakeSession(object):
+    # stands in for a TrackSession, writing the namelist of every job as its statistics file
+
+    workers = 2
+
+    def __init__(self):
+        self.jobs = []
+
+    def map(self, jobs, callback=None, check=True, progress=None):
+        for i, job in enumerate(jobs):
+            self.jobs.append(job)
+            with open(job['namelist']) as f, open(os.path.join(job['workdir'], "stat_trs_scl_ext_1.nc"), "w") as out:
+                out.write(f.read())
+            if callback is not None:
+                callback(i, None)
+        return [None] * len(jobs)
+
+
+def test_stats_namelist(tmp_path):
+    _stats_namelist("ff_trs_neg", str(tmp_path / "track_stats.in"))
+    text = (tmp_path / "track_stats.in").read_text()
+    assert "ff_trs_neg" in text and "FILE_NAME" not in text
+
+
+@pytest.mark.parametrize("keep_all_files", [False, True])
+def test_stats_track_session(tmp_path, keep_all_files):
+    for folder in ["NH_y1980", "SH_y1980", "append"]:
+        (tmp_path / "output_track" / folder).mkdir(parents=True)
+    for folder in ["NH_y1980", "SH_y1980"]:
+        for name in ["ff_trs_pos", "ff_trs_neg"]:
+            (tmp_path / "output_track" / folder / name).write_text("")
+
+    session = _FakeSession()
+    stats_track(str(tmp_path), keep_all_files=keep_all_files, session=session)
+
+    # every track file gets its own scratch folder, with the file linked in under its own name
+    assert len(session.jobs) == 4
+    for folder in ["NH_y1980", "SH_y1980"]:
+        out = tmp_path / "output_track" / folder
+        for name in ["ff_trs_pos", "ff_trs_neg"]:
+            text = (out / ("stats_" + name + ".nc")).read_text()
+            assert name in text and "FILE_NAME" not in text
+            assert (out / ("scratch_stats_" + name)).exists() == keep_all_files
+            if keep_all_files:
+                assert (out / ("scratch_stats_" + name) / name).resolve() == out / name
+    assert not os.listdir(tmp_path / "output_track" / "append")
+
+
+def test_stats_track_engine(tmp_path):
+    (tmp_path / "output_track").mkdir()
+    with pytest.raises(ValueError, match="Unknown statistics engine"):
+        stats_track(str(tmp_path), engine="fortran")
+
+
+@pytest.mark.skipif(not os.path.exists(LIB), reason="libtrack.so not built")
+def test_compute_stats_matches_track(tmp_path):
+    rng = np.random.default_rng(1)
+    tracks = []
+    for _ in range(60):
+        n, start = rng.integers(4, 21), rng.integers(1, 101)
+        lon0, lat0 = rng.uniform(0, 360), rng.uniform(30, 60)
+        tracks.append([(start + t, (lon0 + 2 * t) % 360, lat0 + 0.5 * t, rng.uniform(2, 8))
+                       for t in range(n)])
+    folder = tmp_path / "output_track" / "NH_yall"
+    folder.mkdir(parents=True)
+    for name in ("ff_trs_pos", "ff_trs_neg"):
+        _write(folder / name, tracks)
+    stats_track(str(tmp_path), engine='track')
+
+    import xarray as xr
+    with xr.open_dataset(folder / "stats_ff_trs_pos.nc") as ds:
+        track = ds.load()
+    exact = compute_stats(str(folder / "ff_trs_pos"), exact=True)
+    default = compute_stats(str(folder / "ff_trs_pos"))
+
+    def close(a, b, name, den, rtol):
+        # compared where the density is above a tenth of its maximum, relative to the field maximum
+        use = (den > 0.1 * den.max()).values
+        a, b = a[name].values[use], b[name].values[use]
+        np.testing.assert_allclose(a, b, atol=rtol * np.abs(b).max(), err_msg=name)
+
+    for name in ("fden", "gden", "lden", "mstr", "msp", "xvel", "mgdr", "mten"):
+        close(exact, track, name, track["fden"], 1e-3)
+        # the binned pilot estimates of the default mode stay within 1% of TRACK's fields
+        close(default, track, name, track["fden"], 1e-2)
+    # the track density and mean lifetime are only reproduced with exact=True
+    for name in ("tden", "mlif"):
+        close(exact, track, name, track["tden"], 1e-3)
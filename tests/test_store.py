@@ -0,0 +1,62 @@
+import os
+import numpy as np
+
+from pyTRACK.store import build_store, TrackStore, _frames_to_time
+
+
+def _write(path, tracks):
+    # frame numbered track file, as written by TRACK
+    with open(path, "w") as f:
+        f.write("0\n0 0\nTRACK_NUM  %8d ADD_FLD    0   0 &\n" % len(tracks))
+        for i, points in enumerate(tracks):
+            f.write("TRACK_ID  %d\nPOINT_NUM  %d\n" % (i + 1, len(points)))
+            for frame, lon, lat in points:
+                f.write("%d %f %f %e \n" % (frame, lon, lat, 1e-5))
+
+
+def test_frames_to_time():
+    t = _frames_to_time([1, 2, 5], "1980123118")
+    assert list(t) == [1980123118, 1981010100, 1981010118]
+
+
+def test_store_query(tmp_path):
+    for year in ["1980", "1981"]:
+        d = tmp_path / "output_track" / ("NH_y" + year)
+        d.mkdir(parents=True)
+        # one North Atlantic track in early January, one Pacific track in July
+        _write(str(d / "ff_trs_pos"), [[(1, 350.0, 50.0), (2, 355.0, 52.0), (3, 5.0, 55.0)],
+                                       [(730, 180.0, 40.0), (731, 185.0, 42.0)]])
+        _write(str(d / "ff_trs_neg"), [[(10, 200.0, 30.0), (11, 205.0, 31.0)]])
+
+    build_store(str(tmp_path), sdate="010100")
+    store = TrackStore(str(tmp_path / "output_track" / "track_store"))
+    assert len(store.partitions) == 4
+
+    tr = store.query(sign="pos", months=[12, 1, 2], bbox=(280, 10, 30, 70))
+    assert len(tr) == 2
+    assert list(tr.year) == ["1980", "1981"]
+    assert list(tr.num_points) == [3, 3]
+    np.testing.assert_allclose(tr.points["lon"][:3], [350, 355, 5])
+    assert tr.points["time"][0] == 1980010100
+
+    tr = store.query(years=(1981, 1981), bbox=(170, 190, 0, 90), columns=["lat"])
+    assert len(tr) == 1 and list(tr.points) == ["lat"]
+    assert len(store.select(time=(1981010100, 1981123118))) == 2
+    assert len(store.query(time=(1990010100, 1990123118))) == 0
+
+
+def test_store_query_empty_tracks(tmp_path):
+    d = tmp_path / "output_track" / "NH_yall"
+    d.mkdir(parents=True)
+    # tracks without points before a matching track, and at the end of the file
+    _write(str(d / "ff_trs_pos"), [[(1, 10.0, 50.0), (2, 12.0, 51.0)], [],
+                                   [(5, 200.0, 30.0), (6, 202.0, 31.0)], [(7, 100.0, 20.0)], []])
+
+    build_store(str(tmp_path))
+    store = TrackStore(str(tmp_path / "output_track" / "track_store"))
+
+    tr = store.query(bbox=(190, 210, 0, 90))
+    assert list(tr.num_points) == [2]
+    np.testing.assert_allclose(tr.points["lon"], [200, 202])
+    assert len(store.query()) == 3
+    assert len(store.query(bbox=(90, 110, 0, 90))) == 1
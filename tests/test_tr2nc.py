@@ -0,0 +1,78 @@
+import os
+import sys
+
+import pytest
+
+from pyTRACK import tr2nc_batch, tr2nc_output
+
+# pyTRACK.track_uv is shadowed by the function of the same name
+module = sys.modules["pyTRACK.track_uv"]
+
+
+class _FakeTrackUtils(object):
+    # stands in for libtrackutils.so, writing the metadata it was given to {file}.nc
+
+    def tr2nc_main(self, argc, argv):
+        name, meta = argv[1].decode(), argv[3].decode()
+        with open(meta) as f, open(name + ".nc", "w") as out:
+            out.write(f.read())
+        return 0
+
+
+def _meta_lines(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.startswith(("units:hours", "start:", "step:"))]
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    rendered = []
+    render = module._render_tr2nc_meta
+
+    def counted(start, timedelta, meta):
+        rendered.append(start)
+        render(start, timedelta, meta)
+
+    monkeypatch.setattr(module, "_load_trackutils", lambda: _FakeTrackUtils())
+    monkeypatch.setattr(module, "_render_tr2nc_meta", counted)
+    return rendered
+
+
+def test_render_tr2nc_meta(tmp_path):
+    module._render_tr2nc_meta("1980010100", 6, str(tmp_path / "meta"))
+    assert _meta_lines(tmp_path / "meta") == ["units:hours since 1980-01-01 00", "start:1980010100", "step:6"]
+
+
+@pytest.mark.parametrize("workers", [None, 3])
+def test_tr2nc_batch(tmp_path, renders, workers):
+    files = []
+    for folder in ["NH_y1980", "SH_y1980"]:
+        (tmp_path / folder).mkdir()
+        for name in ["tr_trs_pos", "ff_trs_neg"]:
+            (tmp_path / folder / name).write_text("")
+            files.append(str(tmp_path / folder / name))
+
+    tr2nc_batch(files, "1980120106", timedelta=3, workers=workers)
+    # the metadata is rendered once, and every file converted next to itself
+    assert renders == ["1980120106"]
+    for f in files:
+        assert _meta_lines(f + ".nc") == ["units:hours since 1980-12-01 06", "start:1980120106", "step:3"]
+
+
+def test_tr2nc_output(tmp_path, renders):
+    track_dir = tmp_path / "output_track"
+    for folder in ["NH_y1980", "NH_y1981", "SH_yall", "append"]:
+        (track_dir / folder).mkdir(parents=True)
+    for folder in ["NH_y1980", "NH_y1981", "SH_yall"]:
+        (track_dir / folder / "ff_trs_pos").write_text("")
+
+    with pytest.raises(ValueError, match="start_year"):
+        tr2nc_output(str(tmp_path))
+    renders.clear()
+
+    tr2nc_output(str(tmp_path), sdate="060100", start_year=1979, workers=2)
+    # one metadata file per start date, worked out from the folder's year
+    assert sorted(renders) == ["1979060100", "1980060100", "1981060100"]
+    assert _meta_lines(track_dir / "NH_y1981" / "ff_trs_pos.nc")[1] == "start:1981060100"
+    assert _meta_lines(track_dir / "SH_yall" / "ff_trs_pos.nc")[1] == "start:1979060100"
+    assert not os.listdir(track_dir / "append")
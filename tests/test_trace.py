@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+
+from pyTRACK.trace import Trace, _stage
+from pyTRACK.utils import run_isolated
+
+
+def _job(path):
+    with _stage("write", path=path):
+        with open(path, "wb") as f:
+            f.write(b"x" * (1 << 20))
+
+
+def test_trace(tmp_path):
+    path = tmp_path / "trace.json"
+    with Trace(str(path), summary=False) as trace:
+        with _stage("outer"):
+            with _stage("inner", n=1):
+                a = np.ones(1 << 24)
+                a.sum()
+                del a
+            run_isolated([(str(tmp_path), _job, dict(path=str(tmp_path / "out.bin")))])
+
+    records = {r['name']: r for r in trace.records}
+    assert set(records) == {"outer", "inner", "worker", "write"}
+    assert records["inner"]["parent"] == records["outer"]["id"]
+    assert records["inner"]["info"] == dict(n=1)
+    assert records["inner"]["peak_rss"] >= 8 << 24
+    assert records["outer"]["peak_rss"] >= records["inner"]["peak_rss"]
+
+    # the worker's records are passed back, below the stage that ran it
+    assert records["worker"]["parent"] == records["outer"]["id"]
+    assert records["write"]["parent"] == records["worker"]["id"]
+    assert records["write"]["pid"] != records["outer"]["pid"]
+    assert records["write"]["written"] >= 1 << 20
+    assert records["outer"]["written"] >= 1 << 20
+    assert records["outer"]["wall"] >= records["inner"]["wall"]
+
+    with open(path) as f:
+        data = json.load(f)
+    assert len(data["records"]) == 4
+    assert data["totals"]["inner"]["calls"] == 1
+
+    # nothing is recorded without an open trace
+    with _stage("outer") as record:
+        assert record is None
@@ -0,0 +1,195 @@
+import os
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from pyTRACK import calc_vorticity
+
+A = 6.37e+6
+LIB = os.path.join(os.path.dirname(__file__), "..", "pyTRACK", "_lib", "libtrack.so")
+
+
+def write_uv(filename, nt=6, nlon=96, nlat=48):
+    # Gaussian latitudes north to south, like the cdo regridded input
+    lat = np.rad2deg(np.arcsin(np.polynomial.legendre.leggauss(nlat)[0]))[::-1]
+    lon = np.arange(nlon) * 360. / nlon
+    lam, phi = np.meshgrid(np.deg2rad(lon), np.deg2rad(lat))
+
+    with Dataset(filename, "w") as ds:
+        ds.createDimension("time", None)
+        ds.createDimension("lat", nlat)
+        ds.createDimension("lon", nlon)
+        ds.createVariable("time", "f8", ("time",))[:] = np.arange(nt) * 6.
+        ds.createVariable("lat", "f8", ("lat",))[:] = lat
+        ds.createVariable("lon", "f8", ("lon",))[:] = lon
+        ua = ds.createVariable("ua", "f4", ("time", "lat", "lon"))
+        va = ds.createVariable("va", "f4", ("time", "lat", "lon"))
+        for t in range(nt):
+            ua[t] = (10. + t) * np.cos(phi)
+            va[t] = 5. * np.sin(2 * lam) * np.cos(phi)
+
+    return lon, lat[::-1]
+
+
+def read_field(filename):
+    with open(filename, "rb") as f:
+        nx, ny, nf = map(int, f.readline().split())
+        grid = []
+        while len(grid) < nx + ny:
+            grid += [float(x) for x in f.readline().split()]
+        frames = []
+        for _ in range(nf):
+            assert f.readline().startswith(b"FRAME")
+            frames.append(np.frombuffer(f.read(nx * ny * 4), dtype=np.float32).reshape(ny, nx))
+            assert f.read(1) == b"\n"
+    return np.array(grid[:nx]), np.array(grid[nx:]), np.array(frames)
+
+
+def test_numpy_vorticity_matches_analytic(tmp_path):
+
+    uv = str(tmp_path / "uv.nc")
+    lon, lat = write_uv(uv)
+    out = str(tmp_path / "vor.dat")
+
+    calc_vorticity(uv, outfile=out, backend="numpy", block_size=4)
+
+    xg, yg, vor = read_field(out)
+    assert np.allclose(xg, lon, atol=1e-4)
+    assert np.allclose(yg, lat, atol=1e-4)
+    assert vor.shape == (6, 48, 96)
+
+    lam, phi = np.meshgrid(np.deg2rad(lon), np.deg2rad(lat))
+    for t in range(6):
+        expected = (2 * (10. + t) * np.sin(phi) + 10. * np.cos(2 * lam)) / A
+        # one-sided differences at the outermost latitudes are less accurate
+        err = np.abs(vor[t, 1:-1] - expected[1:-1]).max()
+        assert err < 0.01 * np.abs(expected).max()
+
+
+def test_numpy_vorticity_poles():
+    import sys
+    module = sys.modules["pyTRACK.track_uv"]
+
+    # regular grid with rows at both poles, south to north
+    lon, lat = np.arange(0, 360, 2.5), np.arange(-90, 90.1, 2.5)
+    lam, phi = np.meshgrid(np.deg2rad(lon), np.deg2rad(lat))
+    u = 10. * np.cos(phi)
+    v = 5. * np.sin(2 * lam) * np.cos(phi)
+
+    vor = module._relative_vorticity(u, v, lon, lat)
+    assert np.isfinite(vor).all()
+    # solid body rotation has vorticity 2 U sin(lat) / a, also at the poles
+    np.testing.assert_allclose(vor[[0, -1]], np.outer([-20. / A, 20. / A], np.ones(len(lon))), rtol=1e-3)
+
+
+@pytest.mark.skipif(not os.path.exists(LIB), reason="libtrack.so not built")
+def test_numpy_vorticity_close_to_track(tmp_path, monkeypatch):
+
+    import sys
+    # pyTRACK.track_uv is shadowed by the function of the same name
+    if sys.modules["pyTRACK.track_uv"].cdo is None:
+        pytest.skip("cdo not available")
+
+    monkeypatch.chdir(tmp_path)
+    write_uv("uv.nc")
+
+    calc_vorticity("uv.nc", outfile="vor_track.dat", ext="t")
+    calc_vorticity("uv.nc", outfile="vor_numpy.dat", backend="numpy")
+
+    xt, yt, vt = read_field("vor_track.dat")
+    xn, yn, vn = read_field("vor_numpy.dat")
+    assert np.allclose(xt, xn) and np.allclose(yt, yn)
+    assert vt.shape == vn.shape
+    assert np.abs(vt[:, 2:-2] - vn[:, 2:-2]).max() < 0.05 * np.abs(vt[:, 2:-2]).max()
+
+
+def _copy(src, dst):
+    with open(src, "rb") as f, open(dst, "wb") as g:
+        g.write(f.read())
+
+
+def test_numpy_vorticity_through_pipe(tmp_path):
+    from pyTRACK.utils import run_isolated
+
+    uv = str(tmp_path / "uv.nc")
+    write_uv(uv)
+    calc_vorticity(uv, outfile=str(tmp_path / "vor.dat"), backend="numpy")
+
+    # the way track_uv(stream=True) passes the vorticity on, with a reader in place of the filter
+    os.mkfifo(tmp_path / "pipe.dat")
+    run_isolated([(str(tmp_path), calc_vorticity, dict(uv_file=uv, outfile="pipe.dat", backend="numpy")),
+                  (str(tmp_path), _copy, dict(src="pipe.dat", dst="piped.dat"))],
+                 workers=2, stop_on_error=True)
+    assert (tmp_path / "piped.dat").read_bytes() == (tmp_path / "vor.dat").read_bytes()
+
+
+def test_numpy_vorticity_levels(tmp_path):
+    from pyTRACK.track_uv import _calc_vorticity_numpy
+
+    uv = str(tmp_path / "uv.nc")
+    lat = np.rad2deg(np.arcsin(np.polynomial.legendre.leggauss(24)[0]))
+    lon = np.arange(48) * 7.5
+    levs = np.array([1000., 850., 700., 500.])
+    rng = np.random.default_rng(0)
+    with Dataset(uv, "w") as ds:
+        for name, size in (("time", None), ("plev", 4), ("lat", 24), ("lon", 48)):
+            ds.createDimension(name, size)
+        ds.createVariable("time", "f8", ("time",))[:] = np.arange(5) * 6.
+        ds.createVariable("plev", "f8", ("plev",))[:] = levs * 100
+        ds.createVariable("lat", "f8", ("lat",))[:] = lat
+        ds.createVariable("lon", "f8", ("lon",))[:] = lon
+        for name in ("ua", "va"):
+            ds.createVariable(name, "f4", ("time", "plev", "lat", "lon"))[:] = rng.normal(size=(5, 4, 24, 48))
+
+    # levels out of the order of the file, read together
+    _calc_vorticity_numpy(uv, [str(tmp_path / "v500.dat"), str(tmp_path / "v850.dat")],
+                          lev=[50000, 85000], block_size=2)
+    for lev in (500, 850):
+        _calc_vorticity_numpy(uv, str(tmp_path / "one.dat"), lev=lev * 100)
+        assert (tmp_path / ("v%d.dat" % lev)).read_bytes() == (tmp_path / "one.dat").read_bytes()
+
+
+@pytest.mark.parametrize("kwargs, match", [(dict(stream=True), "stream"),
+                                           (dict(vorticity_backend="track"), "numpy")])
+def test_levels_options(tmp_path, kwargs, match):
+    from pyTRACK import track_uv
+
+    # checked before anything is read or written
+    with pytest.raises(ValueError, match=match):
+        track_uv(str(tmp_path / "uv.nc"), outdirectory=str(tmp_path / "out"), levels=[850, 500], **kwargs)
+    assert not (tmp_path / "out").exists()
+
+
+def test_levels_cached_filtered_field(tmp_path, monkeypatch):
+    import sys
+    from pyTRACK import FieldCache
+
+    module = sys.modules["pyTRACK.track_uv"]
+    processed = tmp_path / "uv_processed.nc"
+    processed.write_text("")
+    cache = FieldCache(tmp_path / "cache")
+    pkey = cache.key(str(processed), "processed")
+    (tmp_path / "filtered.dat").write_text("filtered 850")
+    cache.put(module._field_keys(cache, pkey, "all", 850, "numpy", "42")[1], str(tmp_path / "filtered.dat"),
+              ntime=124)
+
+    computed, tracked = [], []
+
+    def calc_vorticity_numpy(uv_file, outfile, lev=85000, block_size=None):
+        computed.append(lev)
+        for name in outfile:
+            open(name, "w").close()
+
+    def track_year(**kwargs):
+        tracked.append((kwargs["level"], kwargs["vorticity"], kwargs["filtered"]))
+
+    monkeypatch.setattr(module, "_calc_vorticity_numpy", calc_vorticity_numpy)
+    monkeypatch.setattr(module, "_track_year", track_year)
+    module._track_levels([850, 500], ["all"], "1980", str(processed), "96", "48", ["NH"], False, None, "42",
+                         False, None, str(tmp_path), cache=cache, pkey=pkey)
+
+    # only the level that is not cached has its vorticity computed
+    assert computed == [[50000]]
+    assert tracked == [(850, None, dict(ntime=124)),
+                       (500, str(tmp_path / "500hPa" / "vor500_NH_yall.dat"), None)]
+    assert (tmp_path / "850hPa" / "T42filt_vor850_NH_yall.dat").read_text() == "filtered 850"